@@ -0,0 +1,91 @@
+# Benchmark: virtual canvas on kits spread over the whole stage (elements drawn, load, pan and zoom costs)
+# Compares culling elements out of view (config.VIRTUAL_CANVAS) with drawing all elements
+# Runs under a virtual X server (Xvfb) if there is no display, run from the repository root:
+# python3 -m benchmarks.bench_culling
+
+import tempfile
+import time
+import tkinter as tk
+from pathlib import Path
+
+import config
+from benchmarks.suite import close_app, redirect_paths, restored_paths
+from benchmarks.synthetic import write_synthetic_catalog, write_synthetic_kit
+from benchmarks.xvfb import virtual_display
+
+KIT_SIZES = [100, 1000, 5000]
+PAN_STEPS = 20
+
+
+def ms_since(start):
+    return 1000 * (time.perf_counter() - start)
+
+
+def bench(size, virtual, tmp_dir):
+    """ Return {metric: value} for a kit of size elements spread over the stage, with or without culling """
+    from model import AppState
+    from view import AppView
+    from controller import AppController
+
+    config.VIRTUAL_CANVAS = virtual
+    results = {}
+    root = tk.Tk()
+    model = AppState(number=5)
+    view = AppView(root)
+    view.pack()
+    controller = AppController(model, view)
+    root.update()
+
+    # Load, at zoom 1 the window shows the top-left part of the stage
+    start = time.perf_counter()
+    controller.load_kit_file(str(Path(tmp_dir) / f"kit_{size}.dkit"))
+    controller.flush_input()
+    root.update_idletasks()
+    results["load"] = ms_since(start)
+    results["drawn"] = len(controller.realized) if virtual else len(model.elements)
+
+    # Pan along the diagonal of the stage (scrolling requests culling, applied with the next frame)
+    start = time.perf_counter()
+    for step in range(1, PAN_STEPS + 1):
+        view.my_canvas.xview_moveto(step / PAN_STEPS)
+        view.my_canvas.yview_moveto(step / PAN_STEPS)
+        root.update_idletasks()
+        controller.flush_input()
+        root.update_idletasks()
+    results["pan_step"] = ms_since(start) / PAN_STEPS
+
+    # Zoom out to the whole stage and back
+    start = time.perf_counter()
+    controller.zoom_to(config.ZOOM_MIN_LEVEL)
+    root.update_idletasks()
+    results["zoom_out"] = ms_since(start)
+    start = time.perf_counter()
+    controller.zoom_to(0)
+    root.update_idletasks()
+    results["zoom_in"] = ms_since(start)
+
+    close_app(controller)
+    return results
+
+
+def main():
+    virtual_canvas = config.VIRTUAL_CANVAS
+    print(f"{'elements':>8} {'culling':>8} {'drawn':>6} {'load [ms]':>10} {'pan step [ms]':>14} "
+          f"{'zoom out [ms]':>14} {'zoom in [ms]':>13}")
+    with tempfile.TemporaryDirectory() as tmp_dir, virtual_display(), restored_paths():
+        tmp_dir = Path(tmp_dir)
+        redirect_paths(tmp_dir)
+        try:
+            write_synthetic_catalog(config.GEAR_FILE, max(KIT_SIZES))
+            for size in KIT_SIZES:
+                write_synthetic_kit(tmp_dir / f"kit_{size}.dkit", size, area=(config.STAGE_WIDTH, config.STAGE_HEIGHT))
+                for virtual in (False, True):
+                    results = bench(size, virtual, tmp_dir)
+                    print(f"{size:>8} {'on' if virtual else 'off':>8} {results['drawn']:>6} {results['load']:>10.1f} "
+                          f"{results['pan_step']:>14.2f} {results['zoom_out']:>14.1f} {results['zoom_in']:>13.1f}")
+        finally:
+            config.VIRTUAL_CANVAS = virtual_canvas
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Benchmark: events per second the editor absorbs before lagging (arrow key repeat with all selected, mouse drag)
+# Compares applying every event immediately with the coalesced per-frame updates
+# Runs under a virtual X server (Xvfb) if there is no display, run from the repository root:
+# python3 -m benchmarks.bench_input
+
+import tempfile
+import time
+import tkinter as tk
+
+import config
+from benchmarks.suite import close_app, redirect_paths, restored_paths
+from benchmarks.synthetic import write_synthetic_catalog
+from benchmarks.xvfb import virtual_display
+
+ELEMENT_COUNTS = [10, 100, 1000]
+FRAMES = 30
+EVENTS_PER_FRAME = 20
+
+
+class FakeEvent:
+    """ Minimal stand-in for a Tk event """
+    def __init__(self, x=0, y=0, keysym=None):
+        self.x = x
+        self.y = y
+        self.keysym = keysym
+        self.state = 0
+
+
+def setup_app(element_count):
+    """ Create app with element_count elements spread over the canvas """
+    from model import AppState
+    from view import AppView
+    from controller import AppController
+
+    root = tk.Tk()
+    model = AppState(number=5)
+    view = AppView(root)
+    view.pack()
+    controller = AppController(model, view)
+    root.update()
+
+    instruments = list(model.instruments)
+    for idx in range(element_count):
+        pos = [100 + (idx * 37) % 1000, 100 + (idx * 53) % 500]
+        controller.create_element(instruments[idx % len(instruments)].ID, idx + 1, pos=pos)
+    controller.deselect_all()
+    root.update()
+    return root, model, controller
+
+
+def run_events(root, controller, make_event, handler, coalesced):
+    """ Return (ms per event in handler, ms per applied frame incl. redraw) """
+    handler_time = 0.0
+    frame_time = 0.0
+    for frame in range(FRAMES):
+        for idx in range(EVENTS_PER_FRAME):
+            event = make_event(frame * EVENTS_PER_FRAME + idx)
+            start = time.perf_counter()
+            handler(event)
+            if not coalesced:
+                # Every event applied (and drawn) on its own
+                controller.flush_input()
+                root.update_idletasks()
+            handler_time += time.perf_counter() - start
+        start = time.perf_counter()
+        controller.flush_input()
+        root.update_idletasks()
+        frame_time += time.perf_counter() - start
+    return 1000 * handler_time / (FRAMES * EVENTS_PER_FRAME), 1000 * frame_time / FRAMES
+
+
+def ceiling(event_ms, frame_ms, coalesced):
+    """ Events per second before the main loop falls behind """
+    if not coalesced:
+        return 1000 / event_ms
+    frames_per_s = 1000 / config.INPUT_FRAME_MS
+    budget_ms = 1000 - frames_per_s * frame_ms
+    return max(0.0, budget_ms / event_ms)
+
+
+def bench(element_count):
+    """ Return {(mode, coalesced): events per second ceiling} """
+    results = {}
+    for coalesced in (False, True):
+        root, model, controller = setup_app(element_count)
+
+        # Arrow key repeat, moving all elements back and forth
+        controller.on_select_all()
+        keys = ["Left", "Right"]
+        make_event = lambda idx: FakeEvent(keysym=keys[(idx // EVENTS_PER_FRAME) % 2])
+        event_ms, frame_ms = run_events(root, controller, make_event, controller.on_arrow_pressed, coalesced)
+        results[("arrow", coalesced)] = ceiling(event_ms, frame_ms, coalesced)
+
+        # Mouse drag of one element
+        controller.on_select_all()
+        element = model.elements[1]
+        x, y = element.el_model.pos
+        controller.on_canvas_click(FakeEvent(x=x, y=y))
+        make_event = lambda idx: FakeEvent(x=x + idx % 200, y=y + idx % 100)
+        event_ms, frame_ms = run_events(root, controller, make_event, controller.on_canvas_drag, coalesced)
+        results[("drag", coalesced)] = ceiling(event_ms, frame_ms, coalesced)
+        controller.on_canvas_release(FakeEvent(x=x, y=y))
+
+        close_app(controller)
+    return results
+
+
+def main():
+    print(f"{'elements':>8} {'arrow/s direct':>15} {'arrow/s frame':>14} {'drag/s direct':>14} {'drag/s frame':>13}")
+    with tempfile.TemporaryDirectory() as tmp_dir, virtual_display(), restored_paths():
+        redirect_paths(tmp_dir)
+        write_synthetic_catalog(config.GEAR_FILE, max(ELEMENT_COUNTS))
+        for element_count in ELEMENT_COUNTS:
+            results = bench(element_count)
+            print(f"{element_count:>8} {results[('arrow', False)]:>15.0f} {results[('arrow', True)]:>14.0f} "
+                  f"{results[('drag', False)]:>14.0f} {results[('drag', True)]:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
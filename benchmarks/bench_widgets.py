@@ -0,0 +1,76 @@
+# Benchmark: per-action cost of adding/removing elements (gear tree and listbox updates) for growing catalogs
+# Runs under a virtual X server (Xvfb) if there is no display, run from the repository root:
+# python3 -m benchmarks.bench_widgets
+
+import tempfile
+import time
+import tkinter as tk
+
+import config
+from benchmarks.suite import close_app, redirect_paths, restored_paths
+from benchmarks.synthetic import write_synthetic_catalog
+from benchmarks.xvfb import virtual_display
+
+CATALOG_SIZES = [50, 500, 5000]
+ELEMENTS_ON_CANVAS = 20
+ACTIONS = 50
+
+
+def select_instrument(view, instrument):
+    """ Select instrument in gear tree, as the user would before pressing add """
+    view.gear_tree.selection_set(view.gear_items[instrument.ID])
+
+
+def bench_catalog_size(size, tmp_dir):
+    """ Return mean add and remove time (ms) with a catalog of given size """
+    # Imported here, the controller reads config.GEAR_FILE on initialization
+    from model import AppState
+    from view import AppView
+    from controller import AppController
+
+    redirect_paths(tmp_dir, f"_{size}")
+    write_synthetic_catalog(config.GEAR_FILE, size)
+
+    root = tk.Tk()
+    model = AppState(number=5)
+    view = AppView(root)
+    view.pack()
+    controller = AppController(model, view)
+    root.update()
+
+    instruments = list(model.instruments)
+    for instrument in instruments[:ELEMENTS_ON_CANVAS]:
+        select_instrument(view, instrument)
+        controller.on_add()
+    root.update()
+
+    add_time = 0.0
+    remove_time = 0.0
+    for i in range(ACTIONS):
+        # Cycle through instruments not on the canvas
+        instrument = instruments[ELEMENTS_ON_CANVAS + i % (size - ELEMENTS_ON_CANVAS)]
+        select_instrument(view, instrument)
+        start = time.perf_counter()
+        controller.on_add()
+        root.update_idletasks()
+        add_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        controller.on_remove()
+        root.update_idletasks()
+        remove_time += time.perf_counter() - start
+
+    close_app(controller)
+    return 1000 * add_time / ACTIONS, 1000 * remove_time / ACTIONS
+
+
+def main():
+    print(f"{'catalog size':>12} {'add [ms]':>10} {'remove [ms]':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir, virtual_display(), restored_paths():
+        for size in CATALOG_SIZES:
+            add_ms, remove_ms = bench_catalog_size(size, tmp_dir)
+            print(f"{size:>12} {add_ms:>10.3f} {remove_ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+# Benchmark suite: editor and exporter timings for synthetic catalogs and kits of growing size
+# The Tk parts run under a virtual X server (Xvfb) if there is no display. Run from the repository root:
+# python3 -m benchmarks.suite [--sizes 10 100 1000 5000] [--output results.json]
+# Compare two result files (e.g. of two versions), exits with 1 if anything got slower:
+# python3 -m benchmarks.suite --compare old.json new.json
+
+import argparse
+import datetime
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter as tk
+from contextlib import contextmanager
+from pathlib import Path
+
+import config
+from benchmarks.synthetic import write_synthetic_catalog, write_synthetic_kit
+from benchmarks.xvfb import virtual_display
+from models.gear_catalog import GearCatalog
+from utils import render
+
+# Settings pointing at files and directories the app writes or reads from, redirected to a temporary directory
+REDIRECTED_PATHS = ("GEAR_FILE", "AUTOSAVE_DIR", "THUMBNAIL_DIR", "KIT_LIBRARY_DIR", "SPRITE_ATLAS_FILE")
+
+SIZES = [10, 100, 1000, 5000]
+REPEATS = 20 # repetitions of single actions (mean is reported)
+DRAG_FRAMES = 50
+REGRESSION_FACTOR = 1.1 # compare: slower by more than this factor counts as regression
+
+# Metric name -> description (all values in ms)
+METRICS = {
+    "catalog_load": "load gear catalog CSV",
+    "startup": "create model, view and controller (catalog load, gear tree)",
+    "on_load_csv": "load CSV kit",
+    "on_load_dkit": "load binary kit",
+    "on_save_csv": "save CSV kit",
+    "on_save_dkit": "save binary kit",
+    "create_element": "create one element (mean)",
+    "drag_frame": "apply one frame of dragging an element (mean)",
+    "group_drag_frame": "apply one frame of moving all elements (mean)",
+    "rotate": "rotate one element, final texture (mean)",
+    "layer_top": "move bottom element to top layer (mean)",
+    "layer_bottom": "move top element to bottom layer (mean)",
+    "render_cold": "render_project_image, empty sprite cache",
+    "render_warm": "render_project_image, sprites cached",
+}
+
+
+class FakeEvent:
+    """ Minimal stand-in for a Tk event """
+    def __init__(self, x=0, y=0, keysym=None):
+        self.x = x
+        self.y = y
+        self.keysym = keysym
+        self.state = 0
+
+
+def ms_since(start):
+    return 1000 * (time.perf_counter() - start)
+
+
+def redirect_paths(tmp_dir, suffix=""):
+    """ Point the files and directories the app reads or writes (REDIRECTED_PATHS) into tmp_dir
+
+    The gear catalog becomes gear<suffix>.csv (write a synthetic one there). There is no sprite
+    atlas, so timings do not depend on a local one. Restore the settings with restored_paths().
+    """
+    tmp_dir = Path(tmp_dir)
+    config.GEAR_FILE = tmp_dir / f"gear{suffix}.csv"
+    config.AUTOSAVE_DIR = tmp_dir / f"autosave{suffix}"
+    config.THUMBNAIL_DIR = tmp_dir / f"thumbnails{suffix}"
+    config.KIT_LIBRARY_DIR = tmp_dir / f"kit_library{suffix}"
+    config.SPRITE_ATLAS_FILE = tmp_dir / "sprites.atlas"
+
+
+def close_app(controller):
+    """ Stop the background work of the app, delete its autosave journal and destroy the window """
+    controller.autosave.close(discard=True)
+    controller.thumbnails.close()
+    controller.kit_library.close()
+    controller.view.root.destroy()
+
+
+@contextmanager
+def restored_paths():
+    """ Restore the REDIRECTED_PATHS settings on exit """
+    paths = {name: getattr(config, name) for name in REDIRECTED_PATHS}
+    try:
+        yield
+    finally:
+        for name, path in paths.items():
+            setattr(config, name, path)
+
+
+def bench_catalog_load(catalog_path):
+    """ Return time (ms) to load catalog """
+    start = time.perf_counter()
+    GearCatalog().load(catalog_path)
+    return ms_since(start)
+
+
+def bench_editor(size, tmp_dir):
+    """ Return {metric: ms} for the editor with a catalog and kit of size elements """
+    # Imported here, the controller reads config.GEAR_FILE on initialization
+    from model import AppState
+    from view import AppView
+    from controller import AppController
+
+    results = {}
+    tmp_dir = Path(tmp_dir)
+    redirect_paths(tmp_dir, f"_{size}")
+    write_synthetic_catalog(config.GEAR_FILE, size)
+    results["catalog_load"] = bench_catalog_load(config.GEAR_FILE)
+
+    root = tk.Tk()
+    start = time.perf_counter()
+    model = AppState(number=5)
+    view = AppView(root)
+    view.pack()
+    controller = AppController(model, view)
+    root.update()
+    results["startup"] = ms_since(start)
+
+    # Dialogs answered right away
+    view.show_project_saved_message = lambda: None
+
+    # Load and save
+    for suffix in ("csv", "dkit"):
+        kit_path = tmp_dir / f"kit_{size}.{suffix}"
+        write_synthetic_kit(kit_path, size, model.instruments.fingerprint)
+        view.show_load_project_dialog = lambda: str(kit_path)
+        start = time.perf_counter()
+        controller.on_load()
+        root.update_idletasks()
+        results[f"on_load_{suffix}"] = ms_since(start)
+
+        model.save_path = str(tmp_dir / f"saved_{size}.{suffix}")
+        start = time.perf_counter()
+        controller.on_save()
+        results[f"on_save_{suffix}"] = ms_since(start)
+
+    # Create elements on top of the kit, then remove them again
+    total = 0.0
+    for idx in range(REPEATS):
+        start = time.perf_counter()
+        controller.create_element(idx % size, len(model.elements) + 1)
+        root.update_idletasks()
+        total += ms_since(start)
+    results["create_element"] = total / REPEATS
+    controller.remove_elements(model.elements.values()[size:])
+
+    # Drag the topmost element
+    x, y = model.elements[size].el_model.pos
+    controller.on_canvas_click(FakeEvent(x, y))
+    total = 0.0
+    for frame in range(DRAG_FRAMES):
+        controller.on_canvas_drag(FakeEvent(x + frame % 40, y + frame % 40))
+        start = time.perf_counter()
+        controller.flush_input()
+        root.update_idletasks()
+        total += ms_since(start)
+    controller.on_canvas_release(FakeEvent(x, y))
+    results["drag_frame"] = total / DRAG_FRAMES
+
+    # Move all elements with the arrow keys
+    controller.on_select_all()
+    total = 0.0
+    for frame in range(DRAG_FRAMES):
+        controller.on_arrow_pressed(FakeEvent(keysym="Left" if frame % 2 else "Right"))
+        start = time.perf_counter()
+        controller.flush_input()
+        root.update_idletasks()
+        total += ms_since(start)
+    results["group_drag_frame"] = total / DRAG_FRAMES
+    controller.deselect_all()
+
+    # Rotate an element to new angles
+    element = model.elements[1]
+    total = 0.0
+    for idx in range(REPEATS):
+        start = time.perf_counter()
+        element.rotate(element.el_model.rot + 1)
+        root.update_idletasks()
+        total += ms_since(start)
+    results["rotate"] = total / REPEATS
+
+    # Layer top/bottom
+    top_total = 0.0
+    bottom_total = 0.0
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        controller.move_layer(1, size)
+        root.update_idletasks()
+        top_total += ms_since(start)
+        start = time.perf_counter()
+        controller.move_layer(size, 1)
+        root.update_idletasks()
+        bottom_total += ms_since(start)
+    results["layer_top"] = top_total / REPEATS
+    results["layer_bottom"] = bottom_total / REPEATS
+
+    # Export
+    canvas_size = view.get_real_canvas_size()
+    render.sprite_cache.clear()
+    start = time.perf_counter()
+    render.render_project_image(canvas_size, model.elements)
+    results["render_cold"] = ms_since(start)
+    start = time.perf_counter()
+    render.render_project_image(canvas_size, model.elements)
+    results["render_warm"] = ms_since(start)
+
+    close_app(controller)
+    return results
+
+
+def git_version():
+    """ Short commit hash of the working tree, None if unknown """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes):
+    """ Run all benchmarks, return result document {"meta": ..., "results": {metric: {size: ms}}} """
+    results = {metric: {} for metric in METRICS}
+    # Only errors of the app are logged, keeping the report readable (and log output out of the timings)
+    root_logger = logging.getLogger()
+    log_level = root_logger.level
+    root_logger.setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as tmp_dir, virtual_display(), restored_paths():
+        try:
+            for size in sizes:
+                print(f"size {size}...", file=sys.stderr)
+                size_results = bench_editor(size, tmp_dir)
+                for metric, value in size_results.items():
+                    results[metric][str(size)] = round(value, 3)
+        finally:
+            root_logger.setLevel(log_level)
+    return {
+        "meta": {
+            "version": git_version(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tk": tk.TkVersion,
+            "sizes": list(sizes),
+        },
+        "results": results,
+    }
+
+
+def print_results(document):
+    sizes = document["meta"]["sizes"]
+    print(f"{'metric [ms]':<18}" + "".join(f"{size:>12}" for size in sizes))
+    for metric, values in document["results"].items():
+        print(f"{metric:<18}" + "".join(f"{values.get(str(size), float('nan')):>12.3f}" for size in sizes))
+
+
+def compare(old_path, new_path):
+    """ Print new/old ratio per metric and size, return number of regressions """
+    with open(old_path) as file:
+        old = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+    print(f"{old['meta']['version']} -> {new['meta']['version']} (new/old)")
+    regressions = 0
+    for metric, new_values in new["results"].items():
+        old_values = old["results"].get(metric, {})
+        for size, new_value in new_values.items():
+            old_value = old_values.get(size)
+            if not old_value:
+                continue
+            ratio = new_value / old_value
+            mark = ""
+            if ratio > REGRESSION_FACTOR:
+                mark = "  slower"
+                regressions += 1
+            elif ratio < 1 / REGRESSION_FACTOR:
+                mark = "  faster"
+            print(f"{metric:<18}{size:>6} {old_value:>12.3f} {new_value:>12.3f} {ratio:>7.2f}x{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark editor and exporter with synthetic kits.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="kit and catalog sizes")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    document = run_suite(args.sizes)
+    print_results(document)
+    if args.output:
+        with open(args.output, mode='w') as file:
+            json.dump(document, file, indent=2)
+        print("Results written to:", args.output)
+
+
+if __name__ == "__main__":
+    main()
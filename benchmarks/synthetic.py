@@ -0,0 +1,43 @@
+# Synthetic gear catalogs and kits of any size for benchmarks
+
+import csv
+import random
+
+import config
+from utils import csv_io, kit_io
+
+# Real gear catalog the synthetic ones are made of (benchmarks point config.GEAR_FILE to synthetic catalogs)
+SOURCE_GEAR_FILE = config.GEAR_FILE
+
+
+def write_synthetic_catalog(path, size):
+    """ Write gear CSV with size instruments, cycling through the real gear rows """
+    rows = list(csv_io.iter_csv_rows(SOURCE_GEAR_FILE))
+    with open(path, mode='w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=config.COLUMN_NAMES_GEAR)
+        writer.writeheader()
+        for idx in range(size):
+            row = dict(rows[idx % len(rows)])
+            row["name"] = f"{row['name']} #{idx}"
+            writer.writerow(row)
+
+
+def synthetic_kit_rows(size, area=(config.CANVAS_WIDTH, config.CANVAS_HEIGHT), seed=0):
+    """ Kit rows with size elements (instrument IDs 0 to size-1 of the synthetic catalog) spread over area (width, height) """
+    rng = random.Random(seed)
+    width, height = area
+    flippable = [row["flippable"] == "1" for row in csv_io.iter_csv_rows(SOURCE_GEAR_FILE)]
+    rows = []
+    for idx in range(size):
+        rows.append({"ID": idx, 
+                     "layer": idx + 1, 
+                     "position": [rng.randrange(width), rng.randrange(height)], 
+                     "rotation": rng.randrange(360), 
+                     "flipped": rng.randrange(2) if flippable[idx % len(flippable)] else 0
+                     })
+    return rows
+
+
+def write_synthetic_kit(path, size, fingerprint=b"", seed=0, area=(config.CANVAS_WIDTH, config.CANVAS_HEIGHT)):
+    """ Write kit file (CSV or .dkit by extension) with size elements, needs a catalog with at least size instruments """
+    kit_io.save_kit(path, synthetic_kit_rows(size, area, seed), fingerprint)
@@ -0,0 +1,57 @@
+# Virtual X server for running the Tk benchmarks on headless Linux
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+SCREEN = "1600x900x24"
+START_TIMEOUT = 10 # seconds
+
+
+def needs_virtual_display():
+    """ Check if there is no display to open Tk windows on (only Linux uses X11 displays) """
+    return sys.platform.startswith("linux") and not os.environ.get("DISPLAY")
+
+
+def _free_display_number(start=99):
+    """ First display number without X server lock file """
+    number = start
+    while Path(f"/tmp/.X{number}-lock").exists():
+        number += 1
+    return number
+
+
+@contextmanager
+def virtual_display(screen=SCREEN):
+    """ Start Xvfb and set DISPLAY if there is no display, stop it on exit """
+    if not needs_virtual_display():
+        yield os.environ.get("DISPLAY")
+        return
+
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        raise RuntimeError("No display and Xvfb not found (install e.g. the xvfb package)")
+    number = _free_display_number()
+    process = subprocess.Popen(
+        [xvfb, f":{number}", "-screen", "0", screen, "-nolisten", "tcp"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        # Wait for the server socket
+        socket = Path(f"/tmp/.X11-unix/X{number}")
+        deadline = time.monotonic() + START_TIMEOUT
+        while not socket.exists():
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"Xvfb could not be started on display :{number}")
+            time.sleep(0.05)
+        os.environ["DISPLAY"] = f":{number}"
+        yield os.environ["DISPLAY"]
+    finally:
+        os.environ.pop("DISPLAY", None)
+        process.terminate()
+        process.wait()
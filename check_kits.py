@@ -0,0 +1,71 @@
+# Check Kits: report overlapping elements in kit files (no tkinter needed)
+#
+# Usage (from the repository root):
+# python3 check_kits.py                       checks all kits in kits/
+# python3 check_kits.py a.csv b.dkit more/    checks given kits and all kits in given directories
+# python3 check_kits.py --tolerance 0         also reports elements overlapping by less than OVERLAP_TOLERANCE px
+#
+# Exits with status 1 if any kit has overlapping elements or could not be read.
+
+import argparse
+import sys
+import time
+
+import config
+from models.gear_catalog import GearCatalog
+from utils import collisions
+from utils import kit_io
+
+
+def check_kit(kit_path, catalog, tolerance):
+    """ Find overlapping elements of kit file, return (rows, [(row, row), ...]) """
+    rows = kit_io.load_kit(kit_path, catalog.fingerprint)
+    shapes = []
+    for row in rows:
+        instr = catalog[row["ID"]]
+        shapes.append((*row["position"], instr.r, instr.is_circular, row["rotation"]))
+    pairs = collisions.overlapping_pairs(shapes, config.SPATIAL_CELL_SIZE, tolerance)
+    return rows, [(rows[i], rows[j]) for i, j in pairs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report overlapping elements in kit files.")
+    parser.add_argument("kits", nargs="*", default=[str(config.KITS_DIR)], help="kit files or directories (default: kits/)")
+    parser.add_argument("--tolerance", type=float, default=config.OVERLAP_TOLERANCE,
+                        help=f"ignore overlaps up to this many px (default: {config.OVERLAP_TOLERANCE})")
+    args = parser.parse_args()
+
+    kits = kit_io.collect_kits(args.kits)
+    if not kits:
+        print("No kit files found.")
+        return
+    catalog = GearCatalog()
+    catalog.load(config.GEAR_FILE)
+
+    start = time.perf_counter()
+    total_elements = 0
+    overlapping_kits = 0
+    failed = 0
+    for kit in kits:
+        try:
+            rows, pairs = check_kit(kit, catalog, args.tolerance)
+        except Exception as error:
+            failed += 1
+            print(f"{kit}: failed ({error})")
+            continue
+        total_elements += len(rows)
+        if pairs:
+            overlapping_kits += 1
+            print(f"{kit}: {len(pairs)} overlaps")
+            for a, b in pairs:
+                print(f"  layer {a['layer']} {catalog[a['ID']].name} / layer {b['layer']} {catalog[b['ID']].name}")
+
+    elapsed = time.perf_counter() - start
+    print(f"Checked {len(kits) - failed} kits ({total_elements} elements) in {elapsed:.2f} s: "
+          f"{overlapping_kits} with overlaps, {failed} failed")
+    if overlapping_kits or failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
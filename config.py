@@ -1,9 +1,10 @@
+import os
 import sys
 from pathlib import Path
 
 DEFAULT_TITLE = "Kit Builder"
 
-# On Linux and Windows the code needs to differ because on Linux fill='' does not give a transparent shape (for marker and edge). Here it is drawn using an xbm file instead.
+# On Linux and Windows the code needs to differ because on Linux fill='' does not give a transparent shape (for edge). Here it is drawn using an xbm file instead.
 # Only tested on Ubuntu 22.04.3 LTS and Windows 10/11
 ON_LINUX = sys.platform.startswith("linux")
 
@@ -12,18 +13,51 @@ BASE_DIR = Path.cwd() # base Directory
 RESOURCES_DIR = BASE_DIR / "resources"
 GEAR_FILE = RESOURCES_DIR / "gear.csv"
 KITS_DIR = BASE_DIR / "kits"
+CACHE_DIR = BASE_DIR / "cache" # derived images reused across runs (e.g. background cropped to canvas size)
+
+# Diagnostics: log level (environment variable KIT_BUILDER_LOG, e.g. DEBUG), Chrome trace file written on exit
+# (KIT_BUILDER_TRACE, tracing is off if not set), number of most recent trace spans kept
+LOG_LEVEL = os.environ.get("KIT_BUILDER_LOG", "WARNING").upper()
+TRACE_FILE = os.environ.get("KIT_BUILDER_TRACE")
+TRACE_MAX_EVENTS = 200000
 
 DRUMS_ICON_PATH = RESOURCES_DIR / "Gui" / "drums_icon.png"
 CYMBALS_ICON_PATH = RESOURCES_DIR / "Gui" / "cymbals_icon.png"
 OTHER_ICON_PATH = RESOURCES_DIR / "Gui" / "other_icon.png"
 
+FLOOR_IMAGE_PATH = RESOURCES_DIR / "Environment" / "floor.jpg"
+BACKGROUND_POSITION = (200, 0) # canvas position of the background image center
+BACKGROUND_PLACEHOLDER = "#402f22" # canvas color until the background image is loaded (mean color of the floor)
+
+# Background image is loaded on a worker thread after the window appeared, polling interval (ms)
+BACKGROUND_POLL_MS = 15
+# Background on canvas covers the visible stage region plus this margin (window px), redone when scrolled out of it
+BACKGROUND_MARGIN = 256
+
+# Background images for the stage and export sizes: memory budget and disk budget (CACHE_DIR) in bytes, least recently used first
+BACKGROUND_CACHE_BUDGET = 64 * 1024 * 1024
+BACKGROUND_DISK_BUDGET = 128 * 1024 * 1024
+
 # Set window size, adjust if needed
 WINDOW_SIZE = [1200, 700]
 
 # Canvas Size
 CANVAS_WIDTH = int(WINDOW_SIZE[0])
 CANVAS_HEIGHT = int(WINDOW_SIZE[1])
-CANVAS_SCROLLREGION = (0, 0, CANVAS_WIDTH, CANVAS_HEIGHT)
+
+# Stage: area of the kit (positions of elements), larger than the canvas window which shows part of it (scrolled/panned)
+STAGE_WIDTH = 3 * CANVAS_WIDTH
+STAGE_HEIGHT = 3 * CANVAS_HEIGHT
+CANVAS_SCROLLREGION = (0, 0, STAGE_WIDTH, STAGE_HEIGHT)
+
+# Zoom (mouse wheel): factor per wheel step, zoom levels (zoom = ZOOM_STEP ** level) from ZOOM_MIN_LEVEL to ZOOM_MAX_LEVEL
+ZOOM_STEP = 1.25
+ZOOM_MIN_LEVEL = -6
+ZOOM_MAX_LEVEL = 6
+
+# Virtual canvas: only elements within the visible region of the stage plus this margin (window px) have canvas items and textures
+VIRTUAL_CANVAS = True
+CULL_MARGIN = 200
 
 WIDGET_PAD = 10
 
@@ -37,6 +71,66 @@ ARR_STEP_INCREMENT = 3
 SPAWN_POINT = [70, 70]
 TRANSPARENT_STIPPLE = '@transparent.xbm'
 
+# Canvas tag shared by the image and edge of all selected elements (group moves)
+SELECTED_TAG = 'selected'
+
+# Overlap check: edges of overlapping elements are outlined (dashed), overlaps up to OVERLAP_TOLERANCE px are ignored
+OVERLAP_CHECK = True
+OVERLAP_TOLERANCE = 2
+OVERLAP_COLOR = 'orange'
+OVERLAP_DASH = (6, 4)
+
+# Mouse drag and arrow key events are accumulated and applied once per frame (ms)
+INPUT_FRAME_MS = 16
+
+# Undo/redo: memory budget of the journal (bytes), moves/rotations within this time (ms) form one undo step
+HISTORY_BUDGET = 256 * 1024
+HISTORY_COALESCE_MS = 500
+
+# Autosave journal (recovery after a crash): directory, edits are written in batches every AUTOSAVE_FLUSH_MS,
+# the log is compacted into a kit snapshot every AUTOSAVE_COMPACT_EVERY edits
+AUTOSAVE_DIR = BASE_DIR / "autosave"
+AUTOSAVE_FLUSH_MS = 1000
+AUTOSAVE_COMPACT_EVERY = 200
+
+# Memory budget of the rotated texture cache (bytes), least recently used textures are evicted first
+TEXTURE_CACHE_BUDGET = 64 * 1024 * 1024
+
+# Rotation slider: final texture is prepared once the slider rested this long (ms), result polling interval (ms)
+ROTATION_SETTLE_MS = 120
+TEXTURE_POLL_MS = 15
+
+# Mipmap pyramid of instrument images (zoomed out textures): levels are halved down to this size (px)
+MIPMAP_MIN_SIZE = 8
+
+# Cell size of the spatial grid used for hit-testing elements on canvas (px)
+SPATIAL_CELL_SIZE = 128
+
+# Memory budget of the rotated sprite cache (bytes), shared by canvas textures and image export
+SPRITE_CACHE_BUDGET = 64 * 1024 * 1024
+
+# Poster export: rows rendered and streamed to the file at once (bounds memory use), default scale factor
+POSTER_BAND_HEIGHT = 256
+POSTER_SCALE_DEFAULT = 4
+
+# Number of threads decoding gear images in the background on startup
+IMAGE_STORE_WORKERS = 4
+
+# Gear tree thumbnails: size (px), worker processes generating missing ones, cache directory
+THUMBNAIL_SIZE = 32
+THUMBNAIL_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+THUMBNAIL_DIR = CACHE_DIR / "thumbnails"
+THUMBNAIL_POLL_MS = 30
+
+# Optional sprite atlas (python3 -m utils.sprite_atlas): instrument images pre-rotated every SPRITE_ATLAS_STEP degrees,
+# other angles are rotated live. About 260 MiB with the default step for the bundled gear
+SPRITE_ATLAS_FILE = CACHE_DIR / "sprites.atlas"
+SPRITE_ATLAS_STEP = 15
+
+# Kit library (index of KITS_DIR): index and kit thumbnails directory, thumbnail size (px)
+KIT_LIBRARY_DIR = CACHE_DIR / "kit_library"
+KIT_THUMBNAIL_SIZE = (120, 70)
+
 
 """
 # Commented helper code
@@ -103,4 +197,4 @@ def write_gear_file():
 
 # (Re-)write the gear.csv file
 write_gear_file()
-"""
\ No newline at end of file
+"""
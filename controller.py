@@ -1,35 +1,78 @@
 # Controller: handling user input and application logic (connecting view and model)
 
+import logging
 import config
 from models.element_model import ElementModel
 from models.element_view import ElementView
 from models.element_controller import ElementController
-from utils import image_utils
-from utils import csv_io
-import csv
-import ast
+from utils import render
+from utils.image_store import image_store
+from utils import kit_io
+from utils.texture_loader import TextureLoader
+from utils.thumbnails import ThumbnailLoader
+from utils.kit_library import KitLibrary
+from utils.autosave import AutosaveJournal
+from models.history import invert
+from utils.trace import tracer
+
+log = logging.getLogger(__name__)
 
 class AppController:
     def __init__(self, model, view):
         self.model = model
         self.view = view
 
+        # Rotation slider: prepares final textures in the background, latest angle per element
+        self.texture_loader = TextureLoader(self.view.root, config.ROTATION_SETTLE_MS, config.TEXTURE_POLL_MS)
+        self.pending_rotations = {}
+        self.rotation_job = None
+        self.slider_synced = None # angle the slider was last set to by the app (not the user)
+        self.slider_base = 0 # slider angle matching the angles in rotation_base (see sync_rot_slider)
+        self.rotation_base = {} # element -> angle when the slider was synced, the slider turns it by its change
+
+        # Input coalescing: mouse drag and arrow key events are applied once per frame
+        self.pending_drag = None # latest drag event
+        self.pending_arrow = [0, 0] # accumulated arrow key movement
+        self.pending_zoom = 0 # accumulated mouse wheel steps
+        self.zoom_anchor = None # window position of the latest wheel event (stays in place when zooming)
+        self.pending_culling = False # visible region or element positions changed
+        self.pending_overlaps = set() # elements moved, rotated or added since the last overlap check
+        self.input_job = None
+
+        # Virtual canvas: elements with canvas items (see update_culling)
+        self.realized = set()
+
+        # Rubber band selection: start position on canvas, None if not selecting
+        self.rubber_band = None
+
         # Menu commands
         self.view.build_menu({
             "new": self.on_new,
             "load": self.on_load,
+            "library": self.on_kit_library,
             "save": self.on_save,
             "save_as": self.on_save_as,
             "save_image": self.on_save_image,
+            "save_poster": self.on_save_poster,
             "exit": self.on_quit_requested,
+            "undo": self.on_undo,
+            "redo": self.on_redo,
             "view_gear": self.on_view_gear,
+            "reset_zoom": self.on_reset_zoom,
             "increase_move_step": self.on_increase_move_step,
             "decrease_move_step": self.on_decrease_move_step
             })
 
         # Binds
         self.view.bind_canvas_click(handler=self.on_canvas_click)
+        self.view.bind_canvas_motion(handler=self.on_canvas_motion)
+        self.view.bind_canvas_drag(drag=self.on_canvas_drag, drag_stop=self.on_canvas_release)
+        self.view.bind_canvas_configure(handler=self.on_canvas_configure)
+        self.view.bind_canvas_wheel(handler=self.on_canvas_wheel)
+        self.view.bind_canvas_pan(start=self.on_pan_start, drag=self.on_pan)
+        self.view.bind_canvas_scroll(handler=self.request_culling)
         self.view.bind_arrow_keys(handler=self.on_arrow_pressed)
+        self.view.bind_undo_keys(undo=self.on_undo, redo=self.on_redo)
         self.view.bind_select_all_button(handler=self.on_select_all)
         self.view.bind_add_button(handler=self.on_add)
         self.view.bind_remove_button(handler=self.on_remove)
@@ -48,184 +91,499 @@ class AppController:
         self.initialize_app()
 
 
+    @tracer.traced
     def initialize_app(self):
         """ Initialize application state """
         self.model.load_instruments_from_csv(config.GEAR_FILE)
         self.view.refresh_gear_tree(self.model.instruments)
 
+        # Decode gear images in the background, before they are first placed or exported
+        image_store.prefetch(self.model.instruments.image_paths())
+
+        # Gear tree thumbnails, filled in progressively (cached ones first)
+        self.thumbnails = ThumbnailLoader(
+            self.view.root, 
+            config.THUMBNAIL_DIR, 
+            config.THUMBNAIL_SIZE, 
+            config.THUMBNAIL_WORKERS, 
+            config.THUMBNAIL_POLL_MS
+        )
+        self.thumbnails.request(
+            {instr.ID: instr.default_path for instr in self.model.instruments}, self.view.set_gear_thumbnail
+        )
+
+        # Index of the kits directory, updated when the library is opened
+        self.kit_library = KitLibrary(
+            config.KITS_DIR, config.KIT_LIBRARY_DIR, self.model.instruments, config.KIT_THUMBNAIL_SIZE
+        )
+
+        # Autosave journal, offering recovery if the last session crashed
+        self.autosave = AutosaveJournal(
+            config.AUTOSAVE_DIR, 
+            snapshot_rows=lambda: kit_io.kit_rows(self.model.elements), 
+            fingerprint=self.model.instruments.fingerprint, 
+            flush_ms=config.AUTOSAVE_FLUSH_MS, 
+            compact_every=config.AUTOSAVE_COMPACT_EVERY
+        )
+        rows, entries = self.autosave.load_recovery() if self.autosave.has_recovery() else ([], [])
+        recover = bool(rows or entries) and self.view.ask_recover()
+        if recover:
+            try:
+                self.recover(rows, entries)
+            except Exception:
+                # Broken journal, it would fail the same way on every start
+                log.exception("Recovery failed, starting with an empty kit")
+                self.reset_app()
+                recover = False
+        if not recover:
+            self.autosave.discard()
+        self.autosave.start()
+        if recover:
+            # Recovered kit becomes the new snapshot
+            self.autosave.compact()
+
+    @tracer.traced
+    def recover(self, rows, entries):
+        """ Restore last session from autosave snapshot rows and the edits logged after it """
+        log.info("recover: %d elements, %d edits", len(rows), len(entries))
+        self.load_rows(rows)
+        for entry in entries:
+            self.replay(entry, journal=False)
+        self.deselect_all()
+        self.view.update_listbox(self.model.elements, 0)
+        self.view.refresh_gear_tree(self.model.instruments)
+
 
+    @tracer.traced
     def on_canvas_click(self, event):
-        """ Mouse click handler for canvas"""
-        print("canvas click at", event.x, event.y)
-        self.model.all_selected = False
-        # Deactivate flip checkbutton
-        self.view.deactivate_flip_checkbutton()
-        for layer in self.model.elements:
-            self.model.elements[layer].mouse_click() # Possibly make this more efficient without calling mouse_click for all elements?
+        """ Mouse click handler for canvas (with shift: add to or remove from selection) """
+        log.debug("canvas click at %d %d", event.x, event.y)
+        self.flush_input()
+        x, y = self.view.get_canvas_position(event)
+        clicked = self.model.element_at(x, y)
+        shift = self.view.is_shift_pressed(event)
+        primary = clicked
+
+        if clicked is None:
+            # Start rubber band selection on empty canvas
+            if not shift:
+                self.deselect_all()
+            self.rubber_band = (x, y)
+        elif shift and clicked.el_model.is_selected:
+            # Remove clicked element from selection
+            clicked.deselect()
+            self.model.all_selected = False
+            primary = self.model.elements.get(self.model.selected)
+        else:
+            # Clicking an already selected element keeps the selection, to drag it as a group
+            if not shift and not clicked.el_model.is_selected:
+                self.deselect_all()
+            clicked.select()
+            clicked.on_drag_start(event)
+            self.model.dragging = clicked
+
+        self.update_selection(primary)
+
+    @tracer.traced
+    def on_canvas_motion(self, event):
+        """ Mouse motion handler for canvas, resolving the hovered element """
+        hovered = self.model.element_at(*self.view.get_canvas_position(event))
+        if hovered is not self.model.hovering:
+            if self.model.hovering is not None:
+                self.model.hovering.on_leave(event)
+            if hovered is not None:
+                hovered.on_enter(event)
+
+    @tracer.traced
+    def on_canvas_drag(self, event):
+        """ Mouse drag handler for canvas (only the latest event per frame is applied) """
+        if self.model.dragging is not None or self.rubber_band is not None:
+            self.pending_drag = event
+            self.schedule_input()
+
+    @tracer.traced
+    def on_canvas_release(self, event):
+        """ Mouse release handler for canvas """
+        self.flush_input()
+        if self.model.dragging is not None:
+            self.model.dragging.on_drag_stop(event)
+            self.model.dragging = None
+            # Next drag is a new undo step
+            self.model.history.seal()
+        if self.rubber_band is not None:
+            # Select elements inside the rubber band
+            x0, y0 = self.rubber_band
+            x1, y1 = self.view.get_canvas_position(event)
+            self.rubber_band = None
+            self.view.clear_rubber_band()
+            bounds = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+            for element in self.model.elements_in_rect(bounds):
+                if not element.el_model.is_selected:
+                    element.select()
+            self.update_selection(self.model.elements.get(self.model.selected))
+
+    @tracer.traced
+    def on_canvas_wheel(self, event):
+        """ Mouse wheel handler for canvas: zoom in or out at the mouse position (applied once per frame) """
+        self.pending_zoom += self.view.get_wheel_steps(event)
+        self.zoom_anchor = (event.x, event.y)
+        self.schedule_input()
+
+    @tracer.traced
+    def on_reset_zoom(self):
+        """ Handle reset zoom request """
+        self.zoom_to(0)
+
+    def on_pan_start(self, event):
+        """ Middle mouse button press handler for canvas: start panning """
+        self.view.start_pan(event)
+
+    def on_pan(self, event):
+        """ Middle mouse button drag handler for canvas: pan the canvas (culling follows the scroll handler) """
+        self.view.pan(event)
+
+    @tracer.traced
+    def on_canvas_configure(self, event):
+        """ Canvas resize handler: the visible region changed (elements and background to show) """
+        self.view.set_canvas_size(event.width, event.height)
+        self.view.update_background_image()
+        self.request_culling()
+
+    def schedule_input(self):
+        """ Apply pending input on the next frame """
+        if self.input_job is None:
+            self.input_job = self.view.root.after(config.INPUT_FRAME_MS, self.apply_pending_input)
+
+    def flush_input(self):
+        """ Apply pending input now (e.g. before the selection changes) """
+        if self.input_job is not None:
+            self.view.root.after_cancel(self.input_job)
+            self.apply_pending_input()
+
+    @tracer.traced
+    def apply_pending_input(self):
+        """ Apply input accumulated since the last frame """
+        self.input_job = None
+        if self.pending_drag is not None:
+            event, self.pending_drag = self.pending_drag, None
+            if self.model.dragging is not None:
+                # Element moves by the summed up mouse movement
+                self.model.dragging.on_drag(event)
+            elif self.rubber_band is not None:
+                self.view.draw_rubber_band(*self.rubber_band, *self.view.get_canvas_position(event))
+        dx, dy = self.pending_arrow
+        self.pending_arrow = [0, 0]
+        if dx or dy:
+            self.move_selection(dx, dy)
+        if self.pending_zoom:
+            steps, self.pending_zoom = self.pending_zoom, 0
+            self.zoom_to(self.view.viewport.level + steps, self.zoom_anchor)
+        if self.pending_overlaps:
+            self.update_overlaps()
+        if self.pending_culling:
+            self.update_culling()
+
+    def zoom_to(self, level, anchor=None):
+        """ Zoom canvas to level (see Viewport), around window position anchor (default: center) """
+        if self.view.set_zoom(level, anchor):
+            log.debug("zoom: %.3f", self.view.viewport.zoom)
+            # Textures for the new zoom, mostly scaled down from mipmaps and shared by equal elements
+            # (newly realized elements are created at the new zoom)
+            realized = self.realized - self.update_culling()
+            for element in realized:
+                element.el_view.update_texture()
+
+    def request_overlap_check(self, elements):
+        """ Check elements for overlaps on the next frame """
+        if config.OVERLAP_CHECK:
+            self.pending_overlaps.update(elements)
+            self.schedule_input()
+
+    @tracer.traced
+    def update_overlaps(self):
+        """ Update overlaps of pending elements and the outline of all elements whose overlaps changed """
+        changed, self.pending_overlaps = self.pending_overlaps, set()
+        for element in self.model.update_overlaps(changed, config.OVERLAP_TOLERANCE):
+            element.el_view.set_overlapping(element in self.model.overlaps)
+        log.debug("overlaps: %d elements", len(self.model.overlaps))
+
+    def request_culling(self):
+        """ Update realized elements on the next frame """
+        self.pending_culling = True
+        self.schedule_input()
+
+    @tracer.traced
+    def update_culling(self):
+        """ Realize elements in the visible region (plus margin), unrealize the others, return newly realized ones
+
+        Elements out of view only keep their model state: canvas items and textures are
+        created when they come into view. Without config.VIRTUAL_CANVAS, all elements stay realized.
+        """
+        self.pending_culling = False
+        new = set()
+        if config.VIRTUAL_CANVAS:
+            visible = self.model.spatial_index.query_rect(self.view.get_visible_bounds(config.CULL_MARGIN))
+            if self.model.dragging is not None:
+                visible.add(self.model.dragging)
+            for element in self.realized - visible:
+                element.el_view.unrealize()
+            new = visible - self.realized
+            self.realized = visible
+            if new:
+                # New items are created on top (bottom layer first), then restacked between the realized elements
+                ordered = sorted(self.realized, key=lambda element: element.el_model.layer)
+                for element in ordered:
+                    if element in new:
+                        element.el_view.realize()
+                lowest_old = next((element for element in ordered if element not in new), None)
+                for i, element in enumerate(ordered):
+                    if element in new:
+                        if i > 0:
+                            self.view.restack_element(element, below=ordered[i - 1])
+                        elif lowest_old is not None:
+                            self.view.restack_element(element, above=lowest_old)
+        self.view.update_realized_count(len(self.realized), len(self.model.elements))
+        return new
+
+    def is_in_view(self, bounds):
+        """ Check if stage bounding box lies in the visible region (plus margin) """
+        x0, y0, x1, y1 = self.view.get_visible_bounds(config.CULL_MARGIN)
+        return bounds[0] <= x1 and bounds[2] >= x0 and bounds[1] <= y1 and bounds[3] >= y0
+
+    def realize(self, element):
+        """ Create canvas items of element, stacked according to its layer among the realized elements """
+        element.el_view.realize()
+        self.realized.add(element)
+        self.restack(element)
+
+    def restack(self, element):
+        """ Restack canvas items of realized element according to its layer (unrealized elements have none) """
+        layer = element.el_model.layer
+        elements = self.model.elements
+        below = next(
+            (elements[l] for l in range(layer - 1, 0, -1) if elements[l].el_view.realized), None
+        )
+        above = None
+        if below is None:
+            above = next(
+                (elements[l] for l in range(layer + 1, len(elements) + 1) if elements[l].el_view.realized), None
+            )
+        self.view.restack_element(element, below=below, above=above)
 
-        # Update selected
+    def move_selection(self, dx, dy):
+        """ Move selected elements as a group by (dx, dy), stopping at the stage bounds """
+        selection_edges = self.model.get_selection_edges()
+        if selection_edges is None:
+            return
+        dx, dy = self.model.clamp_move(dx, dy, selection_edges)
+        if dx or dy:
+            self.model.move_selection(dx, dy)
+            self.view.move_selected(dx, dy)
+            self.record(("move", self.selected_layers(), dx, dy))
+            self.request_overlap_check(self.model.selection)
+            self.request_culling()
+
+    def selected_layers(self):
+        """ Get sorted tuple of selected layers (refer to elements in history entries) """
+        return tuple(sorted(element.el_model.layer for element in self.model.selection))
+
+    def select_layers(self, layers):
+        """ Select exactly the elements on given layers """
+        self.deselect_all()
+        for layer in layers:
+            self.model.elements[layer].select()
+
+    def deselect_all(self):
+        """ Deselect all elements, only touching the selected ones """
+        self.flush_input()
+        for element in list(self.model.selection):
+            element.deselect()
+        self.model.all_selected = False
+        self.model.selection_edges = None
         self.model.selected = 0
-        for layer in self.model.elements:
-            if self.model.elements[layer].el_model.is_selected:
-                self.model.selected = layer
-                self.view.activate_flip_checkbutton(
-                    el_model=self.model.elements[self.model.selected].el_model
-                )
-                self.view.update_listbox(self.model.elements, self.model.selected) # this and next line needed?
-                return
-            
-        # Update listbox
+
+    def update_selection(self, primary=None):
+        """ Set primary selected element (rotation slider, flip checkbutton, layer buttons) and update widgets
+
+        Without a selected primary element, the only selected element becomes primary (if there is one).
+        """
+        selection = self.model.selection
+        if primary not in selection:
+            primary = next(iter(selection)) if len(selection) == 1 else None
+        if primary is None:
+            self.model.selected = 0
+            self.view.deactivate_flip_checkbutton()
+        else:
+            self.model.selected = primary.el_model.layer
+            self.view.activate_flip_checkbutton(el_model=primary.el_model)
+        self.sync_rot_slider()
         self.view.update_listbox(self.model.elements, self.model.selected)
 
+    def sync_rot_slider(self):
+        """ Set rotation slider for the selection without rotating it
+
+        The slider shows the common angle of the selected elements. If their angles differ, it shows 0
+        (relative) and each element is turned by the slider angle from its own angle.
+        """
+        self.rotation_base = {element: element.el_model.rot for element in self.model.selection}
+        angles = set(self.rotation_base.values())
+        relative = len(angles) > 1
+        angle = 0 if relative or not angles else angles.pop()
+        self.slider_base = angle
+        self.slider_synced = angle
+        self.view.update_rot_slider(angle, relative)
+
+    @tracer.traced
     def on_arrow_pressed(self, event):
         """ Handle arrow key presses to move selected elements """
-        print("arrow pressed:", event.keysym)
-        if self.model.all_selected:
-            # Get selection edges for canvas boundary checking
-            min_x = min(self.model.elements[layer].el_model.pos[0] for layer in self.model.elements)
-            max_x = max(self.model.elements[layer].el_model.pos[0] for layer in self.model.elements)
-            min_y = min(self.model.elements[layer].el_model.pos[1] for layer in self.model.elements)
-            max_y = max(self.model.elements[layer].el_model.pos[1] for layer in self.model.elements)
-            selection_edges = (min_x, max_x, min_y, max_y)
-            selected_elements = self.model.elements.keys()
-        else:
-            selected_elements = [self.model.selected] if self.model.selected != 0 else []
-            selection_edges = None
-        for layer in selected_elements:
-            if event.keysym == "Left":
-                self.model.elements[layer].move_element(-self.model.arr_step, 0, selection_edges)
-            elif event.keysym == "Right":
-                self.model.elements[layer].move_element(self.model.arr_step, 0, selection_edges)
-            elif event.keysym == "Up":
-                self.model.elements[layer].move_element(0, -self.model.arr_step, selection_edges)
-            elif event.keysym == "Down":
-                self.model.elements[layer].move_element(0, self.model.arr_step, selection_edges)
-
-
-
+        # Accumulate movement (key repeat), applied once per frame
+        if event.keysym == "Left":
+            self.pending_arrow[0] -= self.model.arr_step
+        elif event.keysym == "Right":
+            self.pending_arrow[0] += self.model.arr_step
+        elif event.keysym == "Up":
+            self.pending_arrow[1] -= self.model.arr_step
+        elif event.keysym == "Down":
+            self.pending_arrow[1] += self.model.arr_step
+        self.schedule_input()
+
+
+    @tracer.traced
     def on_select_all(self):
-        """ Handle select all button press """
-        print("select all pressed")
-        self.model.selected = 0
+        """ Handle select all button press (toggles) """
+        log.debug("select all pressed")
         if self.model.all_selected:
-            self.model.all_selected = False
-            for layer in self.model.elements:
-                self.model.elements[layer].el_model.is_selected = False
-                self.model.elements[layer].el_view.dehighlight(None)
-            return
-        self.model.all_selected = True
-        for layer in self.model.elements:
-            self.model.elements[layer].el_model.is_selected = True
-            self.model.elements[layer].el_view.highlight(None)
-        self.view.deactivate_flip_checkbutton()
-        if len(self.model.elements) == 1:
-            # If only one element, set selected to it
-            layer = 1
-            self.model.selected = layer
-            self.model.elements[layer].el_model.is_selected = True
-            self.model.elements[layer].el_view.highlight(None)
-            self.view.update_rot_slider(self.model.elements[layer].el_model.rot)
-            self.view.activate_flip_checkbutton(
-                el_model=self.model.elements[self.model.selected].el_model
-            )
-
+            self.deselect_all()
+        else:
+            self.flush_input()
+            for element in self.model.elements.values():
+                if not element.el_model.is_selected:
+                    element.select()
+            self.model.all_selected = True
+        # Only a single element becomes primary
+        self.update_selection()
+
+    @tracer.traced
     def on_listbox_selection(self, event):
         """ Handle listbox selection """
         listbox_selection = self.view.get_listbox_selection()
-        print("listbox selection:", listbox_selection)
+        log.debug("listbox selection: %s", listbox_selection)
         if listbox_selection != 0:
             # Deselect all
-            self.model.all_selected = False
-            for layer in self.model.elements:
-                self.model.elements[layer].el_model.is_selected = False
-                self.model.elements[layer].el_view.dehighlight(None)
+            self.deselect_all()
             # Select the chosen one
-            self.model.selected = listbox_selection
-            self.model.elements[listbox_selection].el_model.is_selected = True
-            self.model.elements[listbox_selection].el_view.highlight(None)
-            self.view.update_rot_slider(self.model.elements[listbox_selection].el_model.rot)
-            self.view.activate_flip_checkbutton(
-                el_model=self.model.elements[self.model.selected].el_model
-            )
+            element = self.model.elements[listbox_selection]
+            element.select()
+            self.update_selection(element)
         else:
             self.model.selected = 0
 
+    @tracer.traced
     def on_rotation_changed(self, event):
-        """ Handle rotation slider change """
-        if self.model.selected != 0:
-            value = event
-            print("rotation changed:", value)
-            self.model.elements[self.model.selected].rotate(-int(value))
-
+        """ Handle rotation slider change, turning each selected element by the slider change from its synced angle """
+        angle = -int(event)
+        synced, self.slider_synced = self.slider_synced, None
+        if angle != synced and self.model.selection:
+            # Only remember the angle, slider events are applied once per idle loop
+            delta = angle - self.slider_base
+            for element in self.model.selection:
+                base = self.rotation_base.setdefault(element, element.el_model.rot)
+                self.pending_rotations[element] = (base + delta + 180) % 360 - 180
+            if self.rotation_job is None:
+                self.rotation_job = self.view.root.after_idle(self.apply_pending_rotations)
+
+    @tracer.traced
+    def apply_pending_rotations(self):
+        """ Apply latest slider angle of each element (fast preview texture, final one follows) """
+        self.rotation_job = None
+        pending, self.pending_rotations = self.pending_rotations, {}
+        changes = []
+        for element, angle in pending.items():
+            if element in self.model.spatial_index: # not removed in the meantime
+                changes.append((element.el_model.layer, element.el_model.rot, angle))
+                element.rotate(angle, preview=True)
+        if changes:
+            self.record(("rotate", tuple(sorted(changes))))
+
+    @tracer.traced
     def on_flip_state_changed(self):
-        """ Handle flip checkbutton change """
-        self.model.elements[self.model.selected].flip()
+        """ Handle flip checkbutton change, flipping the selected elements to the new state of the primary one """
+        primary = self.model.elements.get(self.model.selected)
+        if primary is None:
+            return
+        flipped = not primary.el_model.flipped
+        layers = []
+        for element in self.model.selection:
+            if element.el_model.flipped != flipped and element.el_model.instr.flippable:
+                element.flip()
+                layers.append(element.el_model.layer)
+        if layers:
+            self.record(("flip", tuple(sorted(layers))))
 
 
 
+    @tracer.traced
     def on_top_layer(self):
         """ Handle top layer button press """
-        selected_layer = self.model.selected
-        highest_layer = len(self.model.elements)
-        for _ in range(selected_layer, highest_layer):
-            self.on_up_layer()
+        self.move_layer(self.model.selected, len(self.model.elements))
 
+    @tracer.traced
     def on_up_layer(self):
         """ Handle layer up button press """
-        selected_layer = self.model.selected
-        # Swap selected element with element above, if not the highest element is selected
-        if selected_layer < len(self.model.elements) and selected_layer > 0:
-            self.layer_swap_control(layer=selected_layer, direction=1)
+        self.move_layer(self.model.selected, self.model.selected + 1)
 
+    @tracer.traced
     def on_down_layer(self):
         """ Handle layer down button press """
-        selected_layer = self.model.selected
-        # Swap selected element with element below, if not the lowest element is selected
-        if selected_layer > 1:
-            self.layer_swap_control(layer=selected_layer, direction=-1)
+        self.move_layer(self.model.selected, self.model.selected - 1)
 
+    @tracer.traced
     def on_bottom_layer(self):
         """ Handle bottom layer button press """
-        selected_layer = self.model.selected
-        for _ in range(1, selected_layer):
-            self.on_down_layer()
+        self.move_layer(self.model.selected, 1)
+
+    def move_layer(self, layer, new_layer):
+        """ Move element on layer to new layer, shifting the elements in between """
+        # Nothing to do if nothing is selected, or the element is already on the top/bottom layer
+        if (layer not in self.model.elements 
+            or new_layer not in self.model.elements 
+            or new_layer == layer
+        ):
+            return
+        element = self.model.elements[layer]
+        self.model.elements.move(element, new_layer)
+        self.record(("layer", layer, new_layer))
 
-    def layer_swap_control(self, layer=None, direction=None): 
-        """ Handle swapping of two elements. Swapping direction: 1 --> up, -1 --> down """
-        # Swap canvas elements
-        self.view.swap_up(layer - (direction == -1), self.model.elements)
+        # Restack canvas items once
+        if element.el_view.realized:
+            self.restack(element)
 
         # Adjust selected to new layer 
-        self.model.selected = layer + direction
-
-        # Update instance layers
-        self.model.elements[layer].el_model.layer = layer + direction
-        self.model.elements[layer + direction].el_model.layer = layer
-            
-        # Swap dictionary order
-        tmp = self.model.elements[layer]
-        self.model.elements[layer] = self.model.elements[layer + direction]
-        self.model.elements[layer + direction] = tmp
-
-        # Update markers
-        self.view.raise_all_markers(self.model.elements)
+        self.model.selected = new_layer
 
         # Update listbox
         self.view.update_listbox(self.model.elements, self.model.selected)
 
 
 
+    @tracer.traced
     def on_quit_requested(self):
         """ Handle quit request """
         self.view.show_quit_dialog(on_confirm=self.on_quit_confirmed)
 
+    @tracer.traced
     def on_quit_confirmed(self):
         """ Quit application """
+        # Clean exit, nothing to recover
+        self.autosave.close(discard=True)
+        self.thumbnails.close()
+        self.kit_library.close()
         self.view.root.destroy()
 
+    @tracer.traced
     def on_new(self):
         """ Handle new project request """
-        print("new")
+        log.debug("new")
         self.view.show_new_dialog(on_confirm=self.reset_app)
 
 
@@ -234,6 +592,9 @@ class AppController:
         for _, instance in self.model.elements.items():
             instance.el_view.clear()
             del instance
+        self.realized.clear()
+        self.pending_overlaps.clear()
+        self.request_culling()
     
         # Reset model variables (selected, elements...)
         self.model.reset_state()
@@ -245,87 +606,98 @@ class AppController:
         # Reset widgets
         self.view.refresh_gear_tree(self.model.instruments)
         self.view.update_listbox({}, 0)
-        self.view.update_rot_slider(0)
+        self.sync_rot_slider()
         self.view.deactivate_flip_checkbutton()
 
         # Reset window title
         self.view.set_title(config.DEFAULT_TITLE)
 
+        # Autosave starts from the empty kit
+        self.autosave.compact()
+
 
+    @tracer.traced
     def on_load(self):
         """ Handle load project request """
-        print("load")
+        log.debug("load")
         # Open file dialog for loading file
         file_path = self.view.show_load_project_dialog()
         if file_path:
-            self.reset_app()
-            with open(file_path, mode='r') as file:
-                reader = csv.DictReader(file)
-                new_layer = 1
-                for row in reader:
-                    self.create_element(int(row["ID"]), 
-                                        int(row["layer"]), 
-                                        pos=ast.literal_eval(row["position"]), 
-                                        rot=int(row["rotation"]), 
-                                        flipped=bool(int(row["flipped"]))
-                                        )
-                    self.model.elements[new_layer].rotate(int(row["rotation"])) # for now, can be more efficient
-                    self.model.instruments[int(row["ID"])].is_used = True
-                    new_layer += 1
-        
-            # Make sure all markers are on top
-            self.view.raise_all_markers(self.model.elements)
-        
-            # Deselect all elements
-            for layer in self.model.elements:
-                self.view.my_canvas.itemconfig(self.model.elements[layer].el_view.edge, outline='')
-                self.model.elements[layer].el_model.is_selected = False
-            self.model.selected = 0
-            self.view.update_listbox(self.model.elements, 0)
-            self.view.refresh_gear_tree(self.model.instruments)
-
-            self.model.save_path = file_path
-            self.view.set_title(file_path)
+            self.load_kit_file(file_path)
+
+    @tracer.traced
+    def on_kit_library(self):
+        """ Handle kit library request: show index of kits directory, thumbnails are added when rendered """
+        entries = self.kit_library.scan()
+        log.info("kit library: %d kits, %d parsed", len(entries), self.kit_library.parsed)
+        self.view.show_kit_library(entries, on_open=self.on_library_open)
+        self.kit_library.request_thumbnails(self.view.root, self.view.set_kit_thumbnail, config.THUMBNAIL_POLL_MS)
+
+    @tracer.traced
+    def on_library_open(self, name):
+        """ Handle kit opened in kit library """
+        self.load_kit_file(str(self.kit_library.path(name)))
+
+    def load_kit_file(self, file_path):
+        """ Replace current kit with kit file (CSV or binary, detected from file content) """
+        self.reset_app()
+        rows = kit_io.load_kit(file_path, self.model.instruments.fingerprint)
+        self.load_rows(rows)
+    
+        # Deselect all elements
+        self.deselect_all()
+        self.view.update_listbox(self.model.elements, 0)
+        self.view.refresh_gear_tree(self.model.instruments)
 
-    def on_save(self): # Can be structured more efficiently and more MVC style
+        self.model.save_path = file_path
+        self.view.set_title(file_path)
+
+        # Autosave starts from the loaded kit
+        self.autosave.compact()
+
+    def load_rows(self, rows):
+        """ Create elements from kit rows, bottom layer first """
+        new_layer = 1
+        for row in rows:
+            element = self.create_element(row["ID"], 
+                                          new_layer, 
+                                          pos=row["position"], 
+                                          rot=row["rotation"], 
+                                          flipped=bool(row["flipped"])
+                                          )
+            element.rotate(row["rotation"]) # for now, can be more efficient
+            self.model.instruments[row["ID"]].is_used = True
+            new_layer += 1
+        self.request_culling()
+
+    @tracer.traced
+    def on_save(self):
         """ Handle save project request """
-        print("save")
+        log.debug("save")
         save_path = self.model.save_path
         if save_path is not None:
-            # clear file
-            with open(save_path, 'w', newline='') as csvfile:
-                csv_writer = csv.writer(csvfile)
-                csv_writer.writerow(config.COLUMN_NAMES)
-        
-            # Save to file
-            for layer in self.model.elements:
-                new_element = {"ID": self.model.elements[layer].el_model.instr.ID, 
-                                "layer": self.model.elements[layer].el_model.layer, 
-                                "position": self.model.elements[layer].el_model.pos, 
-                                "rotation": self.model.elements[layer].el_model.rot, 
-                                "flipped": int(self.model.elements[layer].el_model.flipped)
-                                }
-                csv_io.append_to_csv(save_path, new_element, config.COLUMN_NAMES)
-            print("Data saved to:", save_path)
+            kit_io.save_kit(save_path, kit_io.kit_rows(self.model.elements), self.model.instruments.fingerprint)
+            log.info("Data saved to: %s", save_path)
             self.view.show_project_saved_message()
         else:
             self.on_save_as()
 
+    @tracer.traced
     def on_save_as(self):
         """ Handle save as project request """
-        print("save as")
+        log.debug("save as")
         # Get save path from dialog
         file_path = self.view.show_save_project_dialog()
 
         if file_path:
-            csv_io.save_to_csv(file_path, config.COLUMN_NAMES)
             self.model.save_path = file_path
             self.on_save()
             self.view.set_title(file_path)
 
+    @tracer.traced
     def on_save_image(self):
         """ Handle save image request """
-        print("save image")
+        log.debug("save image")
         # Get save path from dialog
         file_path = self.view.show_save_image_dialog()
         if file_path:
@@ -333,107 +705,217 @@ class AppController:
             # Ensure the layout is updated
             self.view.root.update_idletasks() # Not MVC
 
-            # Get real canvas size
-            canvas_size = self.view.get_real_canvas_size()
+            # Get exported stage region size
+            canvas_size = self.export_size()
 
             # Render image
-            image = image_utils.render_project_image(canvas_size, self.model.elements)
+            timings = render.new_timings()
+            image = render.render_project_image(canvas_size, self.model.elements, timings)
             
             # Save the final image
-            image.save(file_path)
+            render.save_image(image, file_path, timings)
+            log.info("Image export: %s", render.format_timings(timings))
+            self.view.show_image_saved_message()
+
+
+    @tracer.traced
+    def on_save_poster(self):
+        """ Handle save poster image request (high resolution, rendered in bands) """
+        log.debug("save poster")
+        scale = self.view.ask_poster_scale()
+        if not scale:
+            return
+        file_path = self.view.show_save_image_dialog()
+        if file_path:
+            # Ensure the layout is updated
+            self.view.root.update_idletasks() # Not MVC
+            canvas_size = self.export_size()
+
+            timings = render.new_timings()
+            size = render.render_poster(file_path, canvas_size, render.element_sprites(self.model.elements), scale, 
+                                        timings=timings)
+            log.info("Poster export %s: %s", size, render.format_timings(timings))
             self.view.show_image_saved_message()
 
 
+    def export_size(self):
+        """ Get size of the exported stage region: canvas window size, enlarged to elements beyond it, within the stage """
+        width, height = self.view.get_real_canvas_size()
+        for _, element in self.model.elements.items():
+            _, _, x1, y1 = self.model.spatial_index.bounds(element)
+            width, height = max(width, x1), max(height, y1)
+        return min(round(width), config.STAGE_WIDTH), min(round(height), config.STAGE_HEIGHT)
+
+    @tracer.traced
     def on_view_gear(self):
         """ Handle view gear request """
         self.view.show_gear_popup(self.model.instruments)
 
+    @tracer.traced
     def on_increase_move_step(self):
         """ Handle increase move step request """
         if self.model.arr_step + config.ARR_STEP_INCREMENT <= 20:
             self.model.arr_step += config.ARR_STEP_INCREMENT
-        print("increase move step:", self.model.arr_step)
+        log.info("increase move step: %d", self.model.arr_step)
 
+    @tracer.traced
     def on_decrease_move_step(self):
         """ Handle decrease move step request """
         if self.model.arr_step - config.ARR_STEP_INCREMENT >= 1:
             self.model.arr_step -= config.ARR_STEP_INCREMENT
-        print("decrease move step:", self.model.arr_step)
+        log.info("decrease move step: %d", self.model.arr_step)
 
+    @tracer.traced
     def on_add(self):
         """ Handle add element request """
         # Get selected item from gear tree
         selected_instrument = self.view.gear_tree.selection()
         selection_name = self.view.gear_tree.item(selected_instrument)['text']
         if selection_name == "":
-            print("No instrument selected, cannot add element.")
+            log.warning("No instrument selected, cannot add element.")
             return
         
-        print(f"Add element requested ({selection_name})")
-        for id, instance in enumerate(self.model.instruments):
-            if instance.name == selection_name:
-                new_layer = len(self.model.elements) + 1
-                self.create_element(id, new_layer)
-        
-                # Add name to listbox
-                self.view.update_listbox(self.model.elements, new_layer)
+        log.debug("Add element requested (%s)", selection_name)
+        instance = self.model.instruments.by_name(selection_name)
+        if instance is None:
+            log.warning("Unknown instrument, cannot add element.")
+            return
 
-                # Make sure all markers are on top
-                self.view.raise_all_markers(self.model.elements)
+        # Spawn in the visible part of the stage (it may be scrolled or zoomed)
+        x0, y0, _, _ = self.view.get_visible_bounds()
+        pos = [round(max(x0, 0)) + config.SPAWN_POINT[0], round(max(y0, 0)) + config.SPAWN_POINT[1]]
+        new_layer = len(self.model.elements) + 1
+        element = self.create_element(instance.ID, new_layer, pos=pos)
 
-                # Mark instrument as used
-                instance.is_used = True
+        # Mark instrument as used
+        instance.is_used = True
 
-                # Update gear tree
-                self.view.refresh_gear_tree(self.model.instruments)
+        # Update gear tree
+        self.view.set_gear_item_visible(instance, False)
 
-                # Reset rotation slider
-                self.view.update_rot_slider(0)
+        # Add name to listbox, reset rotation slider, activate flip button if applicable
+        self.update_selection(element)
 
-                # Activate flip button if applicable
-                self.view.activate_flip_checkbutton(
-                    el_model=self.model.elements[self.model.selected].el_model
-                )
-                break
+        self.record(("add", (self.element_row(element),)))
+        self.request_culling()
 
 
+    @tracer.traced
     def on_remove(self):
-        """ Handle remove element request """
-        # Add option to remove all here?
-        # Get selected element
-        selected = self.model.selected
-        if selected != 0:
-            instr_index = self.model.elements[selected].el_model.instr.ID
-            self.model.instruments[instr_index].is_used = False
-
-            # Save current num of elements
-            old_length = len(self.model.elements)
-            # Remove selected element
-            self.model.elements[selected].el_view.clear()
-            del self.model.elements[selected]
-
-            # Reorder layering
-            # Iterate through elements, stopping before reaching the old dict length (new_length = old_length - 1)
-            for i in range(selected, old_length):
-                self.model.elements[i] = self.model.elements.pop(i+1)
-                self.model.elements[i].layer = i
-
+        """ Handle remove element request (removes all selected elements) """
+        selection = list(self.model.selection)
+        if selection:
+            rows = tuple(sorted(self.element_row(element) for element in selection))
+            self.remove_elements(selection)
+            self.record(("remove", rows))
+
+    def remove_elements(self, elements):
+        """ Remove elements from canvas and model """
+        if elements:
             # Set no selection
-            self.model.selected = 0
-
-            # Update listbox and gear tree
+            self.deselect_all()
+
+            # Partners of removed elements may no longer overlap anything
+            self.pending_overlaps.difference_update(elements)
+            for partner in self.model.remove_overlaps(elements) - set(elements):
+                partner.el_view.set_overlapping(partner in self.model.overlaps)
+
+            for element in elements:
+                element.el_model.instr.is_used = False
+                element.el_view.clear()
+                self.realized.discard(element)
+                self.model.spatial_index.remove(element)
+                if self.model.hovering is element:
+                    self.model.hovering = None
+                self.view.set_gear_item_visible(element.el_model.instr, True)
+
+            # Remove elements, elements above move down
+            self.model.elements.remove_many(elements)
+
+            # Update listbox
             self.view.update_listbox(self.model.elements, 0)
-            self.view.refresh_gear_tree(self.model.instruments)
 
             self.view.deactivate_flip_checkbutton()
+            self.request_culling()
+
+    def restore_elements(self, rows):
+        """ Recreate elements from rows (layer, instrument ID, x, y, rotation, flipped), ascending layers """
+        for layer, instr_id, x, y, rot, flipped in rows:
+            element = self.create_element(instr_id, layer, pos=[x, y], rot=rot, flipped=flipped)
+            element.rotate(rot)
+            self.model.instruments[instr_id].is_used = True
+            self.view.set_gear_item_visible(self.model.instruments[instr_id], False)
+        self.select_layers(row[0] for row in rows)
+        self.request_culling()
+
+    def element_row(self, element):
+        """ Get (layer, instrument ID, x, y, rotation, flipped) of element for the history """
+        el_model = element.el_model
+        return (el_model.layer, el_model.instr.ID, el_model.pos[0], el_model.pos[1], el_model.rot, el_model.flipped)
+
+    @tracer.traced
+    def on_undo(self, event=None):
+        """ Handle undo request """
+        self.flush_input()
+        entry = self.model.history.undo()
+        if entry is not None:
+            log.debug("undo: %s", entry[0])
+            self.replay(invert(entry))
+
+    @tracer.traced
+    def on_redo(self, event=None):
+        """ Handle redo request """
+        self.flush_input()
+        entry = self.model.history.redo()
+        if entry is not None:
+            log.debug("redo: %s", entry[0])
+            self.replay(entry)
+
+    def record(self, entry):
+        """ Record done operation (history entry) for undo and autosave """
+        if self.model.history.recording:
+            self.model.history.record(entry)
+            self.autosave.append(entry)
+
+    @tracer.traced
+    def replay(self, entry, journal=True):
+        """ Apply history entry (selecting the affected elements), undo replays the inverted entry
+
+        The entry is appended to the autosave journal unless journal is False (replaying the journal itself).
+        """
+        kind = entry[0]
+        with self.model.history.paused():
+            if kind == "move":
+                _, layers, dx, dy = entry
+                self.select_layers(layers)
+                self.model.move_selection(dx, dy)
+                self.view.move_selected(dx, dy)
+                self.request_overlap_check(self.model.selection)
+                self.request_culling()
+            elif kind == "rotate":
+                self.select_layers(layer for layer, _, _ in entry[1])
+                for layer, _, new_angle in entry[1]:
+                    self.model.elements[layer].rotate(new_angle)
+            elif kind == "flip":
+                self.select_layers(entry[1])
+                for layer in entry[1]:
+                    self.model.elements[layer].flip()
+            elif kind == "layer":
+                _, layer, new_layer = entry
+                self.select_layers((layer,))
+                self.move_layer(layer, new_layer)
+            elif kind == "add":
+                self.restore_elements(entry[1])
+            elif kind == "remove":
+                self.remove_elements([self.model.elements[row[0]] for row in entry[1]])
+        if journal:
+            self.autosave.append(entry)
+        self.update_selection(self.model.elements.get(self.model.selected))
 
     def create_element(self, instr_id, new_layer, pos=config.SPAWN_POINT.copy(), rot=0, flipped=False):
         """ Create a new canvas element on given layer with given instrument ID """
         # Deselect other elements
-        self.model.all_selected = False
-        for layer in self.model.elements:
-            self.model.elements[layer].el_model.is_selected = False
-            self.model.elements[layer].el_view.dehighlight(None)
+        self.deselect_all()
 
         # Get instrument to add
         new_instr = self.model.instruments[instr_id]
@@ -449,7 +931,9 @@ class AppController:
 
         element_view = ElementView(
             canvas=self.view.my_canvas,
-            el_model=element_model
+            el_model=element_model,
+            viewport=self.view.viewport,
+            texture_loader=self.texture_loader
         )
 
         element_controller = ElementController(
@@ -458,10 +942,16 @@ class AppController:
             app_controller=self
         )
 
-        # Add to elements dictionary
-        self.model.elements[new_layer] = element_controller
+        # Add to layer stack and spatial index, canvas items only if in view
+        self.model.elements.insert(element_controller, new_layer)
+        self.model.spatial_index.insert(element_controller, element_model.bounds())
+        if not config.VIRTUAL_CANVAS or self.is_in_view(element_model.bounds()):
+            self.realize(element_controller)
+        self.request_overlap_check((element_controller,))
+        return element_controller
 
 
+    @tracer.traced
     def on_background_selection(self, event):
         """ Handle background image selection """
         self.view.set_background()
@@ -1,20 +1,62 @@
 # Main: main application entry point (MVC pattern)
 
+import time
+START = time.perf_counter() # before the (slow) imports of tkinter, Pillow and the app modules
+
+import logging
 import tkinter as tk
+import config
 from model import AppState
 from view import AppView
 from controller import AppController
+from utils import image_utils
+from utils import render
+from utils.trace import PhaseTimer, setup_logging, tracer
+
+def log_cache_stats(log, name, cache):
+    """ Log counters of LRU cache (DEBUG), for tuning its budget """
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    log.debug(
+        "%s: %d hits, %d misses (%.0f%% hits), %d evictions, %d entries, %.1f of %.1f MiB",
+        name, stats["hits"], stats["misses"], 100 * stats["hits"] / lookups if lookups else 0,
+        stats["evictions"], stats["entries"], stats["used"] / 2**20, stats["budget"] / 2**20
+    )
 
 def main():
+    setup_logging()
+    if config.TRACE_FILE:
+        tracer.enable()
+    log = logging.getLogger(__name__)
+
+    # Startup report (log level INFO), the background image is loaded after the first paint
+    startup = PhaseTimer("startup", START)
+    startup.mark("import")
+
     root = tk.Tk()
 
     model = AppState(number=5)
     view = AppView(root)
     view.pack(padx=10, pady=10)
+    startup.mark("widgets")
 
+    # Mostly parsing the gear catalog and filling the gear tree
     controller = AppController(model, view)
+    startup.mark("catalog")
+
+    def first_paint():
+        startup.mark("first paint")
+        startup.report(log)
+    view.bind_first_paint(first_paint)
 
     root.mainloop()
 
+    log_cache_stats(log, "texture cache", image_utils.texture_cache)
+    log_cache_stats(log, "sprite cache", render.sprite_cache)
+
+    if config.TRACE_FILE:
+        count = tracer.write(config.TRACE_FILE)
+        log.warning("Trace with %d events written to: %s", count, config.TRACE_FILE)
+
 if __name__ == "__main__":
     main()
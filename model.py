@@ -1,33 +1,149 @@
 # Model: handling the application state and data
 
-from models.instrument import Instrument
+from models.gear_catalog import GearCatalog
+from models.layer_stack import LayerStack
+from models.history import History
+from utils.spatial_index import SpatialGrid
+from utils import collisions
 import config
-from utils import csv_io
 
 class AppState:
     def __init__(self, number: float):
-        self.instruments = [] # index is the instrument ID
-        self.elements = {} # dictionary of elements, key is layer
-        self.hovering = 0 # layer of element, above which mouse is hovering, 0 if None
-        self.selected = 0 # selected layer, 0 if None
+        self.instruments = GearCatalog() # index is the instrument ID
+        self.elements = LayerStack() # element controllers, accessed by layer
+        self.hovering = None # element controller, above which mouse is hovering
+        self.dragging = None # element controller being dragged with the mouse
+        self.spatial_index = SpatialGrid(config.SPATIAL_CELL_SIZE) # element controllers by canvas bounds
+        self.overlaps = {} # element controller -> set of element controllers it overlaps (only overlapping ones)
+        self.selected = 0 # layer of primary selected element (rotation slider, flip, layer buttons), 0 if None
+        self.selection = set() # selected element controllers
         self.all_selected = False # If all elements are selected via all_button
+        self.selection_edges = None # (min_x, max_x, min_y, max_y) of selected positions, None if outdated
+        self.stage_size = (config.STAGE_WIDTH, config.STAGE_HEIGHT) # area elements are kept in (not the canvas window)
+        self.history = History(config.HISTORY_BUDGET, config.HISTORY_COALESCE_MS) # undo/redo journal
         self.save_path = None
         self.arr_step = config.ARR_STEP_DEFAULT
 
 
     def load_instruments_from_csv(self, path):
         """ (Re-)load instruments list from CSV file """
-        self.instruments.clear()
-        num_instruments = csv_io.get_row_count_from_csv(self, path)
-        for idx in range(num_instruments):
-            instrument = Instrument(idx)
-            self.instruments.append(instrument)
+        self.instruments.load(path)
 
 
     def reset_state(self):
         """ Reset project-relevant state variables """
-        self.elements = {}
-        self.hovering = 0
+        self.elements.clear()
+        self.hovering = None
+        self.dragging = None
+        self.spatial_index.clear()
+        self.overlaps.clear()
         self.selected = 0
+        self.selection.clear()
         self.all_selected = False
-        self.save_path = None
\ No newline at end of file
+        self.selection_edges = None
+        self.history.clear()
+        self.save_path = None
+
+    def element_at(self, x, y):
+        """ Get topmost element controller at canvas position (x, y), None if no element there """
+        topmost = None
+        for element in self.spatial_index.query_point(x, y):
+            if (element.el_model.contains(x, y)
+                and (topmost is None or element.el_model.layer > topmost.el_model.layer)
+            ):
+                topmost = element
+        return topmost
+
+    def elements_in_rect(self, bounds):
+        """ Get set of element controllers lying completely inside box (x0, y0, x1, y1) """
+        x0, y0, x1, y1 = bounds
+        inside = set()
+        for element in self.spatial_index.query_rect(bounds):
+            bx0, by0, bx1, by1 = self.spatial_index.bounds(element)
+            if bx0 >= x0 and by0 >= y0 and bx1 <= x1 and by1 <= y1:
+                inside.add(element)
+        return inside
+
+    def add_to_selection(self, element):
+        """ Add element controller to selection, extending the selection edges """
+        self.selection.add(element)
+        if self.selection_edges is not None:
+            x, y = element.el_model.pos
+            min_x, max_x, min_y, max_y = self.selection_edges
+            self.selection_edges = (min(min_x, x), max(max_x, x), min(min_y, y), max(max_y, y))
+
+    def remove_from_selection(self, element):
+        """ Remove element controller from selection """
+        self.selection.discard(element)
+        self.selection_edges = None
+
+    def get_selection_edges(self):
+        """ Position edges of selected elements, computed once and then shifted along with the selection """
+        if self.selection_edges is None and self.selection:
+            xs = [element.el_model.pos[0] for element in self.selection]
+            ys = [element.el_model.pos[1] for element in self.selection]
+            self.selection_edges = (min(xs), max(xs), min(ys), max(ys))
+        return self.selection_edges
+
+    def move_selection(self, dx, dy):
+        """ Move positions of all selected elements by (dx, dy), updating spatial index and selection edges """
+        for element in self.selection:
+            element.el_model.move(dx, dy)
+            self.spatial_index.update(element, element.el_model.bounds())
+        self.shift_selection_edges(dx, dy)
+
+    def shift_selection_edges(self, dx, dy):
+        """ Update selection edges after the selection moved by (dx, dy) """
+        if self.selection_edges is not None:
+            min_x, max_x, min_y, max_y = self.selection_edges
+            self.selection_edges = (min_x + dx, max_x + dx, min_y + dy, max_y + dy)
+
+    def clamp_move(self, dx, dy, edges):
+        """ Limit movement (dx, dy) so that edges (min_x, max_x, min_y, max_y) stay on the stage """
+        width, height = self.stage_size
+        # Edges already off the stage may only move back towards it
+        dx = min(max(dx, min(0, -edges[0])), max(0, width - edges[1]))
+        dy = min(max(dy, min(0, -edges[2])), max(0, height - edges[3]))
+        return dx, dy
+
+    def update_overlaps(self, changed, tolerance=0.0):
+        """ Recompute overlaps of changed elements (moved, rotated, added), return set of elements whose overlaps changed
+
+        Candidates are the elements with intersecting bounds in the spatial index, all
+        candidate pairs are tested at once.
+        """
+        affected = self.remove_overlaps(changed)
+        pairs = []
+        done = set()
+        for element in changed:
+            if element not in self.spatial_index:
+                # Removed in the meantime
+                continue
+            affected.add(element)
+            for other in self.spatial_index.query_rect(self.spatial_index.bounds(element)):
+                if other is not element and other not in done:
+                    pairs.append((element, other))
+            done.add(element)
+        if pairs:
+            hits = collisions.overlapping(
+                [a.el_model.shape() for a, _ in pairs], [b.el_model.shape() for _, b in pairs], tolerance
+            )
+            for (a, b), hit in zip(pairs, hits):
+                if hit:
+                    self.overlaps.setdefault(a, set()).add(b)
+                    self.overlaps.setdefault(b, set()).add(a)
+                    affected.add(b)
+        return affected
+
+    def remove_overlaps(self, elements):
+        """ Forget overlaps of elements (e.g. removed), return set of the elements they overlapped """
+        partners = set()
+        for element in elements:
+            for other in self.overlaps.pop(element, ()):
+                others = self.overlaps.get(other)
+                if others is not None:
+                    others.discard(element)
+                    if not others:
+                        del self.overlaps[other]
+                partners.add(other)
+        return partners
@@ -1,77 +1,37 @@
 # Element Controller: handling element events (connecting view and model)
 
-from utils import geometry
-
 class ElementController:
     def __init__(self, el_model, el_view, app_controller):
         self.el_model = el_model
         self.el_view = el_view
         self.app = app_controller
 
-        # Create edge and marker in view
-        self.el_view.set_edge_and_marker(
-            self.el_model.instr.is_circular, 
-            self.el_model.instr.r, self.el_model.pos
-        )
-
-        # Binds
-        self.el_view.bind_marker(
-            enter=self.on_enter, 
-            leave=self.on_leave, 
-            drag_start=self.on_drag_start, 
-            drag_stop=self.on_drag_stop, 
-            drag=self.on_drag
-        )
-
-        # Select self
-        self.el_model.is_selected = True
+        # Select self (canvas items are created when the element is realized)
+        self.select()
         self.app.model.selected = self.el_model.layer
-        self.el_view.highlight([])
 
     
     # Mouse click
-    def mouse_click(self):
-        # Move this logic into controller.py?
-        """ Changing elements' state of being selected (T/F) when mouse is clicked on canvas """
-        if self.app.model.hovering == self.el_model.layer:
-            self.el_model.is_selected = True
-            self.app.model.selected = self.el_model.layer
-            self.app.view.rot_slider.set(-self.el_model.rot)
-            self.el_view.highlight(None)
-        else:
-            self.el_model.is_selected = False
-            self.el_view.dehighlight(None)
-
-    def move_element(self, dx, dy, selection_edges=None):
-        """ Move element by (dx, dy), checking canvas bounds """
-        if self.el_model.is_selected:
-            x_border, y_border = self.el_view.get_canvas_borders()
-            # Get current position or selection edges
-            selection_edges = (
-                selection_edges if selection_edges 
-                else (self.el_model.pos[0], 
-                      self.el_model.pos[0], 
-                      self.el_model.pos[1], 
-                      self.el_model.pos[1])
-            )
+    def select(self):
+        """ Add element to selection (e.g. when clicked on canvas) """
+        self.el_model.is_selected = True
+        self.app.model.add_to_selection(self)
+        self.el_view.set_selected(True)
 
-            # Check if movement would go out of canvas bound
-            if (selection_edges[1] + dx <= x_border 
-                and selection_edges[0] + dx >= 0 
-                and selection_edges[3] + dy <= y_border 
-                and selection_edges[2] + dy >= 0
-            ):
-                self.el_model.move(dx, dy)
-                self.el_view.move(dx, dy)
+    def deselect(self):
+        """ Remove element from selection """
+        self.el_model.is_selected = False
+        self.app.model.remove_from_selection(self)
+        self.el_view.set_selected(False)
 
     def on_enter(self, event):
-        """ Mouse entering element marker """
+        """ Mouse entering element """
         self.el_view.highlight(event)
-        self.app.model.hovering = self.el_model.layer
+        self.app.model.hovering = self
 
     def on_leave(self, event):
-        """ Mouse leaving element marker """
-        self.app.model.hovering = 0
+        """ Mouse leaving element """
+        self.app.model.hovering = None
         if (not self.app.model.all_selected 
             and not self.el_model.is_selected
         ):
@@ -79,9 +39,8 @@ class ElementController:
 
     def on_drag_start(self, event):
         """ Beginning drag of an element """
-        # record the item and its location
-        self.el_model.drag_data_x = event.x
-        self.el_model.drag_data_y = event.y
+        # record the item and its location (on stage, independent of zoom and scrolling)
+        self.el_model.drag_data_x, self.el_model.drag_data_y = self.app.view.get_canvas_position(event)
 
     def on_drag_stop(self, event):
         """ End drag of an element """
@@ -91,34 +50,29 @@ class ElementController:
 
     def on_drag(self, event):
         """ Handle dragging of an element """
-        # compute how much the mouse has moved
-        delta_x = event.x - self.el_model.drag_data_x
-        delta_y = event.y - self.el_model.drag_data_y
+        # compute how much the mouse has moved, in whole stage pixels (the rest carries over when zoomed in)
+        x, y = self.app.view.get_canvas_position(event)
+        delta_x = round(x - self.el_model.drag_data_x)
+        delta_y = round(y - self.el_model.drag_data_y)
 
-        # move the object
-        self.move_element(delta_x, delta_y)
+        # move the object (together with the other selected elements)
+        self.app.move_selection(delta_x, delta_y)
 
         # record the new position
-        self.el_model.drag_data_x = event.x
-        self.el_model.drag_data_y = event.y
+        self.el_model.drag_data_x += delta_x
+        self.el_model.drag_data_y += delta_y
 
-    def rotate(self, angle):
-        """ Rotate element to angle """
+    def rotate(self, angle, preview=False):
+        """ Rotate element to angle (with preview: show fast texture first, final one when ready) """
         # Update model and update texture
         self.el_model.rot = angle
-        self.el_view.update_texture()
+        self.el_view.update_texture(preview)
         
-        # Rotate edge and marker shape if rectangular
+        # Rotate edge shape if rectangular
         if not self.el_model.instr.is_circular:
-            position = self.el_model.pos
-            new_points = []
-            for i in range(0, 8, 2):
-                x, y = self.el_model.polygon_points[i], self.el_model.polygon_points[i+1]
-                rotated = geometry.rotate_point(x, y, angle)
-                new_points.append(rotated[0] + position[0])
-                new_points.append(rotated[1] + position[1])
-            self.el_view.canvas.coords(self.el_view.edge, new_points)
-            self.el_view.canvas.coords(self.el_view.marker, new_points)
+            self.el_view.update_edge(self.el_model.outline_points())
+            self.app.model.spatial_index.update(self, self.el_model.bounds())
+            self.app.request_overlap_check((self,))
 
         """
         # Update view
@@ -132,4 +86,4 @@ class ElementController:
         """ Flip element if possible """
         if self.el_model.instr.flippable:
             self.el_model.flipped = not self.el_model.flipped
-            self.el_view.update_texture()
+            self.el_view.update_texture()
\ No newline at end of file
@@ -1,5 +1,7 @@
 # Element Model: handling element state
 
+from utils import geometry
+
 class ElementModel:
     def __init__(self, instr, layer, pos, rot=0, flipped=False):
         self.instr = instr
@@ -26,4 +28,28 @@ class ElementModel:
         """ Set element position data """
         x, y = self.pos
         new_pos = [x + dx, y + dy]
-        self.pos = new_pos
\ No newline at end of file
+        self.pos = new_pos
+
+    def outline_points(self):
+        """ Polygon points, rotated and moved to position (rectangular elements only) """
+        return geometry.rotate_polygon(self.polygon_points, self.rot, self.pos)
+
+    def shape(self):
+        """ Shape (x, y, r, is_circular, angle) for overlap tests (see utils.collisions) """
+        return self.pos[0], self.pos[1], self.instr.r, self.instr.is_circular, self.rot
+
+    def bounds(self):
+        """ Bounding box (x0, y0, x1, y1) of element on canvas """
+        if self.instr.is_circular:
+            r = self.instr.r
+            x, y = self.pos
+            return x - r, y - r, x + r, y + r
+        return geometry.polygon_bounds(self.outline_points())
+
+    def contains(self, x, y):
+        """ Check if point lies on element (circle or rotated square) """
+        if self.instr.is_circular:
+            dx = x - self.pos[0]
+            dy = y - self.pos[1]
+            return dx*dx + dy*dy <= self.instr.r*self.instr.r
+        return geometry.point_in_polygon(x, y, self.outline_points())
\ No newline at end of file
@@ -4,60 +4,100 @@ from utils import image_utils
 import config 
 
 class ElementView:
-    def __init__(self, canvas, el_model):
+    def __init__(self, canvas, el_model, viewport, texture_loader=None):
         self.canvas = canvas
         self.el_model = el_model
-
+        self.viewport = viewport # stage to canvas transform (zoom)
+        self.texture_loader = texture_loader # prepares final textures in the background (preview updates)
+
+        # Canvas items and texture exist only while realized (see realize), state is kept meanwhile
+        self.texture = None
+        self.image = None
+        self.edge = None
+        self.selected = False
+        self.highlighted = False
+        self.overlapping = False
+
+    @property
+    def realized(self):
+        return self.image is not None
+
+    def realize(self):
+        """ Create texture, image and edge on canvas (on top of all items, to be restacked by the caller) """
+        if self.realized:
+            return
         self.texture = self._load_texture()
         self.image = self.canvas.create_image(
-            *el_model.pos, anchor="center", image=self.texture
+            *self.viewport.to_canvas(*self.el_model.pos), anchor="center", image=self.texture
         )
+        self.set_edge(self.el_model.instr.is_circular, self.el_model.instr.r, self.el_model.pos)
+        if self.selected:
+            self.canvas.addtag_withtag(config.SELECTED_TAG, self.image)
+            self.canvas.addtag_withtag(config.SELECTED_TAG, self.edge)
+        self._update_outline()
+
+    def unrealize(self):
+        """ Delete canvas items and texture (element is out of view), keeping selection and highlight state """
+        if not self.realized:
+            return
+        if self.texture_loader is not None:
+            self.texture_loader.cancel(self)
+        self.canvas.delete(self.image)
+        self.canvas.delete(self.edge)
+        self.texture = None
+        self.image = None
+        self.edge = None
 
-
-    def bind_marker(self, *, enter=None, leave=None, drag_start=None, drag_stop=None, drag=None):
-        """ Bind events to the marker """
-        self.canvas.tag_bind(self.marker, "<Enter>", enter)
-        self.canvas.tag_bind(self.marker, "<Leave>", leave)
-        self.canvas.tag_bind(self.marker, "<ButtonPress-1>", drag_start)
-        self.canvas.tag_bind(self.marker, "<ButtonRelease-1>", drag_stop)
-        self.canvas.tag_bind(self.marker, "<B1-Motion>", drag)
-
-
-    def _load_texture(self):
-        """ Load canvas element texture """
-        path = (
+    def _texture_path(self):
+        return (
             self.el_model.instr.flipped_path
             if self.el_model.flipped
             else self.el_model.instr.default_path
         )
-        return image_utils.instrument_image(path, self.el_model.rot)
+
+    def _load_texture(self):
+        """ Load canvas element texture """
+        return image_utils.instrument_image(
+            self._texture_path(), self.el_model.rot, self.el_model.flipped, self.viewport.zoom
+        )
     
-    def update_texture(self):
-        """ Update elements' texture on canvas """
-        self.texture = self._load_texture()
+    def update_texture(self, preview=False):
+        """ Update elements' texture on canvas
+
+        With preview, a fast low quality texture is shown unless the final one is cached,
+        the final texture is prepared in the background and swapped in when ready.
+        """
+        if not self.realized:
+            # Texture is loaded when realized
+            return
+        if preview and self.texture_loader is not None:
+            path = self._texture_path()
+            zoom = self.viewport.zoom
+            texture = image_utils.cached_instrument_image(path, self.el_model.rot, self.el_model.flipped, zoom)
+            if texture is None:
+                texture = image_utils.preview_image(path, self.el_model.rot, zoom)
+                self.texture_loader.request(self, path, self.el_model.rot, self.update_texture, zoom)
+            else:
+                self.texture_loader.cancel(self)
+            self.texture = texture
+        else:
+            self.texture = self._load_texture()
         self.canvas.itemconfig(self.image, image=self.texture)
 
 
-    def set_edge_and_marker(self, is_circular, r, pos):
-        """ Set up edge and marker on canvas """
+    def set_edge(self, is_circular, r, pos):
+        """ Set up edge (selection/hover outline) on canvas """
         if is_circular:
             # Create circle
             self.edge = self.draw_circle(r, pos)
-            self.marker = self.draw_circle(r, pos)
         else:
             # Create polygon (square)
-            self.edge = self.draw_polygon(self.el_model.polygon_points)
-            self.marker = self.draw_polygon(self.el_model.polygon_points)
-            self.canvas.move(self.marker, pos[0], pos[1])
-            self.canvas.move(self.edge, pos[0], pos[1])
+            self.edge = self.draw_polygon(self.el_model.outline_points())
 
     def draw_circle(self, r, pos):
         """ Draw and return circle on canvas with given radius and position """
         circle = self.canvas.create_oval(
-                pos[0]-r, 
-                pos[1]-r, 
-                pos[0]+r, 
-                pos[1]+r, 
+                *self.viewport.scale_points([pos[0]-r, pos[1]-r, pos[0]+r, pos[1]+r]), 
                 width=3, 
                 outline=''
             )
@@ -71,7 +111,7 @@ class ElementView:
     def draw_polygon(self, polygon_points):
         """ Draw and return square on canvas with given polygon points """
         polygon = self.canvas.create_polygon(
-                polygon_points, 
+                self.viewport.scale_points(polygon_points), 
                 width=3, 
                 outline=''
             )
@@ -86,28 +126,53 @@ class ElementView:
 
     def highlight(self, event):
         """ Highlight self with red outline """
-        self.canvas.itemconfig(self.edge, outline='red')
+        self.highlighted = True
+        self._update_outline()
 
     def dehighlight(self, event):
         """ Un-highlight self """
-        self.canvas.itemconfig(self.edge, outline='')
-
+        self.highlighted = False
+        self._update_outline()
+
+    def set_overlapping(self, overlapping):
+        """ Mark self as overlapping other elements (dashed outline) or not """
+        if overlapping != self.overlapping:
+            self.overlapping = overlapping
+            self._update_outline()
+
+    def _update_outline(self):
+        """ Outline of edge: red if highlighted, else overlap color if overlapping, dashed if overlapping """
+        if not self.realized:
+            return
+        if self.highlighted:
+            outline = 'red'
+        elif self.overlapping:
+            outline = config.OVERLAP_COLOR
+        else:
+            outline = ''
+        self.canvas.itemconfig(self.edge, outline=outline, dash=config.OVERLAP_DASH if self.overlapping else '')
+
+
+    def set_selected(self, selected):
+        """ Tag image and edge as selected (moved as a group) and highlight, or undo it """
+        self.selected = selected
+        if selected:
+            if self.realized:
+                self.canvas.addtag_withtag(config.SELECTED_TAG, self.image)
+                self.canvas.addtag_withtag(config.SELECTED_TAG, self.edge)
+            self.highlight(None)
+        else:
+            if self.realized:
+                self.canvas.dtag(self.image, config.SELECTED_TAG)
+                self.canvas.dtag(self.edge, config.SELECTED_TAG)
+            self.dehighlight(None)
 
-    def move(self, dx, dy):
-        """ Move image, marker and edge on canvas """
-        self.canvas.move(self.image, dx, dy)
-        self.canvas.move(self.edge, dx, dy)
-        self.canvas.move(self.marker, dx, dy)
+    def update_edge(self, points):
+        """ Set edge polygon to points (stage coordinates, e.g. after rotating) """
+        if self.realized:
+            self.canvas.coords(self.edge, self.viewport.scale_points(points))
 
 
-    def get_canvas_borders(self):
-        """ Get and return real canvas size """
-        canv_width = self.canvas.winfo_width()
-        canv_height = self.canvas.winfo_height()
-        return canv_width, canv_height
-    
     def clear(self):
         """ Remove element from canvas """
-        self.canvas.delete(self.image)
-        self.canvas.delete(self.edge)
-        self.canvas.delete(self.marker)
\ No newline at end of file
+        self.unrealize()
\ No newline at end of file
@@ -0,0 +1,65 @@
+# Gear Catalog: all instruments of the gear pool, indexed by ID, name and type
+
+import hashlib
+import logging
+from models.instrument import Instrument
+from utils import csv_io
+
+log = logging.getLogger(__name__)
+
+class GearCatalog:
+    """ Instruments parsed from gear.csv, list index is the instrument ID """
+    def __init__(self):
+        self.instruments = []
+        self._by_name = {}
+        self._by_type = {}
+        self.fingerprint = b"" # identifies catalog contents (saved in binary kits)
+
+    def load(self, path):
+        """ (Re-)load catalog from CSV file in a single streaming pass """
+        self.clear()
+        digest = hashlib.sha1()
+        for idx, row in enumerate(csv_io.iter_csv_rows(path)):
+            self.add(Instrument(idx, row))
+            digest.update("\x1f".join(row.values()).encode() + b"\n")
+        self.fingerprint = digest.digest()[:8]
+        log.info("Number of instruments in catalog: %d", len(self.instruments))
+
+    def add(self, instrument):
+        """ Append instrument and index it """
+        self.instruments.append(instrument)
+        # First instrument wins on duplicate names
+        self._by_name.setdefault(instrument.name, instrument)
+        self._by_type.setdefault(instrument.type, []).append(instrument)
+
+    def image_paths(self):
+        """ Get all image files used by the catalog (default and flipped) """
+        paths = []
+        for instrument in self.instruments:
+            paths.append(instrument.default_path)
+            paths.append(instrument.flipped_path)
+        return paths
+
+    def clear(self):
+        """ Remove all instruments """
+        self.instruments.clear()
+        self._by_name.clear()
+        self._by_type.clear()
+        self.fingerprint = b""
+
+    def by_name(self, name):
+        """ Get instrument by name, None if unknown """
+        return self._by_name.get(name)
+
+    def by_type(self, instr_type):
+        """ Get list of instruments of given type ("drum", "cymbal", "other"), in ID order """
+        return self._by_type.get(instr_type, [])
+
+    def __getitem__(self, instr_id):
+        return self.instruments[instr_id]
+
+    def __iter__(self):
+        return iter(self.instruments)
+
+    def __len__(self):
+        return len(self.instruments)
@@ -0,0 +1,140 @@
+# History: undo/redo journal of edit operations
+
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+
+class History:
+    """ Undo/redo stacks of compact edit deltas, limited to a memory budget (bytes)
+
+    Entries are tuples starting with their kind and refer to elements by layer, e.g.
+    ("move", layers, dx, dy) or ("rotate", ((layer, old_angle, new_angle), ...)).
+    Replaying them in order keeps the layers valid. Moves and rotations of the same
+    elements within coalesce_ms are merged into one entry (drags, slider, key repeat).
+    When the budget is exceeded, the oldest undo entries are dropped.
+    """
+    def __init__(self, budget, coalesce_ms):
+        self.budget = budget
+        self.coalesce_ms = coalesce_ms
+        self._undo = deque() # (entry, size), oldest first
+        self._redo = [] # (entry, size), next redo last
+        self._size = 0 # estimated bytes of all entries
+        self._last_time = 0.0 # time of last record (coalescing)
+        self._sealed = True # last entry must not be merged into
+        self._paused = False
+
+    def record(self, entry):
+        """ Add entry (done operation), clearing the redo stack """
+        if self._paused:
+            return
+        now = time.monotonic()
+        if (not self._sealed
+            and self._undo
+            and now - self._last_time <= self.coalesce_ms / 1000
+        ):
+            merged = _merge(self._undo[-1][0], entry)
+            if merged is not None:
+                self._pop_undo()
+                entry = merged
+        self._last_time = now
+        self._sealed = False
+        for _, size in self._redo:
+            self._size -= size
+        self._redo.clear()
+        self._push_undo(entry)
+        while self._size > self.budget and len(self._undo) > 1:
+            self._pop_undo(oldest=True)
+
+    def seal(self):
+        """ End coalescing, the next entry starts a new undo step (e.g. mouse released) """
+        self._sealed = True
+
+    def undo(self):
+        """ Take last entry to undo, None if there is none """
+        if not self._undo:
+            return None
+        entry, size = self._undo.pop()
+        self._redo.append((entry, size))
+        self._sealed = True
+        return entry
+
+    def redo(self):
+        """ Take last undone entry to redo, None if there is none """
+        if not self._redo:
+            return None
+        entry, size = self._redo.pop()
+        self._undo.append((entry, size))
+        self._sealed = True
+        return entry
+
+    @property
+    def recording(self):
+        """ False while paused """
+        return not self._paused
+
+    @contextmanager
+    def paused(self):
+        """ Don't record operations (while undoing/redoing) """
+        self._paused = True
+        try:
+            yield
+        finally:
+            self._paused = False
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._size = 0
+        self._sealed = True
+
+    def stats(self):
+        """ Number of undo and redo entries and estimated memory use (bytes) """
+        return {"undo": len(self._undo), "redo": len(self._redo), "bytes": self._size}
+
+    def _push_undo(self, entry):
+        size = _entry_size(entry)
+        self._undo.append((entry, size))
+        self._size += size
+
+    def _pop_undo(self, oldest=False):
+        _, size = self._undo.popleft() if oldest else self._undo.pop()
+        self._size -= size
+
+
+def invert(entry):
+    """ Get entry reverting given entry """
+    kind = entry[0]
+    if kind == "move":
+        return ("move", entry[1], -entry[2], -entry[3])
+    if kind == "rotate":
+        return ("rotate", tuple((layer, new_angle, old_angle) for layer, old_angle, new_angle in entry[1]))
+    if kind == "layer":
+        return ("layer", entry[2], entry[1])
+    if kind == "add":
+        return ("remove", entry[1])
+    if kind == "remove":
+        return ("add", entry[1])
+    # Flipping again reverts a flip
+    return entry
+
+def _merge(last, entry):
+    """ Merge entry into last one if both change the same elements continuously, else return None """
+    if last[0] != entry[0]:
+        return None
+    if entry[0] == "move" and last[1] == entry[1]:
+        return ("move", entry[1], last[2] + entry[2], last[3] + entry[3])
+    if entry[0] == "rotate" and [change[0] for change in last[1]] == [change[0] for change in entry[1]]:
+        # Keep the angles from before the first rotation
+        return ("rotate", tuple(
+            (layer, old_angle, new_angle)
+            for (layer, old_angle, _), (_, _, new_angle) in zip(last[1], entry[1])
+        ))
+    return None
+
+def _entry_size(obj):
+    """ Estimated memory use of (nested) tuple """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, tuple):
+        size += sum(_entry_size(item) for item in obj)
+    return size
@@ -1,10 +1,8 @@
-from config import GEAR_FILE, RESOURCES_DIR
-from utils.csv_io import get_row_from_csv
+from config import RESOURCES_DIR
 
 class Instrument:
     """ All gear, each element with its properties """
-    def __init__(self, idx):
-        row = get_row_from_csv(GEAR_FILE, idx)
+    def __init__(self, idx, row):
         self.is_used = False
         self.ID = idx        
         self.name = row["name"]
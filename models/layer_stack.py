@@ -0,0 +1,88 @@
+# Layer Stack: canvas elements ordered by layer
+
+class LayerStack:
+    """ Element controllers ordered bottom to top, layer 1 is the lowest
+
+    Supports the read access of the former {layer: element} dictionary
+    (elements[layer], iteration over layers, len, get...), while moving an
+    element to any layer is a single operation.
+    """
+    def __init__(self):
+        self._order = [] # element controllers, lowest layer first
+        self._index = {} # element controller -> index in _order
+
+    def insert(self, element, layer=None):
+        """ Insert element on layer (default: on top), shifting elements above up """
+        if layer is None or layer > len(self._order):
+            layer = len(self._order) + 1
+        self._order.insert(layer - 1, element)
+        self._renumber(layer - 1, len(self._order))
+
+    def remove(self, element):
+        """ Remove element, shifting elements above down """
+        index = self._index.pop(element)
+        del self._order[index]
+        self._renumber(index, len(self._order))
+
+    def remove_many(self, elements):
+        """ Remove several elements at once, renumbering the elements above only once """
+        indices = [self._index.pop(element) for element in elements]
+        if not indices:
+            return
+        removed = set(elements)
+        self._order = [element for element in self._order if element not in removed]
+        self._renumber(min(indices), len(self._order))
+
+    def move(self, element, new_layer):
+        """ Move element to new layer, shifting the elements in between """
+        old_index = self._index[element]
+        new_index = min(max(new_layer, 1), len(self._order)) - 1
+        if new_index == old_index:
+            return
+        del self._order[old_index]
+        self._order.insert(new_index, element)
+        self._renumber(min(old_index, new_index), max(old_index, new_index) + 1)
+
+    def layer_of(self, element):
+        """ Get layer of element """
+        return self._index[element] + 1
+
+    def clear(self):
+        """ Remove all elements """
+        self._order.clear()
+        self._index.clear()
+
+    def get(self, layer, default=None):
+        if layer in self:
+            return self._order[layer - 1]
+        return default
+
+    def keys(self):
+        return range(1, len(self._order) + 1)
+
+    def values(self):
+        return list(self._order)
+
+    def items(self):
+        return list(zip(self.keys(), self._order))
+
+    def __getitem__(self, layer):
+        if layer not in self:
+            raise KeyError(layer)
+        return self._order[layer - 1]
+
+    def __contains__(self, layer):
+        return isinstance(layer, int) and 1 <= layer <= len(self._order)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._order)
+
+    def _renumber(self, start, stop):
+        """ Update index map and element layers for positions start to stop (exclusive) """
+        for index in range(start, stop):
+            element = self._order[index]
+            self._index[element] = index
+            element.el_model.layer = index + 1
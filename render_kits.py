@@ -0,0 +1,92 @@
+# Render Kits: headless batch rendering of kit files to PNG images (no tkinter needed)
+#
+# Usage (from the repository root):
+# python3 render_kits.py                      renders all kits in kits/
+# python3 render_kits.py a.csv b.dkit more/   renders given kits and all kits in given directories
+# python3 render_kits.py -o out/ -j 4         writes images to out/ using 4 processes
+# python3 render_kits.py --scale 8 --dpi 300  renders high resolution posters (streamed, bounded memory)
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import config
+from models.gear_catalog import GearCatalog
+from utils import kit_io
+from utils import render
+
+# Catalog of each worker process, loaded once per process
+_catalog = None
+
+
+def _init_worker(gear_file):
+    global _catalog
+    _catalog = GearCatalog()
+    _catalog.load(gear_file)
+
+
+def render_kit_file(kit_path, image_path, canvas_size, scale=1, dpi=None):
+    """ Render kit file to PNG (in worker process), return (kit path, number of elements, seconds, timing breakdown) """
+    start = time.perf_counter()
+    rows = kit_io.load_kit(kit_path, _catalog.fingerprint)
+    timings = render.new_timings()
+    if scale == 1 and dpi is None:
+        image = render.render_kit(rows, _catalog, canvas_size, timings)
+        render.save_image(image, image_path, timings)
+    else:
+        render.render_poster(image_path, canvas_size, render.kit_sprites(rows, _catalog), scale, dpi=dpi, timings=timings)
+    return kit_path, len(rows), time.perf_counter() - start, timings
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render kit files to PNG images without GUI.")
+    parser.add_argument("kits", nargs="*", default=[str(config.KITS_DIR)], help="kit files or directories (default: kits/)")
+    parser.add_argument("-o", "--output-dir", help="directory for the images (default: next to each kit)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--size", type=parse_size, default=(config.CANVAS_WIDTH, config.CANVAS_HEIGHT), 
+                        help="image size WIDTHxHEIGHT (default: canvas size)")
+    parser.add_argument("--scale", type=float, default=1, help="scale factor for high resolution posters (default: 1)")
+    parser.add_argument("--dpi", type=float, help="resolution stored in the PNG file")
+    args = parser.parse_args()
+
+    kits = kit_io.collect_kits(args.kits)
+    if not kits:
+        print("No kit files found.")
+        return
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    total_elements = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker, initargs=(config.GEAR_FILE,)) as executor:
+        futures = {}
+        for kit in kits:
+            out_dir = Path(args.output_dir) if args.output_dir else kit.parent
+            image_path = out_dir / (kit.stem + ".png")
+            futures[executor.submit(render_kit_file, kit, image_path, args.size, args.scale, args.dpi)] = kit
+        for future in as_completed(futures):
+            try:
+                kit, num_elements, seconds, timings = future.result()
+            except Exception as error:
+                failed += 1
+                print(f"{futures[future]}: failed ({error})")
+                continue
+            total_elements += num_elements
+            print(f"{kit}: {num_elements} elements in {seconds * 1000:.1f} ms ({render.format_timings(timings)})")
+
+    elapsed = time.perf_counter() - start
+    rendered = len(kits) - failed
+    print(f"Rendered {rendered} kits ({total_elements} elements) in {elapsed:.2f} s: "
+          f"{rendered / elapsed:.2f} kits/s, {total_elements / elapsed:.1f} elements/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# Autosave: crash-safe journal of edits (kit snapshot + append-only edit log), written on a background thread
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from utils import kit_io
+from utils.trace import tracer
+
+log = logging.getLogger(__name__)
+
+LOG_NAME = "edits.log"
+SNAPSHOT_PREFIX = "snapshot-"
+CATALOG_NAME = "catalog" # fingerprint (hex) of the gear catalog the journal refers to
+
+
+class AutosaveJournal:
+    """ Appends edit entries (history deltas) to a log file and compacts it into kit snapshots
+
+    append() only queues the entry, a writer thread writes all entries queued within
+    flush_ms in one write. Every compact_every entries, the current kit rows (taken
+    on the caller's thread via snapshot_rows) are written to snapshot-<seq>.dkit and the
+    log is truncated. Log lines carry sequence numbers, so a crash between writing
+    the snapshot and truncating the log never replays an edit twice. Entries refer to
+    instrument IDs, a journal of another catalog (fingerprint) is not recovered.
+    """
+    def __init__(self, directory, snapshot_rows, fingerprint=b"", flush_ms=1000, compact_every=200):
+        self.directory = Path(directory)
+        self.snapshot_rows = snapshot_rows # callable returning the current kit rows
+        self.fingerprint = fingerprint
+        self.flush_ms = flush_ms
+        self.compact_every = compact_every
+        self._queue = queue.SimpleQueue() # ("entry", seq, entry), ("snapshot", seq, rows), ("close", discard)
+        self._seq = 0 # sequence number of last queued entry
+        self._since_snapshot = 0
+        self._thread = None
+
+    # Recovery (before start)
+    def has_recovery(self):
+        """ Check if a previous session left unsaved edits (i.e. did not close the journal) """
+        log_path = self.directory / LOG_NAME
+        return bool(self._snapshot_paths()) or (log_path.exists() and log_path.stat().st_size > 0)
+
+    def load_recovery(self):
+        """ Load (kit rows of latest snapshot, edit entries logged after it), nothing if the catalog changed """
+        catalog_path = self.directory / CATALOG_NAME
+        fingerprint = catalog_path.read_text().strip() if catalog_path.exists() else None
+        if fingerprint != self.fingerprint.hex():
+            log.warning("Autosave journal was written with another gear catalog, not recovered: %s", self.directory)
+            return [], []
+        rows = []
+        base_seq = 0
+        snapshots = self._snapshot_paths()
+        if snapshots:
+            base_seq, path = max(snapshots)
+            rows = kit_io.load_kit(path, self.fingerprint)
+        entries = []
+        log_path = self.directory / LOG_NAME
+        if log_path.exists():
+            with open(log_path, mode='r') as file:
+                for line in file:
+                    try:
+                        seq, entry = json.loads(line)
+                    except ValueError:
+                        # Torn last line of a crash
+                        break
+                    if seq > base_seq:
+                        entries.append(_to_tuple(entry))
+                        self._seq = seq
+        self._seq = max(self._seq, base_seq)
+        return rows, entries
+
+    def discard(self):
+        """ Delete journal files (before start) """
+        _remove_files(self.directory)
+
+    # Journal (UI thread)
+    def start(self):
+        """ Start writer thread """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / CATALOG_NAME).write_text(self.fingerprint.hex())
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def append(self, entry):
+        """ Queue edit entry, compacting the journal every compact_every entries """
+        if self._thread is None:
+            return
+        self._seq += 1
+        self._queue.put(("entry", self._seq, entry))
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """ Queue snapshot of the current kit, replacing the logged entries """
+        if self._thread is None:
+            return
+        self._since_snapshot = 0
+        self._queue.put(("snapshot", self._seq, self.snapshot_rows()))
+
+    def close(self, discard=True):
+        """ Write queued entries and stop writer thread, deleting the journal with discard (clean exit) """
+        if self._thread is None:
+            return
+        self._queue.put(("close", discard))
+        self._thread.join()
+        self._thread = None
+
+    # Writer thread
+    def _run(self):
+        log_file = open(self.directory / LOG_NAME, mode='a')
+        try:
+            while True:
+                # Wait for a first item, then batch everything arriving within flush_ms
+                items = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_ms / 1000
+                while items[-1][0] != "close":
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        items.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                with tracer.span("autosave.write", "io"):
+                    log_file = self._write(log_file, items)
+                if items[-1][0] == "close":
+                    break
+        finally:
+            log_file.close()
+        if items[-1][1]:
+            _remove_files(self.directory)
+
+    def _write(self, log_file, items):
+        """ Write batch of queued items, return (new) log file """
+        lines = []
+        for item in items:
+            if item[0] == "entry":
+                _, seq, entry = item
+                lines.append(json.dumps([seq, entry], separators=(",", ":")) + "\n")
+            elif item[0] == "snapshot":
+                _, seq, rows = item
+                # Entries so far are part of the snapshot
+                lines.clear()
+                path = self.directory / f"{SNAPSHOT_PREFIX}{seq}{kit_io.BINARY_SUFFIX}"
+                kit_io.save_kit(path, rows, self.fingerprint)
+                for old_seq, old_path in self._snapshot_paths():
+                    if old_seq != seq:
+                        old_path.unlink()
+                log_file.close()
+                log_file = open(self.directory / LOG_NAME, mode='w')
+        if lines:
+            log_file.write("".join(lines))
+        log_file.flush()
+        os.fsync(log_file.fileno())
+        return log_file
+
+    def _snapshot_paths(self):
+        """ Get list of (sequence number, path) of snapshot files """
+        snapshots = []
+        if self.directory.exists():
+            for path in self.directory.glob(f"{SNAPSHOT_PREFIX}*{kit_io.BINARY_SUFFIX}"):
+                seq = path.name[len(SNAPSHOT_PREFIX):-len(kit_io.BINARY_SUFFIX)]
+                if seq.isdigit():
+                    snapshots.append((int(seq), path))
+        return snapshots
+
+
+def _to_tuple(value):
+    """ Convert JSON lists (back) to tuples, as history entries use them """
+    if isinstance(value, list):
+        return tuple(_to_tuple(item) for item in value)
+    return value
+
+def _remove_files(directory):
+    """ Delete log and snapshots in journal directory """
+    directory = Path(directory)
+    if directory.exists():
+        for path in directory.glob(f"{SNAPSHOT_PREFIX}*{kit_io.BINARY_SUFFIX}"):
+            path.unlink()
+        for name in (LOG_NAME, CATALOG_NAME):
+            path = directory / name
+            if path.exists():
+                path.unlink()
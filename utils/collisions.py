@@ -0,0 +1,88 @@
+# Collisions: overlap tests between elements (circles and rotated squares), vectorized over pairs with NumPy
+#
+# Shapes are tuples (x, y, r, is_circular, angle): circles of radius r, or squares of half side r
+# rotated by angle (degrees, like geometry.rotate_point) around their center (x, y).
+
+import numpy as np
+from utils.spatial_index import SpatialGrid
+
+
+def shape_bounds(shape):
+    """ Bounding box (x0, y0, x1, y1) of shape """
+    x, y, r, is_circular, angle = shape
+    if not is_circular:
+        rad = np.radians(angle)
+        r = r * (abs(np.cos(rad)) + abs(np.sin(rad)))
+    return x - r, y - r, x + r, y + r
+
+
+def overlapping(shapes_a, shapes_b, tolerance=0.0):
+    """ Test pairs of shapes (shapes_a[i], shapes_b[i]) for overlap, return bool array
+
+    Shapes overlapping by at most tolerance (px) do not count, e.g. elements placed edge to edge.
+    Square pairs use the separating axis test, circle and square the closest point of the square.
+    """
+    a = np.asarray(shapes_a, dtype=float).reshape(-1, 5)
+    b = np.asarray(shapes_b, dtype=float).reshape(-1, 5)
+    result = np.zeros(len(a), dtype=bool)
+    if not len(a):
+        return result
+
+    # Mixed pairs as (square, circle)
+    swap = (a[:, 3] != 0) & (b[:, 3] == 0)
+    a, b = np.where(swap[:, None], b, a), np.where(swap[:, None], a, b)
+    xa, ya, ra, circular_a, angle_a = a.T
+    xb, yb, rb, circular_b, angle_b = b.T
+    circular_a = circular_a != 0
+    circular_b = circular_b != 0
+    dx = xb - xa
+    dy = yb - ya
+
+    # Circle and circle
+    pairs = circular_a & circular_b
+    reach = np.maximum(ra + rb - tolerance, 0)
+    result[pairs] = (dx*dx + dy*dy < reach*reach)[pairs]
+
+    # Local axes of squares: x axis (cos, sin), y axis (-sin, cos)
+    cos_a, sin_a = np.cos(np.radians(-angle_a)), np.sin(np.radians(-angle_a))
+    cos_b, sin_b = np.cos(np.radians(-angle_b)), np.sin(np.radians(-angle_b))
+
+    # Square and circle: circle center in square coordinates, distance to the closest point of the square
+    pairs = ~circular_a & circular_b
+    local_x = dx*cos_a + dy*sin_a
+    local_y = -dx*sin_a + dy*cos_a
+    gap_x = local_x - np.clip(local_x, -ra, ra)
+    gap_y = local_y - np.clip(local_y, -ra, ra)
+    reach = np.maximum(rb - tolerance, 0)
+    inside = (gap_x == 0) & (gap_y == 0)
+    result[pairs] = (inside | (gap_x*gap_x + gap_y*gap_y < reach*reach))[pairs]
+
+    # Square and square: separated if the projections on one of the four axes do not overlap
+    pairs = ~circular_a & ~circular_b
+    separated = np.zeros(len(a), dtype=bool)
+    for axis_x, axis_y in ((cos_a, sin_a), (-sin_a, cos_a), (cos_b, sin_b), (-sin_b, cos_b)):
+        extent_a = ra * (np.abs(axis_x*cos_a + axis_y*sin_a) + np.abs(-axis_x*sin_a + axis_y*cos_a))
+        extent_b = rb * (np.abs(axis_x*cos_b + axis_y*sin_b) + np.abs(-axis_x*sin_b + axis_y*cos_b))
+        separated |= np.abs(axis_x*dx + axis_y*dy) >= extent_a + extent_b - tolerance
+    result[pairs] = ~separated[pairs]
+    return result
+
+
+def overlapping_pairs(shapes, cell_size, tolerance=0.0):
+    """ Find all overlapping pairs (i, j), i < j, of list of shapes
+
+    Candidates are pairs with intersecting bounding boxes (spatial grid), tested at once with overlapping().
+    """
+    grid = SpatialGrid(cell_size)
+    candidates = []
+    for j, shape in enumerate(shapes):
+        bounds = shape_bounds(shape)
+        candidates.extend((i, j) for i in grid.query_rect(bounds))
+        grid.insert(j, bounds)
+    if not candidates:
+        return []
+    candidates.sort()
+    shapes = np.asarray(shapes, dtype=float)
+    index = np.array(candidates)
+    hits = overlapping(shapes[index[:, 0]], shapes[index[:, 1]], tolerance)
+    return [pair for pair, hit in zip(candidates, hits) if hit]
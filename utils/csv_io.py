@@ -1,4 +1,6 @@
 import csv
+import io
+from utils.file_io import write_atomic
 
 def save_to_csv(filename, column_names):
     """ Function to save data to a CSV file """
@@ -7,6 +9,16 @@ def save_to_csv(filename, column_names):
         writer.writeheader()
 
 
+def write_csv_atomic(filename, rows, column_names):
+    """ Function to write all rows to a CSV file at once, replacing the file atomically """
+    # Serialize in memory, then write with a single call
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=column_names)
+    writer.writeheader()
+    writer.writerows(rows)
+    write_atomic(filename, buffer.getvalue().encode())
+
+
 def read_from_csv(filename):
     """ Function to read data from a CSV file """
     data = []
@@ -24,16 +36,9 @@ def append_to_csv(filename, row, column_names):
         writer.writerow(row)
         
 
-def get_row_from_csv(filename, row_index):
-    """ Function to get a row from the CSV file """
-    data = read_from_csv(filename)
-    return data[row_index]
-
-
-def get_row_count_from_csv(self, path):
-    """ Get number of rows in CSV file """
-    num_rows = 0
-    with open(path, mode='r') as csvfile:
-        num_rows = sum(1 for _ in csvfile) - 1 # subtract 1 for header
-        print("Number of rows in CSV:", num_rows)
-    return num_rows
\ No newline at end of file
+def iter_csv_rows(filename):
+    """ Function to stream rows of a CSV file one by one """
+    with open(filename, mode='r', newline='') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield row
\ No newline at end of file
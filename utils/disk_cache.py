@@ -0,0 +1,77 @@
+import hashlib
+import os
+from pathlib import Path
+from PIL import Image
+
+class DiskImageCache:
+    """ Images derived from source files (cropped, scaled...) stored on disk and reused across runs
+
+    Keys are built from the source file's path, size and modification time plus the
+    parameters of the derivation, so editing the source invalidates its cached images.
+    Opaque images are stored as PPM (no compression, decoded in a few ms), others as PNG.
+    Files of this cache (prefix) over budget are deleted least recently used first, so
+    images of all parameters in use (e.g. canvas sizes) stay cached and stale ones go.
+    """
+    def __init__(self, directory, prefix, budget):
+        self.directory = Path(directory)
+        self.prefix = prefix # file name prefix of this cache's files
+        self.budget = budget # disk budget of this cache's files (bytes)
+
+    def key(self, source, *params):
+        """ Get key of image derived from file at source with params (None if source does not exist) """
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return None
+        text = repr((str(source), stat.st_size, stat.st_mtime_ns) + params)
+        return hashlib.sha1(text.encode()).hexdigest()[:20]
+
+    def get(self, key):
+        """ Load cached image, None if not cached or unreadable """
+        if key is None:
+            return None
+        for suffix in (".ppm", ".png"):
+            path = self.directory / f"{self.prefix}{key}{suffix}"
+            if path.exists():
+                try:
+                    image = Image.open(path)
+                    image.load()
+                    # Modification time marks recent use (eviction order)
+                    os.utime(path)
+                    return image
+                except OSError:
+                    return None
+        return None
+
+    def put(self, key, image):
+        """ Store image (written atomically), evicting least recently used images if over budget """
+        if key is None:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if image.mode == "RGBA" and image.getextrema()[3][0] == 255:
+                image = image.convert("RGB")
+            suffix = ".ppm" if image.mode in ("RGB", "L") else ".png"
+            path = self.directory / f"{self.prefix}{key}{suffix}"
+            tmp_path = path.with_name(path.name + ".tmp")
+            image.save(tmp_path, format="PPM" if suffix == ".ppm" else "PNG")
+            os.replace(tmp_path, path)
+            self._evict(keep=path)
+        except OSError:
+            # Cache is optional (e.g. read-only directory)
+            pass
+
+    def _evict(self, keep):
+        """ Delete least recently used files of this cache (except keep) while over budget """
+        files = []
+        for path in self.directory.glob(f"{self.prefix}*"):
+            if path.suffix in (".ppm", ".png"):
+                stat = path.stat()
+                files.append((stat.st_mtime_ns, stat.st_size, path))
+        used = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if used <= self.budget:
+                break
+            if path != keep:
+                path.unlink(missing_ok=True)
+                used -= size
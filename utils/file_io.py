@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+def write_atomic(filename, data):
+    """ Write bytes to file at once, replacing the file atomically (a crash never leaves a truncated file) """
+    # Write to temporary file in the same directory and rename it
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, mode='wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp creates the file private, keep permissions of the replaced file (or the default ones)
+        try:
+            mode = os.stat(filename).st_mode & 0o777
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
\ No newline at end of file
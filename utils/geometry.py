@@ -8,4 +8,31 @@ def rotate_point(x, y, angle):
     # Calculate new coordinates
     new_x = x * math.cos(rad) - y * math.sin(rad)
     new_y = x * math.sin(rad) + y * math.cos(rad)  
-    return new_x, new_y
\ No newline at end of file
+    return new_x, new_y
+
+def rotate_polygon(points, angle, position):
+    """ Rotate flat list of polygon points (around (0,0)) and move them to position """
+    new_points = []
+    for i in range(0, len(points), 2):
+        rotated = rotate_point(points[i], points[i+1], angle)
+        new_points.append(rotated[0] + position[0])
+        new_points.append(rotated[1] + position[1])
+    return new_points
+
+def polygon_bounds(points):
+    """ Bounding box (x0, y0, x1, y1) of flat list of polygon points """
+    xs = points[0::2]
+    ys = points[1::2]
+    return min(xs), min(ys), max(xs), max(ys)
+
+def point_in_polygon(x, y, points):
+    """ Check if point lies inside polygon given as flat list of points (ray casting) """
+    inside = False
+    n = len(points) // 2
+    x1, y1 = points[-2], points[-1]
+    for i in range(n):
+        x2, y2 = points[2*i], points[2*i+1]
+        if (y2 > y) != (y1 > y) and x < (x1 - x2) * (y - y2) / (y1 - y2) + x2:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
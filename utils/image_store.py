@@ -0,0 +1,81 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+import config
+from utils.trace import tracer
+
+class ImageStore:
+    """ Process-wide store of decoded source images, shared by canvas and exporter
+
+    Each file is decoded once. Files with identical content (e.g. default and flipped
+    path of non-flippable items) share one decoded image. Images handed out are shared:
+    never modify them in place, derive new images instead (rotate, crop, convert...).
+    """
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.decodes = 0 # number of actually decoded files
+        self._by_path = {} # path -> content hash
+        self._by_hash = {} # content hash -> decoded image
+        self._pending = {} # path -> future of a running prefetch
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def get(self, path):
+        """ Return decoded image of file at path, decoding it if needed """
+        key = str(path)
+        with self._lock:
+            digest = self._by_path.get(key)
+            if digest is not None:
+                return self._by_hash[digest]
+            future = self._pending.get(key)
+        if future is not None:
+            # Currently decoded by a prefetch worker
+            return future.result()
+        return self._load(key)
+
+    def prefetch(self, paths):
+        """ Decode files in a background thread pool """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="image_store")
+            for path in paths:
+                key = str(path)
+                if key in self._by_path or key in self._pending:
+                    continue
+                self._pending[key] = self._executor.submit(self._load, key)
+
+    def clear(self):
+        """ Forget all decoded images """
+        with self._lock:
+            self._by_path.clear()
+            self._by_hash.clear()
+
+    def _load(self, key):
+        try:
+            with open(key, mode='rb') as file:
+                data = file.read()
+            digest = hashlib.sha1(data).hexdigest()
+            with self._lock:
+                image = self._by_hash.get(digest)
+            if image is None:
+                # Decode outside of the lock, Pillow releases the GIL while decoding
+                with tracer.span("decode", "io"):
+                    image = Image.open(BytesIO(data))
+                    image.load()
+                with self._lock:
+                    # Keep the first one if another thread decoded the same content meanwhile
+                    if digest not in self._by_hash:
+                        self._by_hash[digest] = image
+                        self.decodes += 1
+                    image = self._by_hash[digest]
+            with self._lock:
+                self._by_path[key] = digest
+            return image
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+
+image_store = ImageStore(config.IMAGE_STORE_WORKERS)
@@ -1,38 +1,43 @@
 from PIL import Image, ImageTk
 import config
+from utils.lru_cache import LRUCache
+from utils import render
+from utils.image_store import image_store
+from utils.trace import tracer
 
-def instrument_image(path, angle):
-    """ Create element image, rotated correctly """
-    pil_img_resize = Image.open(path)
-    pil_image_resize_rotated = pil_img_resize.rotate(angle, resample=Image.BICUBIC, expand=True)
-    img = ImageTk.PhotoImage(pil_image_resize_rotated)
-    return img
 
-def render_project_image(real_canvas_size, elements):
-    """ Render and return image of current project """
-    # Create a new blank image using Pillow
-    image = Image.new("RGBA", real_canvas_size, (255, 255, 255, 0))  # Transparent background
+# Shared by all ElementView instances
+texture_cache = LRUCache(config.TEXTURE_CACHE_BUDGET)
+
 
-    # Background, needs fix (position, scale, different bgs)
-    bg_img = Image.open(config.RESOURCES_DIR / "Environment" / "floor.jpg")
-    image.paste(bg_img, (0, 0))
-    
-    # Iterate over the image items
-    for layer in elements:
-        # Get the image's position and the PIL image object
-        coords = elements[layer].el_model.pos
-        if elements[layer].el_model.flipped:
-            image_path = elements[layer].el_model.instr.flipped_path
-        else:
-            image_path = elements[layer].el_model.instr.default_path
-        
-        pillow_image = Image.open(image_path)
-        pillow_image_rot = pillow_image.rotate(elements[layer].el_model.rot, resample=Image.BICUBIC, expand=True)            
-        
-        # Adjust anchors: on canvas, anchor is center. for the pillow image it is the top-left corner
-        image_width, image_height = pillow_image_rot.size
-        x, y = int(coords[0]) - image_width // 2, int(coords[1]) - image_height // 2
+def instrument_image(path, angle, flipped=False, zoom=1.0):
+    """ Create element image, rotated correctly and scaled by zoom (cached) """
+    key = (str(path), angle, flipped, zoom)
+    img = texture_cache.get(key)
+    if img is None:
+        pil_image_resize_rotated = render.zoomed_sprite(path, angle, zoom)
+        with tracer.span("photo_image", "texture"):
+            img = ImageTk.PhotoImage(pil_image_resize_rotated)
+        width, height = pil_image_resize_rotated.size
+        texture_cache.put(key, img, width * height * 4)
+    return img
+
+def cached_instrument_image(path, angle, flipped=False, zoom=1.0):
+    """ Get final element image if it is cached or quick to make (angle in the sprite atlas), None otherwise """
+    img = texture_cache.get((str(path), angle, flipped, zoom))
+    if img is None and zoom == 1:
+        atlas = render.sprite_atlas()
+        if atlas is not None and atlas.has(path, angle):
+            img = instrument_image(path, angle, flipped)
+    return img
 
-        # Paste the image onto the blank image
-        image.paste(pillow_image_rot, (x, y), pillow_image_rot)
-    return image
+def preview_image(path, angle, zoom=1.0):
+    """ Create fast low quality element image (nearest neighbour, not cached), e.g. while dragging the slider """
+    with tracer.span("preview_image", "texture"):
+        width, height = image_store.get(path).size
+        size = (max(1, round(width * zoom)), max(1, round(height * zoom)))
+        pil_image = render.mipmap(path, zoom)
+        if pil_image.size != size:
+            pil_image = pil_image.resize(size, resample=Image.NEAREST)
+        pil_image_rotated = pil_image.rotate(angle, resample=Image.NEAREST, expand=True)
+        return ImageTk.PhotoImage(pil_image_rotated)
@@ -0,0 +1,173 @@
+# Kit IO: kit files (CSV or binary), usable without GUI (scripting, batch tools)
+#
+# Kit rows are dicts with config.COLUMN_NAMES keys:
+# {"ID": int, "layer": int, "position": [x, y], "rotation": int, "flipped": int}
+#
+# Binary kit format (.dkit), little endian:
+# header: magic b"DKIT", format version (uint16), record size (uint16), catalog fingerprint (8 bytes), number of records (uint32)
+# records: ID (uint32), layer (uint32), x (float64), y (float64), rotation (int16), flags (uint8), padding (1 byte)
+# flags: bit 0 flipped, bit 1/2 x/y is a float (otherwise integer, for lossless round trips with CSV)
+
+import logging
+import mmap
+import struct
+from pathlib import Path
+import config
+from utils import csv_io
+from utils.file_io import write_atomic
+
+log = logging.getLogger(__name__)
+
+KIT_MAGIC = b"DKIT"
+KIT_VERSION = 1
+BINARY_SUFFIX = ".dkit"
+KIT_SUFFIXES = (".csv", BINARY_SUFFIX)
+
+_HEADER = struct.Struct("<4sHH8sI")
+_RECORD = struct.Struct("<IIddhBx")
+_FLIPPED = 1
+_FLOAT_X = 2
+_FLOAT_Y = 4
+_NO_FINGERPRINT = bytes(8)
+
+
+def kit_rows(elements):
+    """ Serialize elements ({layer: element controller}) to kit rows """
+    rows = []
+    for layer in elements:
+        el_model = elements[layer].el_model
+        rows.append({"ID": el_model.instr.ID, 
+                     "layer": el_model.layer, 
+                     "position": el_model.pos, 
+                     "rotation": el_model.rot, 
+                     "flipped": int(el_model.flipped)
+                     })
+    return rows
+
+def is_binary_kit(path):
+    """ Check if file is a binary kit file (by content, not extension) """
+    with open(path, mode='rb') as file:
+        return file.read(len(KIT_MAGIC)) == KIT_MAGIC
+
+def save_kit(path, rows, fingerprint=b""):
+    """ Save kit rows in one buffered write, replacing the file atomically. Format by extension (.dkit: binary, else CSV) """
+    if str(path).lower().endswith(BINARY_SUFFIX):
+        write_atomic(path, encode_binary_kit(rows, fingerprint))
+    else:
+        csv_io.write_csv_atomic(path, rows, config.COLUMN_NAMES)
+
+def load_kit(path, fingerprint=None):
+    """ Load kit rows from kit file, format is auto-detected. Warns if fingerprint differs from binary kits' catalog fingerprint """
+    if is_binary_kit(path):
+        kit_fingerprint, rows = load_binary_kit(path)
+        if (fingerprint is not None 
+            and kit_fingerprint != _NO_FINGERPRINT 
+            and kit_fingerprint != _pad_fingerprint(fingerprint)
+        ):
+            log.warning("Kit was saved with a different gear catalog, instrument IDs may not match: %s", path)
+        return rows
+    return load_csv_kit(path)
+
+def convert_kit(src_path, dst_path, fingerprint=b""):
+    """ Convert kit file to format given by dst_path extension """
+    save_kit(dst_path, load_kit(src_path), fingerprint)
+
+def collect_kits(paths):
+    """ Expand directories to the kit files they contain """
+    kits = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            kits.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in KIT_SUFFIXES))
+        else:
+            kits.append(path)
+    return kits
+
+
+def load_csv_kit(path):
+    """ Load kit rows from CSV kit file """
+    rows = []
+    for row in csv_io.iter_csv_rows(path):
+        rows.append({"ID": int(row["ID"]), 
+                     "layer": int(row["layer"]), 
+                     "position": _parse_position(row["position"]), 
+                     "rotation": int(row["rotation"]), 
+                     "flipped": int(row["flipped"])
+                     })
+    return rows
+
+def encode_binary_kit(rows, fingerprint=b""):
+    """ Encode kit rows to binary kit format """
+    buffer = bytearray(_HEADER.size + _RECORD.size * len(rows))
+    _HEADER.pack_into(buffer, 0, KIT_MAGIC, KIT_VERSION, _RECORD.size, _pad_fingerprint(fingerprint), len(rows))
+    offset = _HEADER.size
+    for row in rows:
+        x, y = row["position"]
+        flags = _FLIPPED if int(row["flipped"]) else 0
+        if isinstance(x, float):
+            flags |= _FLOAT_X
+        if isinstance(y, float):
+            flags |= _FLOAT_Y
+        _RECORD.pack_into(buffer, offset, row["ID"], row["layer"], x, y, row["rotation"], flags)
+        offset += _RECORD.size
+    return bytes(buffer)
+
+def load_binary_kit(path):
+    """ Load (catalog fingerprint, kit rows) from binary kit file through a memory map """
+    with open(path, mode='rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                return decode_binary_kit(view)
+
+def decode_binary_kit(data):
+    """ Decode (catalog fingerprint, kit rows) from binary kit data """
+    if len(data) < _HEADER.size:
+        raise ValueError("Not a binary kit file (too short)")
+    magic, version, record_size, fingerprint, count = _HEADER.unpack_from(data, 0)
+    if magic != KIT_MAGIC:
+        raise ValueError("Not a binary kit file")
+    if version != KIT_VERSION or record_size != _RECORD.size:
+        raise ValueError(f"Unsupported binary kit version {version}")
+    end = _HEADER.size + count * _RECORD.size
+    if len(data) < end:
+        raise ValueError("Binary kit file is truncated")
+
+    rows = []
+    for instr_id, layer, x, y, rotation, flags in _RECORD.iter_unpack(data[_HEADER.size:end]):
+        if not flags & _FLOAT_X:
+            x = int(x)
+        if not flags & _FLOAT_Y:
+            y = int(y)
+        rows.append({"ID": instr_id, 
+                     "layer": layer, 
+                     "position": [x, y], 
+                     "rotation": rotation, 
+                     "flipped": flags & _FLIPPED
+                     })
+    return fingerprint, rows
+
+
+def _parse_position(text):
+    """ Parse position written as list literal, e.g. "[300, 267]" """
+    x, y = text.strip().strip("[]").split(",")
+    return [_parse_number(x), _parse_number(y)]
+
+def _parse_number(text):
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def _pad_fingerprint(fingerprint):
+    return bytes(fingerprint[:8]).ljust(8, b"\0")
+
+
+if __name__ == "__main__":
+    # Convert between kit formats: python3 -m utils.kit_io <source kit> <destination kit>
+    import sys
+    from models.gear_catalog import GearCatalog
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python3 -m utils.kit_io <source kit> <destination kit (.csv or .dkit)>")
+    catalog = GearCatalog()
+    catalog.load(config.GEAR_FILE)
+    convert_kit(sys.argv[1], sys.argv[2], catalog.fingerprint)
@@ -0,0 +1,174 @@
+# Kit library: persisted index of the kits directory (summary and preview image of each kit), updated incrementally
+
+import hashlib
+import json
+import logging
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from utils import kit_io
+from utils import render
+from utils.file_io import write_atomic
+from utils.trace import tracer
+
+log = logging.getLogger(__name__)
+
+INDEX_NAME = "index.json"
+INDEX_VERSION = 1
+
+
+class KitLibrary:
+    """ Index of the kit files in kits_dir, stored in cache_dir and reused across runs
+
+    Each entry holds the file's size, mtime and content hash and a summary of the kit:
+    number of elements, bounding box and names of the instruments used. A scan only
+    stats unchanged files, reads files whose mtime changed (a touched file with the same
+    hash keeps its entry) and parses new or edited kits only. Thumbnails are named by
+    content hash and catalog fingerprint, missing ones are rendered on a worker thread.
+    """
+    def __init__(self, kits_dir, cache_dir, instruments, thumbnail_size):
+        self.kits_dir = Path(kits_dir)
+        self.cache_dir = Path(cache_dir)
+        self.instruments = instruments
+        self.thumbnail_size = tuple(thumbnail_size)
+        self.entries = self._load_index() # file name -> entry
+        self.parsed = 0 # number of kits parsed by scans (new or edited)
+        self._executor = None
+        self._results = queue.SimpleQueue() # (file name, thumbnail path or None), filled by worker
+        self._rendering = set() # file names submitted to the worker, result not yet delivered
+        self._poll_job = None
+
+    def path(self, name):
+        """ Kit file of entry name """
+        return self.kits_dir / name
+
+    def scan(self):
+        """ Update index from kits directory, return [(file name, entry)] sorted by name """
+        entries = {}
+        changed = False
+        with tracer.span("kit_library.scan", "io"):
+            kit_paths = []
+            if self.kits_dir.is_dir():
+                kit_paths = sorted(p for p in self.kits_dir.iterdir() if p.suffix.lower() in kit_io.KIT_SUFFIXES)
+            for path in kit_paths:
+                stat = path.stat()
+                entry = self.entries.get(path.name)
+                if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                    entries[path.name] = entry
+                    continue
+                data = path.read_bytes()
+                digest = hashlib.sha1(data).hexdigest()
+                if entry is None or entry["hash"] != digest:
+                    entry = self._summarize(path, digest)
+                    self.parsed += 1
+                entry["size"] = stat.st_size
+                entry["mtime_ns"] = stat.st_mtime_ns
+                entries[path.name] = entry
+                changed = True
+        if changed or entries.keys() != self.entries.keys():
+            self.entries = entries
+            self._save_index()
+        return sorted(self.entries.items())
+
+    def thumbnail_path(self, entry):
+        """ Thumbnail file of entry (may not exist yet) """
+        width, height = self.thumbnail_size
+        return self.cache_dir / f"{entry['hash'][:20]}-{self.instruments.fingerprint.hex()}-{width}x{height}.png"
+
+    def request_thumbnails(self, widget, on_ready, poll_ms):
+        """ Call on_ready(file name, thumbnail path) for all entries, rendering missing thumbnails on a worker thread """
+        for name, entry in sorted(self.entries.items()):
+            if entry.get("error"):
+                continue
+            thumbnail = self.thumbnail_path(entry)
+            if thumbnail.exists():
+                on_ready(name, thumbnail)
+            elif name not in self._rendering:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kit_library")
+                self._rendering.add(name)
+                self._executor.submit(self._render, name, thumbnail)
+        if self._rendering and self._poll_job is None:
+            self._poll_job = widget.after(poll_ms, self._poll, widget, on_ready, poll_ms)
+
+    def close(self):
+        """ Stop worker thread (thumbnails being rendered are finished) """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _poll(self, widget, on_ready, poll_ms):
+        """ Main loop: deliver rendered thumbnails """
+        self._poll_job = None
+        while True:
+            try:
+                name, thumbnail = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._rendering.discard(name)
+            if thumbnail is not None:
+                on_ready(name, thumbnail)
+        if self._rendering:
+            self._poll_job = widget.after(poll_ms, self._poll, widget, on_ready, poll_ms)
+
+    def _render(self, name, thumbnail):
+        """ Worker thread: render kit and write its thumbnail """
+        try:
+            with tracer.span("kit_library.thumbnail", "render"):
+                rows = kit_io.load_kit(self.path(name), self.instruments.fingerprint)
+                image = render.render_kit(rows, self.instruments)
+                image.thumbnail(self.thumbnail_size)
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = thumbnail.with_name(thumbnail.name + ".tmp")
+                image.save(tmp_path, format="PNG")
+                os.replace(tmp_path, thumbnail)
+        except Exception:
+            log.exception("Kit thumbnail could not be rendered: %s", name)
+            thumbnail = None
+        self._results.put((name, thumbnail))
+
+    def _summarize(self, path, digest):
+        """ Parse kit and summarize it as index entry """
+        entry = {"hash": digest, "elements": 0, "bbox": None, "instruments": [], "error": None}
+        try:
+            rows = kit_io.load_kit(path, self.instruments.fingerprint)
+        except Exception as error:
+            log.warning("Kit could not be read: %s (%s)", path, error)
+            entry["error"] = "unreadable"
+            return entry
+        if any(not 0 <= row["ID"] < len(self.instruments) for row in rows):
+            entry["error"] = "unknown instruments"
+            return entry
+        entry["elements"] = len(rows)
+        if rows:
+            # Elements are about as large as their instrument's radius around their position
+            radii = [self.instruments[row["ID"]].r for row in rows]
+            entry["bbox"] = [
+                round(min(row["position"][0] - r for row, r in zip(rows, radii))),
+                round(min(row["position"][1] - r for row, r in zip(rows, radii))),
+                round(max(row["position"][0] + r for row, r in zip(rows, radii))),
+                round(max(row["position"][1] + r for row, r in zip(rows, radii)))
+            ]
+        entry["instruments"] = sorted({self.instruments[row["ID"]].name for row in rows})
+        return entry
+
+    def _load_index(self):
+        try:
+            with open(self.cache_dir / INDEX_NAME) as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if index.get("version") != INDEX_VERSION or index.get("catalog") != self.instruments.fingerprint.hex():
+            # Summaries name instruments of the catalog
+            return {}
+        return index["kits"]
+
+    def _save_index(self):
+        """ Write index (a lost index only costs parsing all kits again) """
+        index = {"version": INDEX_VERSION, "catalog": self.instruments.fingerprint.hex(), "kits": self.entries}
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            write_atomic(self.cache_dir / INDEX_NAME, json.dumps(index, separators=(",", ":")).encode())
+        except OSError:
+            log.warning("Kit library index could not be written to: %s", self.cache_dir)
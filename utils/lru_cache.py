@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """ Bounded LRU cache of images (textures, sprites...) with a memory budget, thread-safe """
+    def __init__(self, budget):
+        self.budget = budget # memory budget in bytes
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # key -> (value, size in bytes), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ Return cached value for key (and mark it as recently used), None if not cached """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        """ Add value to cache, evicting least recently used values if over budget """
+        if nbytes > self.budget:
+            # Would evict everything else, do not cache
+            return
+        with self._lock:
+            if key in self._entries:
+                self.used -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.used += nbytes
+            self._evict()
+
+    def set_budget(self, budget):
+        """ Change memory budget, evicting values if necessary """
+        with self._lock:
+            self.budget = budget
+            self._evict()
+
+    def clear(self):
+        """ Remove all cached values (counters are kept) """
+        with self._lock:
+            self._entries.clear()
+            self.used = 0
+
+    def stats(self):
+        """ Return cache counters """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "used": self.used,
+                "budget": self.budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def _evict(self):
+        while self.used > self.budget:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.used -= nbytes
+            self.evictions += 1
@@ -0,0 +1,71 @@
+import struct
+import zlib
+
+class PNGStreamWriter:
+    """ Write a RGBA PNG file row band by row band, without holding the whole image in memory """
+    def __init__(self, path, width, height, dpi=None, compress_level=6, chunk_size=1 << 20):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._chunk_size = chunk_size
+        self._pending = bytearray() # compressed data not yet written as IDAT chunk
+        self._compressor = zlib.compressobj(compress_level)
+        self._file = open(path, mode='wb')
+        try:
+            self._file.write(b"\x89PNG\r\n\x1a\n")
+            # 8 bit RGBA, no interlace
+            self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            if dpi:
+                pixels_per_meter = int(round(dpi / 0.0254))
+                self._write_chunk(b"pHYs", struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1))
+        except BaseException:
+            self._file.close()
+            raise
+
+    def write_band(self, image):
+        """ Append next rows (RGBA image of full width) """
+        if image.mode != "RGBA" or image.width != self.width:
+            raise ValueError("Band must be a RGBA image of full width")
+        if self.rows_written + image.height > self.height:
+            raise ValueError("Too many rows for PNG height")
+        data = image.tobytes()
+        stride = self.width * 4
+        # Each scanline starts with its filter type, 0 (none)
+        scanlines = bytearray((stride + 1) * image.height)
+        for row in range(image.height):
+            start = row * (stride + 1) + 1
+            scanlines[start:start + stride] = data[row * stride:(row + 1) * stride]
+        self._pending += self._compressor.compress(scanlines)
+        self.rows_written += image.height
+        while len(self._pending) >= self._chunk_size:
+            self._write_chunk(b"IDAT", bytes(self._pending[:self._chunk_size]))
+            del self._pending[:self._chunk_size]
+
+    def close(self):
+        """ Finish and close file """
+        if self._file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"PNG incomplete: {self.rows_written} of {self.height} rows written")
+            self._pending += self._compressor.flush()
+            self._write_chunk(b"IDAT", bytes(self._pending))
+            self._pending.clear()
+            self._write_chunk(b"IEND", b"")
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    def _write_chunk(self, chunk_type, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff))
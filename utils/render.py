@@ -0,0 +1,286 @@
+# Render: compositing kit images with Pillow only (no tkinter), used by the editor export and batch rendering
+
+import math
+import time
+from PIL import Image
+import config
+from utils.disk_cache import DiskImageCache
+from utils.image_store import image_store
+from utils.lru_cache import LRUCache
+from utils.png_stream import PNGStreamWriter
+from utils.sprite_atlas import open_atlas
+from utils.trace import tracer
+
+# Rotated instrument images, shared by the canvas textures and the exporter
+sprite_cache = LRUCache(config.SPRITE_CACHE_BUDGET)
+
+# Pre-rotated sprites (optional), opened on first use
+_atlas = None
+_atlas_opened = False
+
+# Mipmap pyramids of instrument images (zoomed out textures), by path
+_pyramids = {}
+
+# Background images already cropped to canvas size, by canvas size (in memory and on disk across runs)
+_backgrounds = LRUCache(config.BACKGROUND_CACHE_BUDGET)
+background_cache = DiskImageCache(config.CACHE_DIR, "background-", config.BACKGROUND_DISK_BUDGET)
+
+def element_sprites(elements):
+    """ Get (image path, position, rotation) of elements ({layer: element controller}), lowest layer first """
+    sprites = []
+    for layer in elements:
+        el_model = elements[layer].el_model
+        path = el_model.instr.flipped_path if el_model.flipped else el_model.instr.default_path
+        sprites.append((path, el_model.pos, el_model.rot))
+    return sprites
+
+def kit_sprites(rows, instruments):
+    """ Get (image path, position, rotation) of kit rows (see kit_io), lowest layer first """
+    sprites = []
+    for row in sorted(rows, key=lambda row: row["layer"]):
+        instr = instruments[row["ID"]]
+        path = instr.flipped_path if row["flipped"] else instr.default_path
+        sprites.append((path, row["position"], row["rotation"]))
+    return sprites
+
+def sprite_atlas():
+    """ Get sprite atlas of config.SPRITE_ATLAS_FILE (opened on first use), None if there is none """
+    global _atlas, _atlas_opened
+    if not _atlas_opened:
+        _atlas = open_atlas(config.SPRITE_ATLAS_FILE)
+        _atlas_opened = True
+    return _atlas
+
+def rotated_sprite(path, angle, timings=None):
+    """ Get image at path rotated by angle (cached or from the sprite atlas, shared: do not modify in place) """
+    key = (str(path), angle)
+    sprite = sprite_cache.get(key)
+    if sprite is None:
+        atlas = sprite_atlas()
+        if atlas is not None:
+            sprite = atlas.get(path, angle)
+            if sprite is not None:
+                # Memory mapped, not worth caching
+                return sprite
+        start = time.perf_counter()
+        source = image_store.get(path)
+        _add_timing(timings, "decode", start)
+        start = time.perf_counter()
+        sprite = source.convert("RGBA") if source.mode != "RGBA" else source
+        if angle % 360 != 0:
+            sprite = sprite.rotate(angle, resample=Image.BICUBIC, expand=True)
+        _add_timing(timings, "rotate", start)
+        sprite_cache.put(key, sprite, sprite.width * sprite.height * 4)
+    return sprite
+
+def mipmap(path, zoom):
+    """ Get smallest level of the mipmap pyramid of image at path that is at least zoom times its size
+
+    The pyramid (RGBA source, then halved again and again) is built on first use and kept.
+    """
+    key = str(path)
+    levels = _pyramids.get(key)
+    if levels is None:
+        with tracer.span("mipmap", "texture"):
+            source = image_store.get(path)
+            levels = [source.convert("RGBA") if source.mode != "RGBA" else source]
+            while min(levels[-1].size) >= 2 * config.MIPMAP_MIN_SIZE:
+                levels.append(levels[-1].reduce(2))
+        # Keep the first one if another thread built it meanwhile
+        levels = _pyramids.setdefault(key, levels)
+    level = 0
+    while level + 1 < len(levels) and 0.5 ** (level + 1) >= zoom:
+        level += 1
+    return levels[level]
+
+def zoomed_sprite(path, angle, zoom, timings=None):
+    """ Get image at path scaled by zoom and rotated by angle (cached, shared: do not modify in place)
+
+    Scaled down from the nearest mipmap level instead of the full resolution image.
+    """
+    if zoom == 1:
+        return rotated_sprite(path, angle, timings)
+    key = (str(path), angle, zoom)
+    sprite = sprite_cache.get(key)
+    if sprite is None:
+        start = time.perf_counter()
+        width, height = image_store.get(path).size
+        source = mipmap(path, zoom)
+        _add_timing(timings, "decode", start)
+        start = time.perf_counter()
+        size = (max(1, round(width * zoom)), max(1, round(height * zoom)))
+        sprite = source.resize(size, resample=Image.BICUBIC) if size != source.size else source
+        if angle % 360 != 0:
+            sprite = sprite.rotate(angle, resample=Image.BICUBIC, expand=True)
+        _add_timing(timings, "rotate", start)
+        sprite_cache.put(key, sprite, sprite.width * sprite.height * 4)
+    return sprite
+
+def background(canvas_size, timings=None):
+    """ Get floor background cropped to canvas size, placed as on the editor canvas (cached) """
+    canvas_size = tuple(canvas_size)
+    bg_img = _backgrounds.get(canvas_size)
+    if bg_img is None:
+        start = time.perf_counter()
+        key = background_cache.key(config.FLOOR_IMAGE_PATH, config.BACKGROUND_POSITION, canvas_size, "tiled")
+        bg_img = background_cache.get(key)
+        if bg_img is not None:
+            bg_img = bg_img.convert("RGBA")
+            _add_timing(timings, "decode", start)
+        else:
+            floor = image_store.get(config.FLOOR_IMAGE_PATH)
+            _add_timing(timings, "decode", start)
+            start = time.perf_counter()
+            # On canvas (and so in exports), the floor is centered on config.BACKGROUND_POSITION and repeated
+            bg_img = Image.new("RGBA", canvas_size)
+            origin_x, origin_y = _floor_origin(floor)
+            for y in range(origin_y % floor.height - floor.height, canvas_size[1], floor.height):
+                for x in range(origin_x % floor.width - floor.width, canvas_size[0], floor.width):
+                    bg_img.paste(floor, (x, y))
+            _add_timing(timings, "composite", start)
+            background_cache.put(key, bg_img)
+        _backgrounds.put(canvas_size, bg_img, bg_img.width * bg_img.height * 4)
+    return bg_img
+
+def render_sprites(canvas_size, sprites, timings=None):
+    """ Render and return image of sprites on background. Adds phase durations to timings dict if given """
+    with tracer.span("render_sprites", "render"):
+        image = background(canvas_size, timings).copy()
+        for image_path, coords, rotation in sprites:
+            sprite = rotated_sprite(image_path, rotation, timings)
+
+            start = time.perf_counter()
+            # Adjust anchors: on canvas, anchor is center. for the pillow image it is the top-left corner
+            x, y = int(coords[0]) - sprite.width // 2, int(coords[1]) - sprite.height // 2
+            _composite_clipped(image, sprite, x, y)
+            _add_timing(timings, "composite", start)
+    return image
+
+def render_poster(path, canvas_size, sprites, scale, dpi=None, band_height=config.POSTER_BAND_HEIGHT, timings=None):
+    """ Render sprites scaled by scale factor and stream them to a PNG file band by band
+
+    Only one band of rows is held in memory, sprites are resampled from their (cached) unscaled
+    rotated version for the part inside the current band only. Peak memory does not depend on output size.
+    """
+    width = max(1, round(canvas_size[0] * scale))
+    height = max(1, round(canvas_size[1] * scale))
+
+    # Conservative vertical extent of each sprite, to skip sprites outside a band without preparing them
+    extents = []
+    for image_path, coords, rotation in sprites:
+        start = time.perf_counter()
+        source = image_store.get(image_path)
+        _add_timing(timings, "decode", start)
+        radius = math.hypot(source.width, source.height) * scale / 2 + 2
+        extents.append((coords[1] * scale - radius, coords[1] * scale + radius))
+
+    with PNGStreamWriter(path, width, height, dpi=dpi) as writer, tracer.span("render_poster", "render"):
+        for top in range(0, height, band_height):
+            bottom = min(top + band_height, height)
+            band = _background_band(width, top, bottom, scale, timings)
+            for (image_path, coords, rotation), (y0, y1) in zip(sprites, extents):
+                if y1 < top or y0 > bottom:
+                    continue
+                sprite = rotated_sprite(image_path, rotation, timings)
+                _composite_scaled(band, top, sprite, coords, scale, timings)
+
+            start = time.perf_counter()
+            writer.write_band(band)
+            _add_timing(timings, "encode", start)
+    return width, height
+
+def save_image(image, path, timings=None):
+    """ Encode and save image """
+    start = time.perf_counter()
+    image.save(path)
+    _add_timing(timings, "encode", start)
+
+def new_timings():
+    """ Get empty timing breakdown (seconds per export phase) """
+    return {"decode": 0.0, "rotate": 0.0, "composite": 0.0, "encode": 0.0}
+
+def format_timings(timings):
+    """ Format timing breakdown in milliseconds """
+    return ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in timings.items())
+
+def render_project_image(real_canvas_size, elements, timings=None):
+    """ Render and return image of current project """
+    return render_sprites(real_canvas_size, element_sprites(elements), timings)
+
+def render_kit(rows, instruments, canvas_size=(config.CANVAS_WIDTH, config.CANVAS_HEIGHT), timings=None):
+    """ Render and return image of kit rows (see kit_io), without GUI """
+    return render_sprites(canvas_size, kit_sprites(rows, instruments), timings)
+
+def _composite_clipped(image, sprite, x, y):
+    """ Alpha composite sprite with top-left corner at (x, y), only the part of its bounding box inside the image """
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + sprite.width, image.width), min(y + sprite.height, image.height)
+    if left < right and top < bottom:
+        image.alpha_composite(sprite, dest=(left, top), source=(left - x, top - y, right - x, bottom - y))
+
+def _composite_scaled(band, band_top, sprite, coords, scale, timings):
+    """ Alpha composite part of sprite scaled by scale factor and centered on coords (unscaled) inside band """
+    # Scaled sprite bounding box in poster coordinates
+    width = max(1, round(sprite.width * scale))
+    height = max(1, round(sprite.height * scale))
+    x = int(coords[0] * scale) - width // 2
+    y = int(coords[1] * scale) - height // 2
+
+    # Visible part, in scaled sprite coordinates
+    left, right = max(0, -x), min(width, band.width - x)
+    top, bottom = max(0, band_top - y), min(height, band_top + band.height - y)
+    if left >= right or top >= bottom:
+        return
+
+    start = time.perf_counter()
+    if scale == 1:
+        part = sprite.crop((left, top, right, bottom))
+    else:
+        scale_x, scale_y = width / sprite.width, height / sprite.height
+        box = (left / scale_x, top / scale_y, right / scale_x, bottom / scale_y)
+        part = sprite.resize((right - left, bottom - top), resample=Image.LANCZOS, box=box)
+    _add_timing(timings, "rotate", start)
+
+    start = time.perf_counter()
+    band.alpha_composite(part, dest=(x + left, y + top - band_top))
+    _add_timing(timings, "composite", start)
+
+def _background_band(width, top, bottom, scale, timings):
+    """ Get rows top to bottom of floor background for a poster scaled by scale factor """
+    start = time.perf_counter()
+    floor = image_store.get(config.FLOOR_IMAGE_PATH)
+    _add_timing(timings, "decode", start)
+
+    start = time.perf_counter()
+    band = Image.new("RGBA", (width, bottom - top), (255, 255, 255, 0))
+    # Band on stage, covered by the floor tiles it overlaps (see background)
+    band_box = (0, top / scale, width / scale, bottom / scale)
+    origin_x, origin_y = _floor_origin(floor)
+    tile_y = origin_y + math.floor((band_box[1] - origin_y) / floor.height) * floor.height
+    while tile_y < band_box[3]:
+        tile_x = origin_x + math.floor((band_box[0] - origin_x) / floor.width) * floor.width
+        while tile_x < band_box[2]:
+            # Band in floor image coordinates of this tile
+            box = (band_box[0] - tile_x, band_box[1] - tile_y, band_box[2] - tile_x, band_box[3] - tile_y)
+            clipped = (max(box[0], 0), max(box[1], 0), min(box[2], floor.width), min(box[3], floor.height))
+            if clipped[0] < clipped[2] and clipped[1] < clipped[3]:
+                dest = (round((clipped[0] - box[0]) * scale), round((clipped[1] - box[1]) * scale))
+                size = (max(1, min(round((clipped[2] - clipped[0]) * scale), band.width - dest[0])), 
+                        max(1, min(round((clipped[3] - clipped[1]) * scale), band.height - dest[1])))
+                part = floor.resize(size, resample=Image.BICUBIC, box=clipped)
+                band.paste(part.convert("RGBA"), dest)
+            tile_x += floor.width
+        tile_y += floor.height
+    _add_timing(timings, "composite", start)
+    return band
+
+def _floor_origin(floor):
+    """ Stage position of the top-left corner of the floor tile centered on config.BACKGROUND_POSITION """
+    return config.BACKGROUND_POSITION[0] - floor.width // 2, config.BACKGROUND_POSITION[1] - floor.height // 2
+
+def _add_timing(timings, phase, start):
+    """ Add time since start to phase (and trace it as span) """
+    end = time.perf_counter()
+    if timings is not None:
+        timings[phase] += end - start
+    tracer.add_span(phase, start, end, "render")
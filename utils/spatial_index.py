@@ -0,0 +1,103 @@
+class SpatialGrid:
+    """ Uniform grid over bounding boxes (x0, y0, x1, y1) of items, for fast hit-testing """
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self._cells = {} # (column, row) -> set of items
+        self._bounds = {} # item -> bounding box
+        self._item_cells = {} # item -> cell range (c0, r0, c1, r1)
+
+    def insert(self, item, bounds):
+        """ Add item with given bounding box """
+        cell_range = self._cell_range(bounds)
+        self._bounds[item] = bounds
+        self._item_cells[item] = cell_range
+        for cell in self._iter_cells(cell_range):
+            self._cells.setdefault(cell, set()).add(item)
+
+    def update(self, item, bounds):
+        """ Update bounding box of item, only touching cells which changed """
+        old_range = self._item_cells.get(item)
+        if old_range is None:
+            self.insert(item, bounds)
+            return
+        self._bounds[item] = bounds
+        new_range = self._cell_range(bounds)
+        if new_range == old_range:
+            return
+        old_cells = set(self._iter_cells(old_range))
+        new_cells = set(self._iter_cells(new_range))
+        for cell in old_cells - new_cells:
+            self._discard(cell, item)
+        for cell in new_cells - old_cells:
+            self._cells.setdefault(cell, set()).add(item)
+        self._item_cells[item] = new_range
+
+    def remove(self, item):
+        """ Remove item from grid """
+        cell_range = self._item_cells.pop(item, None)
+        if cell_range is None:
+            return
+        del self._bounds[item]
+        for cell in self._iter_cells(cell_range):
+            self._discard(cell, item)
+
+    def clear(self):
+        """ Remove all items """
+        self._cells.clear()
+        self._bounds.clear()
+        self._item_cells.clear()
+
+    def query_point(self, x, y):
+        """ Return items whose bounding box contains point """
+        cell = (int(x // self.cell_size), int(y // self.cell_size))
+        return [
+            item for item in self._cells.get(cell, ())
+            if self._contains(self._bounds[item], x, y)
+        ]
+
+    def query_rect(self, bounds):
+        """ Return set of items whose bounding box intersects given box """
+        x0, y0, x1, y1 = bounds
+        found = set()
+        for cell in self._iter_cells(self._cell_range(bounds)):
+            for item in self._cells.get(cell, ()):
+                if item in found:
+                    continue
+                bx0, by0, bx1, by1 = self._bounds[item]
+                if bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0:
+                    found.add(item)
+        return found
+
+    def bounds(self, item):
+        """ Get stored bounding box of item """
+        return self._bounds[item]
+
+    def __contains__(self, item):
+        return item in self._bounds
+
+    def __len__(self):
+        return len(self._bounds)
+
+    def _cell_range(self, bounds):
+        x0, y0, x1, y1 = bounds
+        size = self.cell_size
+        return int(x0 // size), int(y0 // size), int(x1 // size), int(y1 // size)
+
+    @staticmethod
+    def _iter_cells(cell_range):
+        c0, r0, c1, r1 = cell_range
+        for column in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                yield column, row
+
+    @staticmethod
+    def _contains(bounds, x, y):
+        x0, y0, x1, y1 = bounds
+        return x0 <= x <= x1 and y0 <= y <= y1
+
+    def _discard(self, cell, item):
+        items = self._cells.get(cell)
+        if items is not None:
+            items.discard(item)
+            if not items:
+                del self._cells[cell]
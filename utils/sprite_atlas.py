@@ -0,0 +1,142 @@
+# Sprite atlas: instrument images pre-rotated at fixed angle steps, stored as raw RGBA and read through mmap
+#
+# File layout (little endian):
+# header: magic b"SATL", format version (uint16), angle step (uint16), table offset (uint64), table size (uint64)
+# data: raw RGBA rows of all sprites, each starting at a multiple of 16 bytes
+# table: UTF-8 JSON {"step": step, "sources": {path: [file size, mtime_ns]}, "sprites": {path: [[angle, width, height, offset], ...]}}
+# Paths are relative to config.RESOURCES_DIR, so the atlas can be moved along with the resources.
+#
+# Build it (offline, e.g. after changing instrument images) from the repository root:
+# python3 -m utils.sprite_atlas [--step 15] [--output cache/sprites.atlas]
+
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from PIL import Image
+import config
+
+log = logging.getLogger(__name__)
+
+ATLAS_MAGIC = b"SATL"
+ATLAS_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHQQ")
+_ALIGN = 16
+
+
+class SpriteAtlas:
+    """ Read-only view of an atlas file, sprites are images sharing the memory map (zero-copy)
+
+    Sprites of source images that changed since the atlas was built are ignored.
+    Images handed out are read-only: never modify them in place (as with the image store).
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, mode='rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, self.step, table_offset, table_size = _HEADER.unpack_from(self._mmap, 0)
+        if magic != ATLAS_MAGIC or version != ATLAS_VERSION:
+            raise ValueError(f"Not a sprite atlas file (version {ATLAS_VERSION}): {self.path}")
+        table = json.loads(bytes(self._view[table_offset:table_offset + table_size]))
+
+        self._sprites = {} # (absolute path string, angle) -> (width, height, offset)
+        stale = 0
+        for rel_path, sprites in table["sprites"].items():
+            source = config.RESOURCES_DIR / rel_path
+            try:
+                stat = os.stat(source)
+            except OSError:
+                stale += 1
+                continue
+            if [stat.st_size, stat.st_mtime_ns] != table["sources"][rel_path]:
+                stale += 1
+                continue
+            for angle, width, height, offset in sprites:
+                self._sprites[(str(source), angle)] = (width, height, offset)
+        if stale:
+            log.warning("Sprite atlas is outdated for %d images, rebuild it: %s", stale, self.path)
+        log.info("Sprite atlas: %d sprites, step %d degrees", len(self._sprites), self.step)
+
+    def __len__(self):
+        return len(self._sprites)
+
+    def has(self, path, angle):
+        """ Check if atlas contains image at path rotated by angle """
+        return (str(path), angle % 360) in self._sprites
+
+    def get(self, path, angle):
+        """ Get image at path rotated by angle, None if the angle is not in the atlas """
+        entry = self._sprites.get((str(path), angle % 360))
+        if entry is None:
+            return None
+        width, height, offset = entry
+        data = self._view[offset:offset + width * height * 4]
+        return Image.frombuffer("RGBA", (width, height), data, "raw", "RGBA", 0, 1)
+
+
+def open_atlas(path):
+    """ Open atlas file, None if there is none (or it is unreadable) """
+    if not Path(path).exists():
+        return None
+    try:
+        return SpriteAtlas(path)
+    except (OSError, ValueError, KeyError, struct.error) as error:
+        log.warning("Sprite atlas could not be opened: %s (%s)", path, error)
+        return None
+
+
+def build_atlas(path, image_paths, step):
+    """ Write atlas of images rotated by all multiples of step (degrees), return number of sprites """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sources = {}
+    sprites = {}
+    count = 0
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, mode='wb') as file:
+        file.write(bytes(_HEADER.size))
+        for image_path in sorted(set(map(Path, image_paths))):
+            rel_path = image_path.relative_to(config.RESOURCES_DIR).as_posix()
+            if rel_path in sources:
+                continue
+            stat = os.stat(image_path)
+            sources[rel_path] = [stat.st_size, stat.st_mtime_ns]
+            sprites[rel_path] = []
+            source = Image.open(image_path)
+            source = source.convert("RGBA") if source.mode != "RGBA" else source
+            for angle in range(0, 360, step):
+                # Same rotation as render.rotated_sprite
+                sprite = source.rotate(angle, resample=Image.BICUBIC, expand=True) if angle else source
+                file.write(bytes(-file.tell() % _ALIGN))
+                sprites[rel_path].append([angle, sprite.width, sprite.height, file.tell()])
+                file.write(sprite.tobytes())
+                count += 1
+        table = json.dumps({"step": step, "sources": sources, "sprites": sprites}, separators=(",", ":")).encode()
+        table_offset = file.tell()
+        file.write(table)
+        file.seek(0)
+        file.write(_HEADER.pack(ATLAS_MAGIC, ATLAS_VERSION, step, table_offset, len(table)))
+    os.replace(tmp_path, path)
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    from models.gear_catalog import GearCatalog
+    parser = argparse.ArgumentParser(description="Pre-render rotated instrument images into a sprite atlas.")
+    parser.add_argument("--step", type=int, default=config.SPRITE_ATLAS_STEP, help="angle step in degrees (divisor of 360)")
+    parser.add_argument("--output", default=config.SPRITE_ATLAS_FILE, help="atlas file")
+    args = parser.parse_args()
+    if args.step <= 0 or 360 % args.step:
+        parser.error("step must be a divisor of 360")
+    catalog = GearCatalog()
+    catalog.load(config.GEAR_FILE)
+    start = time.perf_counter()
+    count = build_atlas(args.output, catalog.image_paths(), args.step)
+    size = os.path.getsize(args.output)
+    print(f"{count} sprites ({size / 2**20:.0f} MiB) written to {args.output} in {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,71 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from utils import render
+from utils.trace import tracer
+
+class TextureLoader:
+    """ Prepares final (BICUBIC) rotated textures on a worker thread
+
+    Requests are debounced per owner (e.g. an element view): only when no new request came
+    in for settle_ms, the rotation is done on the worker thread (Pillow releases the GIL).
+    Results are delivered on the Tk main loop, results of outdated requests are discarded.
+    """
+    def __init__(self, widget, settle_ms, poll_ms):
+        self.widget = widget
+        self.settle_ms = settle_ms
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="texture_loader")
+        self._results = queue.SimpleQueue() # (owner, generation, callback), filled by worker
+        self._generations = {} # owner -> number of latest request
+        self._timers = {} # owner -> after ID of pending (not yet submitted) request
+        self._running = 0 # requests submitted to worker, result not yet delivered
+        self._poll_job = None
+
+    def request(self, owner, path, angle, on_ready, zoom=1.0):
+        """ Request rotated sprite of image at path (scaled by zoom), on_ready() is called on the main loop when it is ready """
+        generation = self._generations.get(owner, 0) + 1
+        self._generations[owner] = generation
+        timer = self._timers.pop(owner, None)
+        if timer is not None:
+            self.widget.after_cancel(timer)
+        self._timers[owner] = self.widget.after(
+            self.settle_ms, self._submit, owner, generation, path, angle, zoom, on_ready
+        )
+
+    def cancel(self, owner):
+        """ Cancel pending request of owner, a running one is discarded when done """
+        timer = self._timers.pop(owner, None)
+        if timer is not None:
+            self.widget.after_cancel(timer)
+        self._generations.pop(owner, None)
+
+    def _submit(self, owner, generation, path, angle, zoom, on_ready):
+        self._timers.pop(owner, None)
+        self._running += 1
+        self._executor.submit(self._work, owner, generation, path, angle, zoom, on_ready)
+        if self._poll_job is None:
+            self._poll_job = self.widget.after(self.poll_ms, self._poll)
+
+    def _work(self, owner, generation, path, angle, zoom, on_ready):
+        """ Worker thread: fill sprite cache """
+        try:
+            with tracer.span("texture_loader.rotate", "texture"):
+                render.zoomed_sprite(path, angle, zoom)
+        finally:
+            self._results.put((owner, generation, on_ready))
+
+    def _poll(self):
+        """ Main loop: deliver finished results """
+        self._poll_job = None
+        while True:
+            try:
+                owner, generation, on_ready = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._running -= 1
+            if self._generations.get(owner) == generation:
+                # Latest request of owner, not outdated
+                del self._generations[owner]
+                on_ready()
+        if self._running > 0:
+            self._poll_job = self.widget.after(self.poll_ms, self._poll)
@@ -0,0 +1,184 @@
+# Thumbnails: small previews of image files, generated by a process pool and cached on disk
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image
+from utils.trace import tracer
+
+log = logging.getLogger(__name__)
+
+INDEX_NAME = "index.json"
+
+
+def thumbnail_path(directory, digest, size):
+    """ Cache file of thumbnail of size (px) of image with content hash digest """
+    return Path(directory) / f"{digest}-{size}.png"
+
+def make_thumbnail(path, size, directory):
+    """ Worker process: write thumbnail of image file at path to the cache (if missing), return content hash """
+    with open(path, mode='rb') as file:
+        data = file.read()
+    digest = hashlib.sha1(data).hexdigest()
+    target = thumbnail_path(directory, digest, size)
+    if not target.exists():
+        image = Image.open(path)
+        image.thumbnail((size, size), resample=Image.LANCZOS)
+        tmp_path = target.with_name(target.name + f".{os.getpid()}.tmp")
+        image.convert("RGBA").save(tmp_path, format="PNG")
+        os.replace(tmp_path, target)
+    return digest
+
+
+class ThumbnailLoader:
+    """ Delivers thumbnail files of images on the Tk main loop, progressively and without blocking it
+
+    Thumbnails are cached in directory by content hash and size, so identical images share
+    one file and edited images get a new one. An index (path -> file size, mtime, hash) lets
+    cached thumbnails be found without reading the images: those are delivered first, in
+    chunks of at most chunk_ms per poll. Missing ones are generated by a process pool
+    (decoding and scaling large images in parallel) and delivered as they finish.
+    """
+    def __init__(self, widget, directory, size, workers, poll_ms, chunk_ms=8):
+        self.widget = widget
+        self.directory = Path(directory)
+        self.size = size
+        self.workers = workers
+        self.poll_ms = poll_ms
+        self.chunk_ms = chunk_ms
+        self.generated = 0 # number of thumbnails made by workers (cache misses)
+        self._index = self._load_index() # str(path) -> [file size, mtime_ns, content hash]
+        self._index_changed = False
+        self._waiting = {} # str(path) -> (stat key, [(key, on_ready), ...]) of paths not yet delivered
+        self._cached = deque() # str(path) of requests to look up in the index, in request order
+        self._results = queue.SimpleQueue() # (str(path), future), filled by done callbacks
+        self._running = 0 # paths submitted to the pool, result not yet delivered
+        self._executor = None
+        self._poll_job = None
+
+    def request(self, images, on_ready):
+        """ Request thumbnails of images ({key: path}), on_ready(key, thumbnail file) is called on the main loop """
+        for key, path in images.items():
+            path = str(path)
+            waiting = self._waiting.get(path)
+            if waiting is not None:
+                waiting[1].append((key, on_ready))
+                continue
+            self._waiting[path] = (None, [(key, on_ready)])
+            self._cached.append(path)
+        self._schedule()
+
+    def cancel(self):
+        """ Drop all requests (e.g. the catalog is reloaded), running workers finish in the background """
+        self._waiting.clear()
+        self._cached.clear()
+        if self._poll_job is not None:
+            self.widget.after_cancel(self._poll_job)
+            self._poll_job = None
+
+    def close(self):
+        """ Cancel requests and stop worker processes """
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _schedule(self):
+        if self._poll_job is None:
+            self._poll_job = self.widget.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        """ Main loop: deliver a chunk of cached thumbnails and all finished ones """
+        self._poll_job = None
+        with tracer.span("thumbnails.poll", "thumbnail"):
+            deadline = time.perf_counter() + self.chunk_ms / 1000
+            while self._cached and time.perf_counter() < deadline:
+                self._lookup(self._cached.popleft())
+            while True:
+                try:
+                    path, future = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self._running -= 1
+                self._finish(path, future)
+        if self._cached or self._running:
+            self._schedule()
+            return
+        if self._index_changed:
+            self._save_index()
+        if self._executor is not None:
+            # Idle, new requests start new workers
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _lookup(self, path):
+        """ Deliver cached thumbnail of path or submit it to the pool """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            log.warning("Image for thumbnail not found: %s", path)
+            self._waiting.pop(path, None)
+            return
+        stat_key = [stat.st_size, stat.st_mtime_ns]
+        entry = self._index.get(path)
+        if entry is not None and entry[:2] == stat_key:
+            thumbnail = thumbnail_path(self.directory, entry[2], self.size)
+            if thumbnail.exists():
+                self._deliver(path, thumbnail)
+                return
+        self._waiting[path] = (stat_key, self._waiting[path][1])
+        if self._executor is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Spawned workers do not inherit the Tk and worker threads of this process
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        future = self._executor.submit(make_thumbnail, path, self.size, self.directory)
+        future.add_done_callback(lambda future: self._results.put((path, future)))
+        self._running += 1
+
+    def _finish(self, path, future):
+        """ Deliver thumbnail generated by a worker """
+        waiting = self._waiting.get(path)
+        if waiting is None:
+            # Cancelled
+            return
+        try:
+            digest = future.result()
+        except Exception:
+            log.exception("Thumbnail could not be generated: %s", path)
+            self._waiting.pop(path)
+            return
+        self.generated += 1
+        self._index[path] = waiting[0] + [digest]
+        self._index_changed = True
+        self._deliver(path, thumbnail_path(self.directory, digest, self.size))
+
+    def _deliver(self, path, thumbnail):
+        for key, on_ready in self._waiting.pop(path)[1]:
+            on_ready(key, thumbnail)
+
+    def _load_index(self):
+        try:
+            with open(self.directory / INDEX_NAME) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        """ Write index (atomically, it is only a shortcut: a lost index only costs regenerating) """
+        self._index_changed = False
+        try:
+            tmp_path = self.directory / (INDEX_NAME + ".tmp")
+            with open(tmp_path, mode='w') as file:
+                json.dump(self._index, file, separators=(",", ":"))
+            os.replace(tmp_path, self.directory / INDEX_NAME)
+        except OSError:
+            log.warning("Thumbnail index could not be written to: %s", self.directory)
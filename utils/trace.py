@@ -0,0 +1,146 @@
+# Trace: leveled logging setup and timing spans, exported as Chrome trace-event JSON (chrome://tracing, Perfetto)
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import config
+
+LOG_FORMAT = "%(relativeCreated)9.1f %(levelname)-7s %(name)s: %(message)s"
+
+def setup_logging(level=config.LOG_LEVEL):
+    """ Configure log output of the app (level name or number) """
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
+
+class _Span:
+    """ Context manager recording one span """
+    __slots__ = ("tracer", "name", "category", "start")
+
+    def __init__(self, tracer, name, category):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.add_span(self.name, self.start, time.perf_counter(), self.category)
+        return False
+
+
+class _NoSpan:
+    """ Context manager doing nothing (tracing disabled) """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """ Collects timing spans (name, start, duration, thread) of the most recent max_events
+
+    Disabled by default: span() then returns a shared no-op context manager and traced
+    functions are called directly after a single flag check.
+    """
+    def __init__(self, max_events):
+        self.enabled = False
+        self._events = deque(maxlen=max_events) # appending is thread-safe
+        self._origin = time.perf_counter()
+        self._threads = {} # thread ID -> name
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self._events.clear()
+
+    def span(self, name, category="app"):
+        """ Context manager timing the enclosed block """
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, category)
+
+    def traced(self, func):
+        """ Decorator timing each call of func (e.g. an event handler) """
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_span(name, start, time.perf_counter(), "handler")
+        return wrapper
+
+    def add_span(self, name, start, end, category="app"):
+        """ Record span from perf_counter values start to end """
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        self._threads.setdefault(thread.ident, thread.name)
+        self._events.append((name, category, start, end, thread.ident))
+
+    def write(self, path):
+        """ Write recorded spans as Chrome trace-event JSON """
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self._threads.items()
+        ]
+        for name, category, start, end, tid in list(self._events):
+            events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self._origin) * 1e6, 1),
+                "dur": round((end - start) * 1e6, 1),
+                "pid": pid,
+                "tid": tid,
+            })
+        with open(path, mode='w') as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        return len(events)
+
+
+# Shared tracer of the app, enabled by config.TRACE_FILE
+tracer = Tracer(config.TRACE_MAX_EVENTS)
+
+
+class PhaseTimer:
+    """ Durations of consecutive phases (e.g. of startup), recorded as trace spans and logged as a report """
+    def __init__(self, name, start=None):
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.phases = {} # phase -> duration (ms), in order
+        self._last = self.start
+
+    def mark(self, phase):
+        """ End phase now (it started at the end of the previous phase) """
+        now = time.perf_counter()
+        self.phases[phase] = 1000 * (now - self._last)
+        tracer.add_span(phase, self._last, now, self.name)
+        self._last = now
+
+    def report(self, logger, level=logging.INFO):
+        """ Log durations of all phases and the total """
+        total = 1000 * (self._last - self.start)
+        phases = ", ".join(f"{phase} {duration:.1f} ms" for phase, duration in self.phases.items())
+        logger.log(level, "%s: %s (total %.1f ms)", self.name, phases, total)
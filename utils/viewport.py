@@ -0,0 +1,40 @@
+class Viewport:
+    """ Transform between stage positions (model, export) and canvas positions at the current zoom
+
+    Zoom factors are integer powers of step (level 0 is 1:1), so the same factors come up
+    again and again and textures made for them can be cached. Panning is done by scrolling
+    the canvas, canvas positions already include it (canvasx/canvasy).
+    """
+    def __init__(self, step, min_level, max_level, stage_size):
+        self.step = step
+        self.min_level = min_level
+        self.max_level = max_level
+        self.level = 0
+        self.zoom = 1.0
+        self.stage_size = tuple(stage_size) # (width, height) of the stage
+
+    def set_level(self, level):
+        """ Set zoom level (clamped), return if the zoom changed """
+        level = min(max(level, self.min_level), self.max_level)
+        if level == self.level:
+            return False
+        self.level = level
+        self.zoom = round(self.step ** level, 6) if level else 1.0
+        return True
+
+    def scroll_region(self):
+        """ Canvas scroll region (x0, y0, x1, y1) covering the stage at the current zoom """
+        width, height = self.to_canvas(*self.stage_size)
+        return 0, 0, width, height
+
+    def to_canvas(self, x, y):
+        """ Canvas position of stage position """
+        return x * self.zoom, y * self.zoom
+
+    def to_world(self, x, y):
+        """ Stage position of canvas position """
+        return x / self.zoom, y / self.zoom
+
+    def scale_points(self, points):
+        """ Canvas coordinates of flat list of stage coordinates (polygons, ovals) """
+        return [value * self.zoom for value in points]
@@ -1,13 +1,24 @@
 # View: handling the GUI components and layout
 
+import bisect
+import math
+import logging
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk
 from tkinter import filedialog
 from tkinter import messagebox
+from tkinter import simpledialog
 from PIL import Image, ImageTk
 
 # Modules
 import config
+from utils import render
+from utils.trace import tracer
+from utils.viewport import Viewport
+
+log = logging.getLogger(__name__)
 
 class AppView(tk.Frame):
     def __init__(self, master):
@@ -18,12 +29,12 @@ class AppView(tk.Frame):
         self.set_title(config.DEFAULT_TITLE)
 
 
-        # Background images (needs structural change)
-        self.background_image = Image.open(config.RESOURCES_DIR / "Environment" / "floor.jpg")
-        self.background_image = ImageTk.PhotoImage(self.background_image)
-
-        self.none_image = Image.open(config.RESOURCES_DIR / "Environment" / "none.png")
-        self.none_image = ImageTk.PhotoImage(self.none_image)
+        # Background image, loaded after the window appeared (see load_background)
+        self.background_source = None # Pillow image (stage size), visible region scaled for the zoom in background_image
+        self.background_image = None
+        self.background_region = None # stage region (x0, y0, x1, y1) shown by background_image
+        self.background_future = None
+        self.background_start = None
 
 
         # Window icon, does generally not work with .ico on Ubuntu
@@ -63,11 +74,27 @@ class AppView(tk.Frame):
                                    width=config.CANVAS_WIDTH, 
                                    height=config.CANVAS_HEIGHT, 
                                    scrollregion=config.CANVAS_SCROLLREGION, 
-                                   bg="white"
+                                   bg=config.BACKGROUND_PLACEHOLDER
                                    )
-        print("Canvas created with size:", config.CANVAS_WIDTH, config.CANVAS_HEIGHT)
+        log.debug("Canvas created with size: %d %d", config.CANVAS_WIDTH, config.CANVAS_HEIGHT)
         self.my_canvas.config(width=config.CANVAS_WIDTH, height=config.CANVAS_HEIGHT)
+
+        # Scrollbars (the stage is larger than the canvas), see bind_canvas_scroll
+        self.cv_vscrollbar = tk.Scrollbar(self.cv_scrollbar_frame, command=self.my_canvas.yview)
+        self.cv_vscrollbar.pack(side='right', fill='y')
+        self.cv_hscrollbar = tk.Scrollbar(self.cv_scrollbar_frame, orient='horizontal', command=self.my_canvas.xview)
+        self.cv_hscrollbar.pack(side='bottom', fill='x')
         self.my_canvas.pack(side="left", expand=True, fill="both")
+        self.scroll_handler = None
+        self.canvas_size = (config.CANVAS_WIDTH, config.CANVAS_HEIGHT) # window size, updated on resize (set_canvas_size)
+        self.my_canvas.config(
+            xscrollcommand=lambda first, last: self._on_canvas_scrolled(self.cv_hscrollbar, first, last),
+            yscrollcommand=lambda first, last: self._on_canvas_scrolled(self.cv_vscrollbar, first, last)
+        )
+        self.rubber_band = None # selection rectangle on canvas
+        self.viewport = Viewport(
+            config.ZOOM_STEP, config.ZOOM_MIN_LEVEL, config.ZOOM_MAX_LEVEL, (config.STAGE_WIDTH, config.STAGE_HEIGHT)
+        )
 
         # Layer Buttons
         arrow_top_pil = Image.open(config.RESOURCES_DIR / 'Gui' / 'arrow_top.png').resize((21, 21))
@@ -99,6 +126,8 @@ class AppView(tk.Frame):
         self.tree_scrollbar = tk.Scrollbar(self.tree_frame)
         self.tree_scrollbar.pack(side='right', fill='y')
         self.gear_tree = ttk.Treeview(self.tree_frame, show="tree", selectmode="browse")
+        # Rows fit the instrument thumbnails
+        ttk.Style(self.root).configure("Treeview", rowheight=config.THUMBNAIL_SIZE + 4)
         self.gear_tree.pack(fill='both', expand=True)
 
         self.gear_tree.config(yscrollcommand=self.tree_scrollbar.set)
@@ -112,6 +141,12 @@ class AppView(tk.Frame):
         self.drums_id = self.gear_tree.insert("", tk.END, text=" Drums", image=self.drums_icon)
         self.cymbals_id = self.gear_tree.insert("", tk.END, text=" Cymbals", image=self.cymbals_icon)
         self.other_id = self.gear_tree.insert("", tk.END, text=" Other", image=self.other_icon)
+        self.gear_parents = {"drum": self.drums_id, "cymbal": self.cymbals_id, "other": self.other_id}
+
+        # Current gear tree contents, for incremental updates
+        self.gear_items = {} # instrument ID -> tree item (attached or detached)
+        self.gear_thumbnails = {} # instrument ID -> thumbnail image (also of items not inserted yet)
+        self.gear_shown = {parent_id: [] for parent_id in self.gear_parents.values()} # sorted IDs of attached items
 
         # Add Button
         self.add_button = tk.Button(self, text ="add")
@@ -132,6 +167,15 @@ class AppView(tk.Frame):
         self.listbox_scrollbar.config(command=self.listbox.yview)
         self.listbox_frame.grid(column=0, row=7, columnspan=2, sticky='nswe', padx=config.WIDGET_PAD+1)
 
+        # Current listbox contents (highest layer first) and selected index, for incremental updates
+        self.listbox_names = []
+        self.listbox_selected = None
+
+        # Kit library popup (see show_kit_library)
+        self.kit_library_tree = None
+        self.kit_library_items = {} # kit file name -> tree item
+        self.kit_thumbnails = {} # kit file name -> thumbnail image
+
 
         n = tk.StringVar() 
         self.bg_box = ttk.Combobox(self, width = 27, textvariable=n, state='readonly') 
@@ -139,12 +183,16 @@ class AppView(tk.Frame):
         self.bg_box.current(0)
         self.bg_box.grid(column = 5, row = 0, sticky='e', padx=config.WIDGET_PAD)
 
+        # Number of elements drawn (realized) out of all, see update_realized_count
+        self.realized_label = tk.Label(self, fg='gray')
+        self.realized_label.grid(column=3, row=0, columnspan=2, sticky='w', padx=config.WIDGET_PAD)
+
 
         self.select_all_button = tk.Button(self, text="Select all")
         self.select_all_button.grid(column=0, row=8, sticky='nswe', padx=config.WIDGET_PAD, pady=config.WIDGET_PAD)
 
         # Rotation Slider
-        self.rot_slider = tk.Scale(self, from_=-179, to=179, orient='horizontal')
+        self.rot_slider = tk.Scale(self, from_=-179, to=179, orient='horizontal', label='Rotation')
         self.rot_slider.grid(column=4, row=8, columnspan=2, sticky='nswe', padx=50)
 
         # Flip Checkbutton
@@ -158,8 +206,92 @@ class AppView(tk.Frame):
 
         self.root.config(menu=self.menubar)
 
-        self.background_instance = self.my_canvas.create_image(200, 0, anchor='center', image=self.background_image)
+        # Background cropped to the canvas, image is set when loaded
+        self.background_instance = self.my_canvas.create_image(0, 0, anchor='nw')
+        self.load_background()
+
+
+    def get_canvas_position(self, event):
+        """ Convert event window position to stage position (undoing scrolling and zoom) """
+        return self.viewport.to_world(self.my_canvas.canvasx(event.x), self.my_canvas.canvasy(event.y))
+
+    def is_shift_pressed(self, event):
+        """ Check if shift was held during event """
+        return bool(event.state & 0x0001)
+
+    def move_selected(self, dx, dy):
+        """ Move all selected elements (image and edge) on canvas at once, by (dx, dy) on stage """
+        self.my_canvas.move(config.SELECTED_TAG, *self.viewport.to_canvas(dx, dy))
 
+    def draw_rubber_band(self, x0, y0, x1, y1):
+        """ Draw or update selection rectangle on canvas (stage coordinates) """
+        x0, y0, x1, y1 = self.viewport.scale_points([x0, y0, x1, y1])
+        if self.rubber_band is None:
+            self.rubber_band = self.my_canvas.create_rectangle(x0, y0, x1, y1, outline='red', dash=(4, 2))
+        else:
+            self.my_canvas.coords(self.rubber_band, x0, y0, x1, y1)
+
+    def clear_rubber_band(self):
+        """ Remove selection rectangle from canvas """
+        if self.rubber_band is not None:
+            self.my_canvas.delete(self.rubber_band)
+            self.rubber_band = None
+
+    def set_zoom(self, level, anchor=None):
+        """ Zoom canvas items to viewport level, keeping the stage position at window position anchor (x, y) in place
+
+        Item positions and edges are scaled by the canvas, element textures need to be updated by the caller.
+        """
+        if anchor is None:
+            anchor = (self.my_canvas.winfo_width() / 2, self.my_canvas.winfo_height() / 2)
+        x, y = self.viewport.to_world(self.my_canvas.canvasx(anchor[0]), self.my_canvas.canvasy(anchor[1]))
+        old_zoom = self.viewport.zoom
+        if not self.viewport.set_level(level):
+            return False
+        factor = self.viewport.zoom / old_zoom
+        self.my_canvas.scale('all', 0, 0, factor, factor)
+        _, _, width, height = self.viewport.scroll_region()
+        self.my_canvas.config(scrollregion=(0, 0, width, height))
+        x, y = self.viewport.to_canvas(x, y)
+        self.my_canvas.xview_moveto((x - anchor[0]) / width)
+        self.my_canvas.yview_moveto((y - anchor[1]) / height)
+        self.update_background_image(force=True)
+        return True
+
+    def get_wheel_steps(self, event):
+        """ Get mouse wheel steps of event (positive: up/away from the user) """
+        if event.num == 4:
+            return 1
+        if event.num == 5:
+            return -1
+        # Windows: multiples of 120, macOS: small numbers
+        return 1 if event.delta > 0 else -1
+
+    def start_pan(self, event):
+        """ Start panning the canvas at event position """
+        self.my_canvas.scan_mark(event.x, event.y)
+
+    def pan(self, event):
+        """ Pan canvas along with the mouse """
+        self.my_canvas.scan_dragto(event.x, event.y, gain=1)
+
+    def _on_canvas_scrolled(self, scrollbar, first, last):
+        """ Canvas view changed (scrolled, panned, zoomed or resized): update scrollbar, background and handler """
+        scrollbar.set(first, last)
+        self.update_background_image()
+        if self.scroll_handler is not None:
+            self.scroll_handler()
+
+    def get_visible_bounds(self, margin=0):
+        """ Get stage region (x0, y0, x1, y1) shown in the canvas window, extended by margin (window px) """
+        width, height = self.canvas_size
+        x0, y0 = self.viewport.to_world(self.my_canvas.canvasx(-margin), self.my_canvas.canvasy(-margin))
+        x1, y1 = self.viewport.to_world(self.my_canvas.canvasx(width + margin), self.my_canvas.canvasy(height + margin))
+        return x0, y0, x1, y1
+
+    def set_canvas_size(self, width, height):
+        """ Cache canvas window size (from <Configure>), used for the visible region """
+        self.canvas_size = (width, height)
 
     def get_real_canvas_size(self):
         canv_width = self.my_canvas.winfo_width()
@@ -171,6 +303,14 @@ class AppView(tk.Frame):
         """ Bind window closing to handler """
         self.root.protocol('WM_DELETE_WINDOW', handler)
 
+    def bind_first_paint(self, handler=None):
+        """ Call handler once, after the canvas was drawn for the first time """
+        def on_expose(event):
+            self.my_canvas.unbind('<Expose>', binding)
+            # Drawing is done in idle callbacks, which run in order
+            self.root.after_idle(handler)
+        binding = self.my_canvas.bind('<Expose>', on_expose, add='+')
+
     def bind_background_selection(self, handler=None):
         """ Bind background selection combobox to handler """
         self.bg_box.bind('<<ComboboxSelected>>', handler)
@@ -207,11 +347,45 @@ class AppView(tk.Frame):
         """ Bind mouse click on canvas to handler """
         self.my_canvas.bind("<Button-1>", handler)
 
+    def bind_canvas_motion(self, handler=None):
+        """ Bind mouse motion (no button pressed) on canvas to handler """
+        self.my_canvas.bind("<Motion>", handler)
+
+    def bind_canvas_drag(self, drag=None, drag_stop=None):
+        """ Bind mouse drag and release on canvas to handlers """
+        self.my_canvas.bind("<B1-Motion>", drag)
+        self.my_canvas.bind("<ButtonRelease-1>", drag_stop)
+
+    def bind_canvas_configure(self, handler=None):
+        """ Bind canvas resize to handler """
+        self.my_canvas.bind("<Configure>", handler)
+
+    def bind_canvas_scroll(self, handler=None):
+        """ Call handler (without arguments) whenever the visible part of the stage changed """
+        self.scroll_handler = handler
+
+    def bind_canvas_wheel(self, handler=None):
+        """ Bind mouse wheel on canvas to handler (X11 reports it as buttons 4 and 5) """
+        self.my_canvas.bind("<MouseWheel>", handler)
+        self.my_canvas.bind("<Button-4>", handler)
+        self.my_canvas.bind("<Button-5>", handler)
+
+    def bind_canvas_pan(self, start=None, drag=None):
+        """ Bind middle mouse button press and drag on canvas to handlers """
+        self.my_canvas.bind("<ButtonPress-2>", start)
+        self.my_canvas.bind("<B2-Motion>", drag)
+
     def bind_arrow_keys(self, handler=None):
         """ Bind arrow keys to handler """
         for key in ["<Left>", "<Right>", "<Up>", "<Down>"]:
             self.root.bind(key, handler)
 
+    def bind_undo_keys(self, undo=None, redo=None):
+        """ Bind undo (Ctrl+Z) and redo (Ctrl+Y, Ctrl+Shift+Z) keys to handlers """
+        self.root.bind("<Control-z>", undo)
+        self.root.bind("<Control-y>", redo)
+        self.root.bind("<Control-Z>", redo)
+
     def bind_listbox_selection(self, handler=None):
         """ Bind listbox selection to handler """
         self.listbox.bind("<<ListboxSelect>>", handler)
@@ -231,33 +405,61 @@ class AppView(tk.Frame):
 
         self.filemenu.add_command(label="New", command=commands["new"])
         self.filemenu.add_command(label="Load...", command=commands["load"])
+        self.filemenu.add_command(label="Kit library...", command=commands["library"])
         self.filemenu.add_command(label="Save", command=commands["save"])
         self.filemenu.add_command(label="Save as...", command=commands["save_as"])
         self.filemenu.add_command(label="Save image as...", command=commands["save_image"])
+        self.filemenu.add_command(label="Save poster image as...", command=commands["save_poster"])
         self.filemenu.add_separator()
         self.filemenu.add_command(label="Exit", command=commands["exit"])
 
+        self.helpmenu.add_command(label="Undo (Ctrl+Z)", command=commands["undo"])
+        self.helpmenu.add_command(label="Redo (Ctrl+Y)", command=commands["redo"])
+        self.helpmenu.add_separator()
         self.helpmenu.add_command(label="View gear", command=commands["view_gear"])
+        self.helpmenu.add_command(label="Reset zoom (mouse wheel)", command=commands["reset_zoom"])
         self.helpmenu.add_command(label="Increase move step (arrows)", command=commands["increase_move_step"])
         self.helpmenu.add_command(label="Decrease move step (arrows)", command=commands["decrease_move_step"])
 
-    def raise_all_markers(self, elements):
-        """ Move up all markers in order to ensure correct selectability """
-        for layer in elements:
-            self.my_canvas.tag_raise(elements[layer].el_view.marker)
-
     def update_listbox(self, elements, selected):
-        """ Update contents of used gear listbox """
-        # Clear listbox
-        self.listbox.delete('0','end')
-        # Repopulate listbox
-        for layer in elements:
-            self.listbox.insert(0, elements[layer].el_model.instr.name)
-        self.listbox.selection_clear('0','end')
+        """ Update contents of used gear listbox, only touching changed rows """
+        # Highest layer is on top of the listbox
+        names = [elements[layer].el_model.instr.name for layer in range(len(elements), 0, -1)]
+        old_names = self.listbox_names
+
+        # Skip common head and tail, only the rows in between changed
+        start = 0
+        while start < len(names) and start < len(old_names) and names[start] == old_names[start]:
+            start += 1
+        old_stop, stop = len(old_names), len(names)
+        while old_stop > start and stop > start and names[stop - 1] == old_names[old_stop - 1]:
+            old_stop -= 1
+            stop -= 1
+
+        old_rows = old_names[start:old_stop]
+        new_rows = names[start:stop]
+        if len(old_rows) == len(new_rows) > 1 and new_rows == old_rows[-1:] + old_rows[:-1]:
+            # Single row moved up
+            self.listbox.delete(old_stop - 1)
+            self.listbox.insert(start, new_rows[0])
+        elif len(old_rows) == len(new_rows) > 1 and new_rows == old_rows[1:] + old_rows[:1]:
+            # Single row moved down
+            self.listbox.delete(start)
+            self.listbox.insert(stop - 1, new_rows[-1])
+        else:
+            if old_rows:
+                self.listbox.delete(start, old_stop - 1)
+            if new_rows:
+                self.listbox.insert(start, *new_rows)
+        self.listbox_names = names
+
         # Select selected item in listbox
-        if selected != 0:
-            last = len(elements)
-            self.listbox.select_set(last - selected)
+        index = len(names) - selected if selected != 0 else None
+        if index != self.listbox_selected or old_rows or new_rows:
+            self.listbox.selection_clear('0','end')
+            if index is not None:
+                self.listbox.select_set(index)
+            self.listbox_selected = index
 
     def get_listbox_selection(self):
         """ Get selected item from used gear listbox """
@@ -265,34 +467,62 @@ class AppView(tk.Frame):
         if listbox_selection:
             index = listbox_selection[0]
             # Convert listbox index to layer
-            layer = len(self.listbox.get(0, 'end')) - index
+            layer = len(self.listbox_names) - index
             return layer
         return 0
 
-    def refresh_gear_tree(self, instruments):
-        """ Update gear tree """
-        # Delete each child item
-        child_items = self.gear_tree.get_children(self.drums_id)
-        for child in child_items:
-            self.gear_tree.delete(child)
-        child_items = self.gear_tree.get_children(self.cymbals_id)
-        for child in child_items:
-            self.gear_tree.delete(child)
-        child_items = self.gear_tree.get_children(self.other_id)
-        for child in child_items:
-            self.gear_tree.delete(child)
-
-        # Repopulate tree
-        for inst in instruments:
-            if inst.type == "drum" and not inst.is_used:
-                self.gear_tree.insert(self.drums_id, tk.END, text=inst.name)
-            if inst.type == "cymbal" and not inst.is_used:
-                self.gear_tree.insert(self.cymbals_id, tk.END, text=inst.name)
-            if inst.type == "other" and not inst.is_used:
-                self.gear_tree.insert(self.other_id, tk.END, text=inst.name)
-
-    def update_rot_slider(self, angle):
-        """ Update rotation slider value """
+    def refresh_gear_tree(self, catalog):
+        """ Update gear tree per instrument type, showing unused instruments of the catalog
+
+        Types whose shown instruments did not change are left alone, the others get their
+        children replaced in one call (hidden items are detached and kept for later).
+        """
+        for instr_type, parent_id in self.gear_parents.items():
+            shown = [inst for inst in catalog.by_type(instr_type) if not inst.is_used]
+            ids = [inst.ID for inst in shown]
+            if ids == self.gear_shown[parent_id]:
+                continue
+            for inst in shown:
+                if inst.ID not in self.gear_items:
+                    self.gear_items[inst.ID] = self.gear_tree.insert(
+                        parent_id, tk.END, text=inst.name, image=self.gear_thumbnails.get(inst.ID, '')
+                    )
+            self.gear_tree.set_children(parent_id, *(self.gear_items[instr_id] for instr_id in ids))
+            self.gear_shown[parent_id] = ids
+
+    def set_gear_item_visible(self, inst, visible):
+        """ Show or hide single instrument in gear tree, keeping the catalog order """
+        parent_id = self.gear_parents.get(inst.type)
+        if parent_id is None:
+            return
+        shown = self.gear_shown[parent_id]
+        index = bisect.bisect_left(shown, inst.ID)
+        is_shown = index < len(shown) and shown[index] == inst.ID
+        if visible and not is_shown:
+            item = self.gear_items.get(inst.ID)
+            if item is None:
+                self.gear_items[inst.ID] = self.gear_tree.insert(
+                    parent_id, index, text=inst.name, image=self.gear_thumbnails.get(inst.ID, '')
+                )
+            else:
+                # Reattach hidden item
+                self.gear_tree.move(item, parent_id, index)
+            shown.insert(index, inst.ID)
+        elif not visible and is_shown:
+            self.gear_tree.detach(self.gear_items[inst.ID])
+            del shown[index]
+
+    def set_gear_thumbnail(self, instr_id, path):
+        """ Show thumbnail image file next to instrument in gear tree """
+        image = tk.PhotoImage(file=path)
+        self.gear_thumbnails[instr_id] = image
+        item = self.gear_items.get(instr_id)
+        if item is not None:
+            self.gear_tree.item(item, image=image)
+
+    def update_rot_slider(self, angle, relative=False):
+        """ Update rotation slider value (relative: selected elements have different angles, turned by the value) """
+        self.rot_slider.config(label='Rotate by (mixed angles)' if relative else 'Rotation')
         self.rot_slider.set(-angle)
 
     def activate_flip_checkbutton(self, el_model):
@@ -312,11 +542,17 @@ class AppView(tk.Frame):
         self.flip_checkbutton.configure(state='disabled')
         self.flip_checkbutton.deselect()
 
-    def swap_up(self, layer, elements):
-        """ Swap lower with upper element on canvas """
-        self.my_canvas.tag_raise(elements[layer].el_view.image, elements[layer + 1].el_view.edge)
-        self.my_canvas.tag_raise(elements[layer].el_view.edge, elements[layer].el_view.image)
-        self.raise_all_markers(elements)
+    def restack_element(self, element, below=None, above=None):
+        """ Restack image and edge of element on canvas: directly above element below, else directly below element above """
+        if below is not None:
+            self.my_canvas.tag_raise(element.el_view.image, below.el_view.edge)
+        elif above is not None:
+            self.my_canvas.tag_lower(element.el_view.image, above.el_view.image)
+        self.my_canvas.tag_raise(element.el_view.edge, element.el_view.image)
+
+    def update_realized_count(self, realized, total):
+        """ Show number of elements with canvas items (see AppController.update_culling) """
+        self.realized_label.configure(text=f"{realized} / {total} elements drawn")
 
     def show_gear_popup(self, instruments):
         """ Gear popup """
@@ -349,6 +585,74 @@ class AppView(tk.Frame):
         gear_frame.grid(column=0, row=0, sticky='nswe')
 
 
+    def show_kit_library(self, entries, on_open):
+        """ Kit library popup listing entries ([(file name, index entry)]), on_open(file name) loads a kit """
+        # Make pop-up window
+        top = tk.Toplevel(self)
+        top.geometry("760x480")
+        top.geometry("+250+200")
+        top.title("Kit library")
+
+        # Window settings
+        top.attributes('-topmost', 1)
+        top.grab_set()
+
+        # Grid
+        top.grid_columnconfigure(0, weight=1)
+        top.grid_rowconfigure(0, weight=1)
+
+        # Kit tree, one row per kit with its thumbnail
+        ttk.Style(self.root).configure("Library.Treeview", rowheight=config.KIT_THUMBNAIL_SIZE[1] + 6)
+        kit_frame = tk.Frame(top)
+        kit_scrollbar = tk.Scrollbar(kit_frame)
+        kit_scrollbar.pack(side='right', fill='y')
+        kit_tree = ttk.Treeview(kit_frame, columns=("elements", "size", "instruments"), selectmode="browse", style="Library.Treeview")
+        kit_tree.heading("#0", text="Kit")
+        kit_tree.heading("elements", text="Elements")
+        kit_tree.heading("size", text="Size")
+        kit_tree.heading("instruments", text="Instruments")
+        kit_tree.column("#0", width=config.KIT_THUMBNAIL_SIZE[0] + 180, stretch=False)
+        kit_tree.column("elements", width=70, anchor='e', stretch=False)
+        kit_tree.column("size", width=90, anchor='e', stretch=False)
+        kit_tree.pack(fill='both', expand=True)
+        kit_tree.config(yscrollcommand=kit_scrollbar.set)
+        kit_scrollbar.config(command=kit_tree.yview)
+        kit_frame.grid(column=0, row=0, sticky='nswe')
+
+        self.kit_library_tree = kit_tree
+        self.kit_library_items = {}
+        self.kit_thumbnails = {}
+        for name, entry in entries:
+            if entry["error"]:
+                values = ("", "", entry["error"])
+            else:
+                size = ""
+                if entry["bbox"]:
+                    left, top_edge, right, bottom = entry["bbox"]
+                    size = f"{right - left} x {bottom - top_edge}"
+                values = (entry["elements"], size, ", ".join(entry["instruments"]))
+            self.kit_library_items[name] = kit_tree.insert("", tk.END, text=" " + name, values=values)
+        item_names = {item: name for name, item in self.kit_library_items.items()}
+
+        def open_selected(event=None):
+            selected = kit_tree.selection()
+            if selected:
+                top.destroy()
+                on_open(item_names[selected[0]])
+
+        kit_tree.bind('<Double-1>', open_selected)
+        kit_tree.bind('<Return>', open_selected)
+        tk.Button(top, text="Open", command=open_selected).grid(column=0, row=1, sticky='e', padx=10, pady=10)
+
+    def set_kit_thumbnail(self, name, path):
+        """ Show thumbnail image file next to kit in kit library """
+        item = self.kit_library_items.get(name)
+        if item is None or not self.kit_library_tree.winfo_exists():
+            return
+        image = tk.PhotoImage(file=path)
+        self.kit_thumbnails[name] = image
+        self.kit_library_tree.item(item, image=image)
+
     def show_new_dialog(self, on_confirm):
         """ New project popup """
         # Make popup window
@@ -421,10 +725,10 @@ class AppView(tk.Frame):
         
 
     def show_save_project_dialog(self):
-        """ Open file dialog for saving project file """
+        """ Open file dialog for saving project file (CSV or binary kit, chosen by extension) """
         file_path = filedialog.asksaveasfilename(
             defaultextension=".csv", 
-            filetypes=[("CSV files", "*.csv")], 
+            filetypes=[("CSV files", "*.csv"), ("Binary kit files", "*.dkit")], 
             initialdir=config.KITS_DIR
             )
     
@@ -435,13 +739,30 @@ class AppView(tk.Frame):
         """ Open file dialog for loading project file """
         file_path = filedialog.askopenfilename(
             defaultextension=".csv", 
-            filetypes=[("CSV files", "*.csv")],
+            filetypes=[("Kit files", "*.csv *.dkit"), ("CSV files", "*.csv"), ("Binary kit files", "*.dkit")],
             initialdir=config.KITS_DIR
             )
     
         if file_path:
             return file_path
         
+    def ask_poster_scale(self):
+        """ Ask for poster scale factor (output size = canvas size * scale), None if cancelled """
+        return simpledialog.askfloat(
+            "Poster", 
+            "Scale factor (e.g. 8 for a print of about 9600x5600 pixels):", 
+            initialvalue=config.POSTER_SCALE_DEFAULT, 
+            minvalue=0.1, 
+            maxvalue=50, 
+            parent=self.root
+            )
+
+    def ask_recover(self):
+        """ Ask if unsaved changes of the last session should be recovered """
+        return messagebox.askyesno(
+            "Recover", "The last session was not closed properly.\nRecover unsaved changes?"
+        )
+
     def show_image_saved_message(self):
         """ Create message box to verify saved image """
         messagebox.showinfo("Saved", "Image saved successfully.")
@@ -455,9 +776,65 @@ class AppView(tk.Frame):
         self.root.title(title)
 
     def set_background(self):
-        """ Set background image """
+        """ Set background image (placeholder color while the floor is not loaded yet) """
         value = self.bg_box.get()
         if value == 'wood floor 1':
-            self.my_canvas.itemconfig(self.background_instance, image=self.background_image)
+            if self.background_image is None:
+                self.my_canvas.config(bg=config.BACKGROUND_PLACEHOLDER)
+            else:
+                self.my_canvas.config(bg="white")
+                self.my_canvas.itemconfig(self.background_instance, image=self.background_image)
         if value == 'none':
-            self.my_canvas.itemconfig(self.background_instance, image=self.none_image)
\ No newline at end of file
+            self.my_canvas.config(bg="white")
+            self.my_canvas.itemconfig(self.background_instance, image='')
+
+    def load_background(self):
+        """ Decode background covering the stage on a worker thread (disk cached), swap it in when ready """
+        self.background_start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background")
+        self.background_future = executor.submit(render.background, (config.STAGE_WIDTH, config.STAGE_HEIGHT))
+        executor.shutdown(wait=False)
+        self.root.after(config.BACKGROUND_POLL_MS, self._poll_background)
+
+    def _poll_background(self):
+        if not self.background_future.done():
+            self.root.after(config.BACKGROUND_POLL_MS, self._poll_background)
+            return
+        try:
+            self.background_source = self.background_future.result()
+        except OSError:
+            log.exception("Background image could not be loaded")
+            return
+        self.update_background_image(force=True)
+        end = time.perf_counter()
+        tracer.add_span("background", self.background_start, end, "startup")
+        log.info("startup: background ready after %.1f ms", 1000 * (end - self.background_start))
+        self.set_background()
+
+    def update_background_image(self, force=False):
+        """ Show background of the visible stage region (plus margin) at the current zoom
+
+        Only that region is scaled and made into a Tk image (the whole stage could take hundreds
+        of MB when zoomed in). It is made again when the view leaves it, or with force (zoom changed).
+        """
+        if self.background_source is None:
+            return
+        stage_width, stage_height = self.viewport.stage_size
+        if not force and self.background_region is not None:
+            x0, y0, x1, y1 = self.get_visible_bounds()
+            left, top, right, bottom = self.background_region
+            if left <= max(x0, 0) and top <= max(y0, 0) and right >= min(x1, stage_width) and bottom >= min(y1, stage_height):
+                return
+        x0, y0, x1, y1 = self.get_visible_bounds(config.BACKGROUND_MARGIN)
+        region = (
+            max(math.floor(x0), 0), max(math.floor(y0), 0),
+            min(math.ceil(x1), stage_width), min(math.ceil(y1), stage_height)
+        )
+        image = self.background_source.crop(region)
+        if self.viewport.zoom != 1:
+            size = tuple(max(1, round(side * self.viewport.zoom)) for side in image.size)
+            image = image.resize(size, resample=Image.BILINEAR)
+        self.background_image = ImageTk.PhotoImage(image)
+        self.background_region = region
+        self.my_canvas.coords(self.background_instance, *self.viewport.to_canvas(region[0], region[1]))
+        self.set_background()
\ No newline at end of file